@@ -1,14 +1,13 @@
 import streamlit as st
-import time
-from datetime import datetime, timedelta
 from utils import *
 
 st.set_page_config(page_title="Meal Prep Planner", layout="centered", initial_sidebar_state="expanded")
 st.title("🥗 Meal Planning Assistant")
 
-supabase, controller = authenticate()
+with track_page("Home"):
+    supabase, controller = authenticate()
 
-st.markdown(f"""
+    st.markdown(f"""
 Are you also fed up with constantly figuring out what to eat every day, only to realize your partner isn't in the mood for it, or worse — you're missing half the ingredients?
 
 I definitely am. And with full-time work starting soon, who even has time to plan, shop, and cook every day?
@@ -26,77 +25,85 @@ That’s exactly why I built this simple tool to:
 If you’re also trying to save time and reduce stress around meals, this might be for you too.
 """)
 
-def show_login():
-
-    tab1, tab2 = st.tabs(["Login", "Sign Up"])
-
-    with tab1:
-        email = st.text_input("Email", key="login_email")
-        password = st.text_input("Password", type="password", key="login_password")
-
-        if st.button("Login"):
-            try:
-                result = supabase.auth.sign_in_with_password({"email": email, "password": password})
-                st.session_state.user = result.user
-                access_token = result.session.access_token
-                refresh_token = result.session.refresh_token
-                controller.set("access_token", access_token)
-                controller.set("refresh_token", refresh_token)
-                time.sleep(1)  # wait for cookie to set
-                st.success("Logged in successfully!")
-                st.rerun()
-            except Exception as e:
-                st.error(e)
-                st.error("Login failed. Check your email/password.")
-
-    with tab2:
-        email = st.text_input("Email", key="signup_email")
-        password = st.text_input("Password", type="password", key="signup_password")
-
-        if st.button("Sign Up"):
-            try:
-                supabase.auth.sign_up({"email": email, "password": password})
-                st.success("Account created! Please check your email.")
-            except Exception as e:
-                st.error("Signup failed. Maybe account already exists?")
-
-
-if "user" not in st.session_state:
-    show_login()
-    st.stop()
-else:
-    st.sidebar.write(f"👋 Logged in as: {st.session_state.user.email}")
-    if st.sidebar.button("Logout"):
-        st.session_state.clear()
-        expires_at = datetime.now() + timedelta(days=-7)
-        controller.set("access_token", "", expires=expires_at)
-        controller.set("refresh_token", "", expires=expires_at)
-        time.sleep(1)
-        st.rerun()
-
-    st.subheader("🔗 Link to a Partner")
-
-    partner_email = st.text_input("Enter your partner's email")
-
-    if st.button("Link Partner"):
-        # Get partner user ID
-        result = supabase.table("users").select("id").eq("email", partner_email).execute()
-        if result.data:
-            partner_id = result.data[0]["id"]
+    def show_login():
+        session = None
+        login_area = st.empty()
+
+        with login_area.container():
+            tab1, tab2 = st.tabs(["Login", "Sign Up"])
+
+            with tab1:
+                email = st.text_input("Email", key="login_email")
+                password = st.text_input("Password", type="password", key="login_password")
+
+                if st.button("Login"):
+                    try:
+                        session = init_auth_client().auth.sign_in_with_password({"email": email, "password": password}).session
+                    except Exception as e:
+                        st.error(e)
+                        st.error("Login failed. Check your email/password.")
+
+            with tab2:
+                email = st.text_input("Email", key="signup_email")
+                password = st.text_input("Password", type="password", key="signup_password")
+
+                if st.button("Sign Up"):
+                    try:
+                        init_auth_client().auth.sign_up({"email": email, "password": password})
+                        st.success("Account created! Please check your email.")
+                    except Exception as e:
+                        st.error("Signup failed. Maybe account already exists?")
+
+        if session is None:
+            return False
+
+        # Render the logged-in page in this same run, so the cookie writes reach the
+        # browser without a sleep + rerun.
+        login_area.empty()
+        st.session_state.pop("logged_out", None)
+        st.session_state.user = session.user
+        save_session(controller, session)
+        st.success("Logged in successfully!")
+        return True
+
+
+    if "user" not in st.session_state and not show_login():
+        st.stop()
+    else:
+        show_connection_stats()
+        st.sidebar.write(f"👋 Logged in as: {st.session_state.user.email}")
+        if st.sidebar.button("Logout"):
+            logout(controller)
+            show_login()
+            st.stop()
+
+        st.subheader("🔗 Link to a Partner")
+
+        partner_email = st.text_input("Enter your partner's email")
+
+        if st.button("Link Partner"):
             user_id = st.session_state.user.id
-            if partner_id == user_id:
-                st.warning("You cannot link yourself.")
-            else:
-                # Check if already linked
-                existing = supabase.table("partners").select("*").or_(
-                    f"partnerA.eq.{user_id},partnerB.eq.{partner_id}"
-                ).execute()
-                if existing.data:
+            # Look up the partner and the user's existing links at the same time
+            result, links = run_parallel(
+                lambda: supabase.table("users").select("id").eq("email", partner_email).execute(),
+                lambda: supabase.table("partners").select("partnerA, partnerB").or_(
+                    f"partnerA.eq.{user_id},partnerB.eq.{user_id}"
+                ).execute(),
+            )
+            if result.data:
+                partner_id = result.data[0]["id"]
+                if partner_id == user_id:
+                    st.warning("You cannot link yourself.")
+                # Check if already linked, in either direction
+                elif any(partner_id in (link["partnerA"], link["partnerB"]) for link in links.data):
                     st.info("Already linked.")
                 else:
                     supabase.table("partners").insert([
                         {"partnerA": user_id, "partnerB": partner_id}
                     ]).execute()
+                    st.session_state.pop("household", None)
                     st.success("Partners linked!")
-        else:
-            st.error("No user found with that email.")
\ No newline at end of file
+            else:
+                st.error("No user found with that email.")
+
+    show_page_stats()
@@ -0,0 +1,88 @@
+# Latency of the token check every new session makes in authenticate(), against a
+# stand-in auth endpoint with a configurable round trip. Compares asking the auth
+# server for every session (as before the token cache) with utils.verify_token(),
+# once via get_user() and cached, once verified locally with the JWT secret.
+#
+#   python benchmarks/auth.py --users 200 --sessions 2000 --round-trip 0.08
+#
+# Sessions pick users at random, like browser tabs and reconnects; each user has
+# one access token for the whole run, as within the token's lifetime.
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import streamlit as st
+from authlib.jose import jwt
+from streamlit.runtime.secrets import Secrets
+
+import utils
+from load_test import percentile
+
+JWT_SECRET = "bench-jwt-secret"
+
+
+class FakeAuth:
+    # get_user() of the Supabase auth client, one round trip per call
+    def __init__(self, users, round_trip):
+        self.users, self.round_trip = users, round_trip
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def get_user(self, token):
+        time.sleep(self.round_trip)
+        with self.lock:
+            self.calls += 1
+        return SimpleNamespace(user=self.users.get(token))
+
+
+def access_token(user_id) -> str:
+    claims = {"sub": user_id, "email": f"{user_id}@example.com", "exp": int(time.time()) + 3600, "aud": "authenticated"}
+    return jwt.encode({"alg": "HS256"}, claims, JWT_SECRET).decode()
+
+
+def measure(label, check, tokens, sessions, auth):
+    utils._token_cache()["entries"].clear()
+    calls = auth.calls
+    latencies = []
+    for token in random.choices(tokens, k=sessions):
+        started = time.perf_counter()
+        check(token)
+        latencies.append(time.perf_counter() - started)
+    print(
+        f"{label:34} p50 {1000 * percentile(latencies, 0.5):8.3f} ms   p99 {1000 * percentile(latencies, 0.99):8.3f} ms"
+        f"   {auth.calls - calls:6} auth requests"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the latency of the token check of new sessions.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--round-trip", type=float, default=0.08, help="seconds per auth request")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    st.secrets = Secrets()
+    st.secrets._secrets = {}
+    tokens = [access_token(f"user-{n:05d}") for n in range(args.users)]
+    auth = FakeAuth({token: SimpleNamespace(id=f"user-{n:05d}") for n, token in enumerate(tokens)}, args.round_trip)
+    supabase = SimpleNamespace(auth=auth)
+
+    print(f"{args.sessions} new sessions of {args.users} users, {1000 * args.round_trip:.0f} ms per auth request\n")
+    measure("get_user() for every session", lambda token: auth.get_user(token).user, tokens, args.sessions, auth)
+    measure("verify_token(), get_user() cached", lambda token: utils.verify_token(supabase, token), tokens, args.sessions, auth)
+    st.secrets._secrets["SUPABASE_JWT_SECRET"] = JWT_SECRET
+    measure("verify_token(), local JWT check", lambda token: utils.verify_token(supabase, token), tokens, args.sessions, auth)
+
+
+if __name__ == "__main__":
+    main()
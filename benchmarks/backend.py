@@ -0,0 +1,238 @@
+# In-process stand-ins for the services the app talks to, for the benchmarks only:
+# a PostgREST-like Supabase client over Python lists, a streaming Groq client and
+# a realtime client that delivers only what a benchmark pushes. Every request
+# sleeps for a configurable round trip and calls the HTTP hooks the app installs,
+# so the app's own round-trip counters and profiling spans keep working.
+
+import asyncio
+import copy
+import itertools
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+ROUND_TRIP = 0.005  # seconds per simulated request
+MAX_ROWS = 1000  # rows a select returns at most, PostgREST's default db-max-rows
+METHODS = {"select": "GET", "insert": "POST", "upsert": "POST", "update": "PATCH", "delete": "DELETE", "rpc": "POST"}
+TIMESTAMPED = {"recipes", "meal_plans"}  # tables with an updated_at trigger (sql/001_updated_at.sql)
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Query:
+    def __init__(self, backend, table):
+        self.backend, self.table = backend, table
+        self.op, self.payload, self.columns = "select", None, "*"
+        self.filters, self.order_by, self.row_limit = [], [], None
+
+    def select(self, columns="*", **kwargs):
+        self.columns = columns
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, **kwargs):
+        self.op, self.payload = "upsert", payload
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def _filter(self, test):
+        self.filters.append(test)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda row: row.get(column) == value)
+
+    def neq(self, column, value):
+        return self._filter(lambda row: row.get(column) != value)
+
+    def gt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] > value)
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._filter(lambda row: row.get(column) in values)
+
+    def or_(self, expression):
+        # Only the "a.eq.x,b.eq.y" form the app uses
+        parts = re.findall(r"(\w+)\.eq\.([^,]+)", expression)
+        return self._filter(lambda row: any(str(row.get(column)) == value for column, value in parts))
+
+    def order(self, column, desc=False):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        request = SimpleNamespace(url=SimpleNamespace(path=f"/rest/v1/{self.table}"), method=METHODS[self.op])
+        for hook in self.backend.postgrest.session.event_hooks["request"]:
+            hook(request)
+        time.sleep(self.backend.round_trip)
+        with self.backend.lock:
+            started = time.perf_counter()
+            data = self._run()
+            self.backend.calls[threading.get_ident()] += 1
+            self.backend.total_calls += 1
+            self.backend.busy += time.perf_counter() - started
+        body = repr(data).encode()
+        response = SimpleNamespace(request=request, status_code=200, read=lambda: body)
+        for hook in self.backend.postgrest.session.event_hooks["response"]:
+            hook(response)
+        return SimpleNamespace(data=data)
+
+    def _run(self):
+        if self.op == "rpc":
+            return self._apply_changes(**self.payload)
+        rows = self.backend.tables.setdefault(self.table, [])
+        stamp = {"updated_at": now_iso()} if self.table in TIMESTAMPED else {}
+        if self.op in ("insert", "upsert"):
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            written = []
+            for row in payload:
+                existing = self.backend.by_id(self.table, row.get("id")) if self.op == "upsert" else None
+                if existing is not None:
+                    existing.update(row, **stamp)
+                else:
+                    existing = {**self.backend.defaults.get(self.table, {}), "id": next(self.backend.ids), **row, **stamp}
+                    rows.append(existing)
+                    self.backend.index(self.table, existing)
+                written.append(existing)
+            return copy.deepcopy(written)
+        matched = [row for row in rows if all(test(row) for test in self.filters)]
+        if self.op == "update":
+            for row in matched:
+                row.update(self.payload, **stamp)
+            return copy.deepcopy(matched)
+        if self.op == "delete":
+            gone = {id(row) for row in matched}
+            self.backend.tables[self.table] = [row for row in rows if id(row) not in gone]
+            for row in matched:
+                self.backend.unindex(self.table, row)
+            return copy.deepcopy(matched)
+        # Later columns break ties, so they are sorted by first (the sort is stable)
+        for column, desc in reversed(self.order_by):
+            matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        # Like PostgREST, a larger limit or none at all still gets at most max_rows
+        limit = self.backend.max_rows if self.row_limit is None else min(self.row_limit, self.backend.max_rows)
+        matched = matched[:limit]
+        if self.columns.strip() != "*":
+            columns = [column.strip() for column in self.columns.split(",")]
+            matched = [{column: row.get(column) for column in columns} for row in matched]
+        return copy.deepcopy(matched)
+
+    def _apply_changes(self, target, changes):
+        # sql/004_apply_changes.sql: a field is written if it changed after the row did
+        saved = []
+        for change in changes:
+            row = self.backend.by_id(target, change["id"])
+            if row is None:
+                continue
+            changed_at = datetime.fromisoformat(row["updated_at"]).timestamp() if row.get("updated_at") else 0.0
+            row.update({column: value for column, (value, at) in change["fields"].items() if at > changed_at})
+            row["updated_at"] = now_iso()
+            saved.append(row)
+        return copy.deepcopy(saved)
+
+
+class FakeSupabase:
+    def __init__(self, tables=None, round_trip=ROUND_TRIP, max_rows=MAX_ROWS):
+        self.tables = tables or {}
+        self.round_trip = round_trip
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        self.calls = Counter()  # thread id -> requests
+        self.total_calls = 0
+        self.busy = 0.0  # seconds spent evaluating queries, which the app's timings include
+        self.defaults = {"meal_plans": {"rating": None, "comment": None}}
+        self._ids = {}
+        for name, rows in self.tables.items():
+            for row in rows:
+                self.index(name, row)
+        self.ids = itertools.count(max((row.get("id", 0) for rows in self.tables.values() for row in rows
+                                        if isinstance(row.get("id"), int)), default=0) + 1)
+        self.postgrest = SimpleNamespace(session=SimpleNamespace(event_hooks={"request": [], "response": []}))
+        self.auth = SimpleNamespace(get_user=lambda token: SimpleNamespace(user=None))
+
+    def index(self, table, row):
+        if "id" in row:
+            self._ids[(table, row["id"])] = row
+
+    def unindex(self, table, row):
+        self._ids.pop((table, row.get("id")), None)
+
+    def by_id(self, table, row_id):
+        return self._ids.get((table, row_id))
+
+    def table(self, name):
+        return Query(self, name)
+
+    def rpc(self, fn, params=None, **kwargs):
+        # Only apply_changes, the one function the app calls
+        query = Query(self, f"rpc/{fn}")
+        query.op, query.payload = "rpc", params or {}
+        return query
+
+
+class FakeGroq:
+    # Streams a fixed shopping list in a few chunks, like the Groq SDK's stream
+    TOKEN_DELAY = 0.01
+    ANSWER = ["**Vegetables**\n", "- karotten\n", "- spinat\n", "**Other items**\n", "- tofu\n"]
+
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, temperature, stream):
+        for text in self.ANSWER:
+            time.sleep(self.TOKEN_DELAY)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None, x_groq=None)
+        usage = SimpleNamespace(total_tokens=len(self.ANSWER) * 8)
+        yield SimpleNamespace(choices=[], usage=usage, x_groq=None)
+
+
+class FakeRealtime:
+    # Joins channels instantly and pushes only what a benchmark hands to deliver()
+    channels = []  # (name, callback) of every joined channel in the process
+
+    def __init__(self, url, key, **kwargs):
+        pass
+
+    async def connect(self):
+        await asyncio.sleep(0)
+
+    def channel(self, name):
+        handlers = []
+
+        async def subscribe():
+            await self.connect()
+            FakeRealtime.channels.extend((name, callback) for callback in handlers)
+
+        return SimpleNamespace(
+            on_postgres_changes=lambda *args, callback, **kwargs: handlers.append(callback), subscribe=subscribe
+        )
+
+    async def remove_channel(self, channel):
+        await asyncio.sleep(0)
+
+    @classmethod
+    def deliver(cls, name, payload):
+        # Calls the channel's callbacks like the realtime client's receive loop does
+        for channel_name, callback in list(cls.channels):
+            if channel_name == name:
+                callback(payload)
@@ -0,0 +1,577 @@
+# Behaviour checks of the app's caches and background paths against the stand-ins
+# in backend.py. Each check_* function raises AssertionError on failure; run them
+# all, or the ones whose names contain the given words, with
+#
+#   python benchmarks/checks.py [export ...]
+
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+from urllib.request import ProxyHandler, build_opener, install_opener
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The replica and the other local caches go to a fresh directory per run
+os.environ.setdefault("MEAL_PLANNER_CACHE_DIR", tempfile.mkdtemp(prefix="meal-planner-checks-"))
+
+import pyarrow.parquet as pq
+import streamlit as st
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.runtime.secrets import Secrets
+
+from backend import FakeSupabase
+from synthetic import generate
+
+# Empty secrets, so code that reads optional settings like PROFILING runs without a secrets.toml
+st.secrets = Secrets()
+st.secrets._secrets = {}
+
+
+def in_thread(function):
+    # Result of calling `function` on a plain thread, outside any script run, the
+    # way Streamlit calls deferred download data
+    outcome = {}
+
+    def run():
+        outcome["context"] = get_script_run_ctx(suppress_warning=True)
+        try:
+            outcome["result"] = function()
+        except BaseException as error:
+            outcome["error"] = error
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    assert outcome["context"] is None
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def check_session_client_sends_user_token():
+    # A session's queries carry its user's token over the shared pooled HTTP session,
+    # the shared client keeps the anon key, and the replica pushes and pulls a
+    # household with the client of the session that used it
+    import replica
+    from supabase import create_client
+    from utils import SessionClient
+
+    shared = create_client("http://127.0.0.1:9", "anon-key")  # nothing listens there
+    sent = []
+    shared.postgrest.session.event_hooks["request"].append(lambda request: sent.append(request.headers.get_list("authorization")))
+    session = SessionClient(shared, "user-token")
+    for client in (session, shared):
+        try:
+            client.table("recipes").select("id").execute()
+        except Exception:
+            pass
+    assert sent == [["Bearer user-token"], ["Bearer anon-key"]]
+    assert session.postgrest.session is shared.postgrest.session and session.auth is shared.auth
+
+    data = generate(users=2, recipes_per_user=3, weeks=1, partner_share=0.0)
+    default, user = FakeSupabase(data["tables"], round_trip=0), FakeSupabase(data["tables"], round_trip=0)
+    local = replica.Replica(default, name="checks-clients")
+    owners = [data["users"][0][0]]
+    local.ensure_pulled(owners, user)
+    plan = data["tables"]["meal_plans"][0]
+    assert plan["user"] == owners[0]
+    local.save("meal_plans", [{"id": plan["id"], "rating": 5}])
+    deadline = time.time() + 10
+    while local.pending() and time.time() < deadline:
+        time.sleep(0.01)
+    assert default.total_calls == 0 and user.total_calls > 0 and plan["rating"] == 5
+
+
+def check_deferred_export():
+    from transfer import RECIPE_SCHEMA, deferred_export, export_recipes
+
+    data = generate(users=3, recipes_per_user=5, weeks=1)
+    backend = FakeSupabase(data["tables"], round_trip=0)
+    user_id = data["users"][0][0]
+    build = deferred_export(backend, export_recipes, "parquet", [user_id])
+    # What st.download_button does with the callable's result when the download is requested
+    body, _ = convert_data_to_bytes_and_infer_mime(in_thread(build), TypeError("Callable returned unsupported type"))
+    exported = pq.read_table(io.BytesIO(body))
+    own = [recipe for recipe in data["tables"]["recipes"] if recipe["author"] == user_id]
+    assert exported.schema.names == RECIPE_SCHEMA.names
+    assert sorted(exported.column("name").to_pylist()) == sorted(recipe["name"] for recipe in own)
+
+
+def check_shopping_list_requests_collapse():
+    # Concurrent requests for one key make one call; when that request is stopped
+    # like st.stop() does, the others take over instead of waiting forever
+    import shopping
+    from streamlit.runtime.scriptrunner_utils.exceptions import StopException
+
+    cache = shopping.ShoppingListCache()
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {"content": "- tofu", "tokens": 3}
+
+    waiting = [threading.Thread(target=lambda: cache.get_or_create("same", slow)) for _ in range(8)]
+    for thread in waiting:
+        thread.start()
+    for thread in waiting:
+        thread.join()
+    assert len(calls) == 1 and cache.get("same")["content"] == "- tofu"
+
+    def stopped():
+        started.set()
+        time.sleep(0.1)
+        raise StopException()
+
+    def lead():
+        try:
+            cache.get_or_create("stopped", stopped)
+        except StopException:
+            pass
+
+    started.clear()
+    results = []
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=lambda: results.append(cache.get_or_create("stopped", lambda: {"content": "- rice"})), daemon=True)
+    follower.start()
+    leader.join()
+    follower.join(timeout=5)
+    assert not follower.is_alive() and results == [{"content": "- rice"}]
+
+
+def check_habit_rollups_prune_by_key():
+    # Deleting a plan drops exactly its zeroed rollup rows, through the primary keys
+    import habits
+
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+    db.execute("CREATE TABLE recipes (id INTEGER PRIMARY KEY, ingredients TEXT)")
+    db.execute("CREATE TABLE meal_plans (id INTEGER PRIMARY KEY, user TEXT, week TEXT, recipe INTEGER)")
+    db.execute("INSERT INTO recipes VALUES (1, ?)", (json.dumps(["200 g reis", "tofu", "karotten"]),))
+    habits.create(db)
+    plans = [{"user": "a", "week": week, "recipe": 1, "rating": 4} for week in ("2024-W01", "2024-W02")]
+    for plan in plans:
+        habits.on_write(db, "meal_plans", None, plan)
+    statements = []
+    db.set_trace_callback(statements.append)
+    habits.on_write(db, "meal_plans", plans[0], None)
+    db.set_trace_callback(None)
+    assert [row["week"] for row in db.execute("SELECT week FROM habit_weeks")] == ["2024-W02"]
+    assert {row["week"] for row in db.execute("SELECT week FROM habit_counts")} == {"2024-W02"}
+    assert db.execute("SELECT meals FROM habit_recipes").fetchone()["meals"] == 1
+    deletes = [statement for statement in statements if statement.startswith("DELETE")]
+    assert deletes
+    for statement in deletes:
+        plan = " ".join(row["detail"] for row in db.execute(f"EXPLAIN QUERY PLAN {statement}"))
+        assert plan.startswith("SEARCH"), plan
+
+
+def check_page_runs_end_on_stop():
+    # A run that ends in st.stop(), st.rerun() or an error is still recorded, and
+    # leaves no trace or round-trip counter on the thread
+    from streamlit.runtime.scriptrunner_utils.exceptions import RerunException, StopException
+
+    import profiling
+    import utils
+
+    st.secrets._secrets["PROFILING"] = True
+    before = len(profiling.traces())
+
+    request = SimpleNamespace(url=SimpleNamespace(path="/rest/v1/recipes"), method="GET")
+
+    def run(ending):
+        try:
+            with utils.track_page("Checks"):
+                utils._on_request(request)
+                utils._on_response(SimpleNamespace(request=request, status_code=200, read=lambda: b""))
+                raise ending
+        except BaseException:
+            pass
+        return profiling.current(), getattr(utils._request_context, "run", None)
+
+    for ending in (StopException(), RerunException(None), ValueError("broken")):
+        assert in_thread(lambda: run(ending)) == ((None, None), None)
+    traces = profiling.traces()[before:]
+    assert [trace["page"] for trace in traces] == ["Checks"] * 3
+    assert all(trace["spans"][0]["end"] is not None for trace in traces)
+    assert [trace["spans"][0]["error"] for trace in traces] == [None, None, "ValueError('broken')"]
+    assert utils.page_stats()["Checks"]["runs"] == 3 and utils.page_stats()["Checks"]["requests"] == 3
+    del st.secrets._secrets["PROFILING"]
+
+
+def check_public_recipes_refresh_pages_through_ties():
+    # Changes sharing one updated_at across several refresh pages all arrive
+    import public_recipes
+
+    data = generate(users=4, recipes_per_user=10, weeks=1, public_share=0.5)
+    backend = FakeSupabase(data["tables"], round_trip=0)
+    batch_size, public_recipes.FETCH_BATCH_SIZE = public_recipes.FETCH_BATCH_SIZE, 3
+    try:
+        shared = public_recipes.PublicRecipes(backend)
+        recipes = data["tables"]["recipes"]
+        for recipe in recipes:
+            recipe.update(public=not recipe["public"], updated_at="2024-02-01T00:00:00+00:00")
+        shared.refresh()
+        assert sorted(shared._recipes) == sorted(recipe["id"] for recipe in recipes if recipe["public"])
+        # A row committed later with the same updated_at as the cursor
+        late = {**recipes[0], "id": max(recipe["id"] for recipe in recipes) + 1, "public": True}
+        recipes.append(late)
+        shared.refresh()
+        assert late["id"] in shared._recipes
+    finally:
+        public_recipes.FETCH_BATCH_SIZE = batch_size
+
+
+def check_replica_pull_pages_past_max_rows():
+    # A household with more rows than the server returns per request is pulled
+    # completely, changes tied on one updated_at across pages all arrive, and only
+    # rows deleted on the server are removed locally
+    import replica
+
+    data = generate(users=2, recipes_per_user=30, weeks=40, partner_share=1.0)
+    backend = FakeSupabase(data["tables"], round_trip=0, max_rows=20)
+    owners = [user_id for user_id, _ in data["users"]]
+    batch_size, replica.PULL_BATCH_SIZE = replica.PULL_BATCH_SIZE, 20
+    try:
+        local = replica.Replica(backend, name="checks-pull")
+        local.pull(owners)
+        plans = data["tables"]["meal_plans"]
+        assert len(plans) > 100 and len(local.meal_plans(owners)) == len(plans)
+        assert len(local.recipes(owners)) == len(data["tables"]["recipes"])
+
+        for plan in plans:
+            plan.update(rating=5, updated_at="2024-02-01T00:00:00+00:00")
+        gone = plans.pop(7)
+        backend.unindex("meal_plans", gone)
+        local.pull(owners)
+        pulled = local.meal_plans(owners)
+        assert sorted(plan["id"] for plan in pulled) == sorted(plan["id"] for plan in plans)
+        assert all(plan["rating"] == 5 for plan in pulled)
+    finally:
+        replica.PULL_BATCH_SIZE = batch_size
+
+
+def check_replica_saves_rows_missing_locally():
+    # An update of a row the replica does not hold is kept and pushed in one request;
+    # if the row is gone on the server as well, it is dropped again
+    import replica
+
+    data = generate(users=1, recipes_per_user=5, weeks=1)
+    backend = FakeSupabase(data["tables"], round_trip=0)
+    local = replica.Replica(backend, name="checks-save")
+    kept, gone = data["tables"]["meal_plans"][:2]
+    backend.table("meal_plans").delete().eq("id", gone["id"]).execute()
+    requests = backend.total_calls
+    assert local.save("meal_plans", [{"id": kept["id"], "rating": 4}, {"id": gone["id"], "rating": 4}]) == [kept["id"], gone["id"]]
+    deadline = time.time() + 10
+    while local.pending() and time.time() < deadline:
+        time.sleep(0.01)
+    assert backend.total_calls - requests == 1
+    assert backend.by_id("meal_plans", kept["id"])["rating"] == 4
+    assert local.get("meal_plans", kept["id"]) == {**backend.by_id("meal_plans", kept["id"]), "rating": 4}
+    assert local.get("meal_plans", gone["id"]) is None
+
+
+def check_household_week_has_one_plan_per_day():
+    # Where both partners planned a day, the Meal Planner and the Shopping List both
+    # get the newer plan, and a change not pushed yet counts as newest
+    import replica
+    from utils import household_week
+
+    household = ("user-a", "user-b")
+    week = "2024-03-04"
+    plans = [
+        {"id": 1, "week": week, "day": 0, "recipe": 10, "user": "user-a", "updated_at": "2024-03-01T10:00:00+00:00"},
+        {"id": 2, "week": week, "day": 0, "recipe": 20, "user": "user-b", "updated_at": "2024-03-01T11:00:00+00:00"},
+        {"id": 3, "week": week, "day": 1, "recipe": 30, "user": "user-b", "updated_at": "2024-03-01T12:00:00+00:00"},
+    ]
+    local = replica.Replica(FakeSupabase({"meal_plans": plans}, round_trip=0), name="checks-household")
+    local.apply_remote("meal_plans", plans)
+    assert {day: entry["recipe"] for day, entry in household_week(local, household, week).items()} == {0: 20, 1: 30}
+    with local._lock:  # keeps the sync thread from pushing the new plan right away
+        local.save("meal_plans", [{"week": week, "day": 1, "recipe": 40, "user": "user-a"}])
+        assert {day: entry["recipe"] for day, entry in household_week(local, household, week).items()} == {0: 20, 1: 40}
+
+
+RECIPE_PAGE = """<html><head><script type="application/ld+json">{{"@context": "https://schema.org", "@type": "Recipe",
+"name": "{name}", "recipeIngredient": {ingredients}, "recipeInstructions": [{{"@type": "HowToStep", "text": "{instructions}"}}]}}
+</script></head><body></body></html>"""
+
+
+class RecipeSites(BaseHTTPRequestHandler):
+    # Local stand-in for the recipe sites, used as the HTTP proxy so the importer
+    # asks for the real URLs and recipe_scrapers sees hosts it supports. Serves
+    # PAGES by path, answers If-None-Match with 304 and records every request.
+    PAGES = {}
+    SLOW = 1.0  # seconds /slow takes to answer
+    downloads = []  # (host, path, time)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        type(self).downloads.append((url.netloc, url.path, time.monotonic()))
+        if url.path == "/slow":
+            time.sleep(self.SLOW)  # the importer has given up by now
+            return
+        page = self.PAGES.get(url.path)
+        if page is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{hash(page)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = page.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def recipe_page(name, ingredients, instructions) -> str:
+    return RECIPE_PAGE.format(name=name, ingredients=json.dumps(ingredients), instructions=instructions)
+
+
+def check_recipe_import_offline():
+    # URL imports run concurrently on the pool, wait between downloads from one
+    # host without holding up other hosts, time out, skip URLs already submitted and
+    # recipes the user already has, and only the newest finished jobs are kept
+    import importer
+
+    user_id = "user-00000"
+    backend = FakeSupabase({"recipes": [{
+        "id": 1, "name": "Linsen Dal", "ingredients": ["200 g rote Linsen"], "instructions": "Alles kochen.",
+        "author": user_id, "public": False,
+    }]}, round_trip=0)
+    RecipeSites.PAGES = {
+        "/rezepte/1/dal.html": recipe_page("Linsen Dal", ["200 g rote Linsen"], "Alles kochen."),
+        "/rezepte/2/curry.html": recipe_page("Tofu Curry", ["tofu", "1 Dose Kokosmilch"], "Anbraten."),
+        "/rezepte/3/bowl.html": recipe_page("Reis Bowl", ["200 g reis", "karotten"], "Kochen."),
+        "/recipes/pasta": recipe_page("Spinach Pasta", ["400 g pasta", "spinat"], "Boil."),
+    }
+    RecipeSites.downloads = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RecipeSites)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    install_opener(build_opener(ProxyHandler({"http": f"http://127.0.0.1:{server.server_port}"})))
+    settings = importer.HOST_MIN_INTERVAL, importer.FETCH_TIMEOUT, importer.FINISHED_JOBS_KEPT
+    importer.HOST_MIN_INTERVAL, importer.FETCH_TIMEOUT = 0.2, 0.5
+    try:
+        queue = importer.ImportQueue(backend)
+        urls = [
+            "http://www.chefkoch.de/rezepte/1/dal.html",
+            "http://www.chefkoch.de/rezepte/2/curry.html",
+            "http://www.chefkoch.de/rezepte/3/bowl.html",
+            "http://www.bbcgoodfood.com/recipes/pasta",
+            "http://www.bbcgoodfood.com/recipes/missing",
+            "http://www.allrecipes.com/slow",
+            "http://chefkoch.de/rezepte/2/curry.html/?utm_source=newsletter",
+        ]
+        job_ids = queue.submit(urls, user_id)
+        assert job_ids[-1] == job_ids[1] and len(set(job_ids)) == 6
+        deadline = time.time() + 30
+        while any(job["status"] in importer.PENDING_STATUSES for job in queue.jobs(job_ids)) and time.time() < deadline:
+            time.sleep(0.05)
+        statuses = [job["status"] for job in queue.jobs(job_ids)]
+        assert statuses == ["duplicate", "done", "done", "done", "failed", "failed", "done"], statuses
+        assert sorted(recipe["name"] for recipe in backend.tables["recipes"]) == [
+            "Linsen Dal", "Reis Bowl", "Spinach Pasta", "Tofu Curry"
+        ]
+        chefkoch = sorted(at for host, _, at in RecipeSites.downloads if host == "www.chefkoch.de")
+        assert len(chefkoch) == 3 and all(b - a >= 0.15 for a, b in zip(chefkoch, chefkoch[1:]))
+        # A finished URL is not fetched again
+        downloads = len(RecipeSites.downloads)
+        assert queue.submit(urls[1:2], user_id) == job_ids[1:2] and len(RecipeSites.downloads) == downloads
+        # Only the newest finished jobs are kept
+        importer.FINISHED_JOBS_KEPT = 2
+        retry = queue.submit(urls[4:5], user_id)
+        while queue.jobs(retry)[0]["status"] in importer.PENDING_STATUSES and time.time() < deadline:
+            time.sleep(0.05)
+        kept = [job["id"] for job in queue.jobs(job_ids + retry)]
+        assert len(kept) == 2 and kept[-1] == retry[0], kept
+        # A burst for one host does not hold up the other hosts
+        burst = [f"http://www.chefkoch.de/rezepte/{n}/missing.html" for n in range(10, 16)]
+        started = time.monotonic()
+        queue.submit(burst + ["http://www.allrecipes.com/burst"], user_id)
+        deadline = time.time() + 30
+        while len([path for _, path, at in RecipeSites.downloads if at >= started]) < len(burst) + 1 and time.time() < deadline:
+            time.sleep(0.05)
+        order = [path for _, path, at in sorted(RecipeSites.downloads, key=lambda download: download[2]) if at >= started]
+        assert order.index("/burst") < 2, order
+    finally:
+        importer.HOST_MIN_INTERVAL, importer.FETCH_TIMEOUT, importer.FINISHED_JOBS_KEPT = settings
+        install_opener(None)
+        server.shutdown()
+
+
+def check_shopping_list_aggregation():
+    # Amounts are parsed in German and English, merged across spellings and units,
+    # and only lines that are not a single ingredient are left for Groq
+    from ingredients import parse_ingredient
+    from shopping import aggregate
+
+    parsed = {text: parse_ingredient(text) for text in [
+        "½ TL Salz", "1,5 kg Kartoffeln", "2-3 Zwiebeln", "1 1/2 cups rice", "400 g carrots (diced)", "pinch of salt",
+    ]}
+    assert {text: (item["quantity"], item["unit"], item["name"]) for text, item in parsed.items()} == {
+        "½ TL Salz": (0.5, "tsp", "salt"),
+        "1,5 kg Kartoffeln": (1.5, "kg", "kartoffel"),
+        "2-3 Zwiebeln": (3.0, "piece", "zwiebel"),
+        "1 1/2 cups rice": (1.5, "cup", "rice"),
+        "400 g carrots (diced)": (400.0, "g", "karotten"),
+        "pinch of salt": (1, "pinch", "salt"),
+    }
+    sentence = "Cook the rice in plenty of salted water until it is soft and fluffy"
+    groups, unparsed = aggregate([
+        {"ingredients": ["200 g Karotten", "1 kg carrots", "500 ml Milch", "0,5 l Milch", sentence]},
+        {"ingredients": ["2 Zwiebeln", "1 onion", "1 Prise Salz", sentence]},
+    ])
+    assert groups["vegetables"] == [("karotten", ["1.2 kg"]), ("zwiebel", ["3"])]
+    assert groups["other"] == [("milch", ["1 l"])] and groups["at home"] == [("salt", ["1 pinch"])]
+    assert unparsed == [sentence]
+
+
+def check_weekly_planner_rules():
+    # Over a synthetic library: no recipe twice in a week, no base or protein on two
+    # days in a row, fixed days left alone and disliked recipes never planned, also
+    # when only one partner dislikes them
+    from planner import DAYS_PER_WEEK, DISLIKE_RATING, PlannerIndex, average_ratings, disliked_recipes, plan_weeks
+
+    data = generate(20, 200, weeks=8, partner_share=0.0, seed=3)
+    user = data["users"][0][0]
+    recipes = [recipe for recipe in data["tables"]["recipes"] if recipe["author"] == user]
+    index = PlannerIndex(recipes)
+    averages = average_ratings(row for row in data["tables"]["meal_plans"] if row["user"] == user)
+    disliked = {recipe_id for recipe_id, rating in averages.items() if rating <= DISLIKE_RATING}
+    assert disliked, "the synthetic ratings should include disliked recipes"
+    liked = [recipe["id"] for recipe in recipes if recipe["id"] not in disliked]
+    weeks = [{}, {0: liked[0], 3: liked[1]}, {2: liked[2]}, {4: liked[3]}]
+
+    for fixed, planned in zip(weeks, plan_weeks(index, averages, weeks)):
+        assert not planned.keys() & fixed.keys() and not disliked.intersection(planned.values())
+        week = {**planned, **fixed}
+        assert len(set(week.values())) == len(week) == DAYS_PER_WEEK
+        for day in range(1, DAYS_PER_WEEK):
+            today, yesterday = index.features[week[day]], index.features[week[day - 1]]
+            if day in planned or day - 1 in planned:
+                assert today.base != yesterday.base and today.protein != yesterday.protein, (week, day)
+
+    # With nothing but tofu in the library, days in a row cannot both be filled
+    tofu = [{"id": n, "ingredients": ["200 g tofu", f"{n} karotten"]} for n in range(3)]
+    assert sorted(plan_weeks(PlannerIndex(tofu), {}, [{}])[0]) == [0, 2, 4]
+
+    # One partner's 1 star and the other's 5 stars average to 3, but it stays a dislike
+    split = [{"user": "user-a", "recipe": liked[0], "rating": 1}, {"user": "user-b", "recipe": liked[0], "rating": 5}]
+    assert average_ratings(split)[liked[0]] > DISLIKE_RATING and disliked_recipes(split) == {liked[0]}
+    planned = plan_weeks(index, {**averages, **average_ratings(split)}, [{}] * 4, disliked=disliked_recipes(split))
+    assert all(liked[0] not in week.values() for week in planned)
+
+
+class ChatCompletions(BaseHTTPRequestHandler):
+    # Local stand-in for Groq's OpenAI-compatible streaming endpoint. How it answers
+    # depends on the model: "stuck" never answers in time, "retired" is gone, and
+    # "flaky" fails once with a 503 before it streams ANSWER chunk by chunk.
+    ANSWER = ["- karotten\n", "- spinat\n", "- tofu\n"]
+    CHUNK_DELAY = 0.2
+    STUCK_FOR = 1.0
+    requests = []
+
+    def do_POST(self):
+        model = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["model"]
+        type(self).requests.append(model)
+        if model == "stuck":
+            time.sleep(self.STUCK_FOR)  # the client has given up by now
+            return
+        if model == "retired" or (model == "flaky" and self.requests.count("flaky") == 1):
+            status, message = (404, "The model has been decommissioned") if model == "retired" else (503, "Try again")
+            body = json.dumps({"error": {"message": message, "type": "invalid_request_error"}}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunk = {"id": "chat-1", "object": "chat.completion.chunk", "created": 0, "model": model}
+        for text in self.ANSWER:
+            delta = {**chunk, "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(delta)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.CHUNK_DELAY)
+        usage = {"prompt_tokens": 20, "completion_tokens": 9, "total_tokens": 29}
+        last = {**chunk, "choices": [], "x_groq": {"id": "req-1", "usage": usage}}
+        self.wfile.write(f"data: {json.dumps(last)}\n\ndata: [DONE]\n\n".encode())
+
+    def log_message(self, *args):
+        pass
+
+
+def check_llm_streaming_retries_and_fallback():
+    # Timeouts and 503s are retried, a retired model is skipped, and the answer is
+    # streamed: the first token arrives long before the last
+    from groq import Groq
+
+    import llm
+
+    ChatCompletions.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatCompletions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    backoff, llm.LLM_BACKOFF = llm.LLM_BACKOFF, 0.01
+    try:
+        client = Groq(api_key="check", base_url=f"http://127.0.0.1:{server.server_port}", timeout=0.5, max_retries=0)
+        call = {}
+        arrived = []
+        for text in llm.stream_completion(client, "karotten, spinat, tofu", ["stuck", "retired", "flaky"], call):
+            arrived.append((text, time.perf_counter()))
+        assert "".join(text for text, _ in arrived) == "".join(ChatCompletions.ANSWER)
+        assert ChatCompletions.requests == ["stuck"] * (llm.LLM_RETRIES + 1) + ["retired", "flaky", "flaky"]
+        assert call["model"] == "flaky" and call["attempts"] == llm.LLM_RETRIES + 4 and call["tokens"] == 29
+        streamed_for = arrived[-1][1] - arrived[0][1]
+        assert streamed_for >= (len(ChatCompletions.ANSWER) - 1) * ChatCompletions.CHUNK_DELAY * 0.8
+        assert call["ttft"] < call["latency"] - streamed_for * 0.8
+        assert llm.call_log()[-1]["model"] == "flaky"
+    finally:
+        llm.LLM_BACKOFF = backoff
+        server.shutdown()
+
+
+CHECKS = {name: function for name, function in globals().items() if name.startswith("check_")}
+
+
+def main():
+    selected = [name for name in CHECKS if not sys.argv[1:] or any(word in name for word in sys.argv[1:])]
+    failed = 0
+    for name in selected:
+        try:
+            CHECKS[name]()
+            print(f"ok    {name}")
+        except Exception:
+            failed += 1
+            print(f"FAIL  {name}")
+            traceback.print_exc()
+    print(f"\n{len(selected) - failed} passed, {failed} failed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
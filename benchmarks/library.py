@@ -0,0 +1,69 @@
+# The Recipe Library against a synthetic library of a given size: the first run
+# of the process (which loads the shared public recipes), new sessions, reruns,
+# the next list page, and N concurrent sessions on the page. Run once per size;
+# the process-wide caches and the replica are built for one library.
+#
+#   python benchmarks/library.py --recipes 10000
+#   python benchmarks/library.py --recipes 100000 --concurrency 1,4,16,64
+
+import argparse
+import random
+import time
+
+from load_test import install, measure_concurrency, percentile, saturation, session, timed_run
+from backend import FakeSupabase
+from synthetic import generate
+
+PAGE = "pages/2_Recipe_Library.py"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the Recipe Library against a large synthetic library.")
+    parser.add_argument("--recipes", type=int, default=10000)
+    parser.add_argument("--recipes-per-user", type=int, default=50)
+    parser.add_argument("--public-share", type=float, default=0.3)
+    parser.add_argument("--round-trip-ms", type=float, default=5, help="simulated Supabase latency")
+    parser.add_argument("--sessions", type=int, default=10, help="new sessions for the latencies")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated numbers of concurrent sessions")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per concurrency level")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    data = generate(args.recipes // args.recipes_per_user, args.recipes_per_user, weeks=4,
+                    public_share=args.public_share, seed=args.seed)
+    backend = FakeSupabase(data["tables"], round_trip=args.round_trip_ms / 1000)
+    install(backend)
+    users = data["users"]
+    public = sum(recipe["public"] for recipe in data["tables"]["recipes"])
+    print(f"{len(data['tables']['recipes'])} recipes of {len(users)} users, {public} public\n")
+
+    started = time.perf_counter()
+    timed_run(session(PAGE, users[0]))
+    print(f"first run of the process     {1000 * (time.perf_counter() - started):8.0f} ms")
+
+    cold, warm, next_page, queries = [], [], [], []
+    for user in random.sample(users, args.sessions):
+        at = session(PAGE, user)
+        calls = backend.total_calls
+        cold.append(timed_run(at))
+        warm.append(timed_run(at))
+        queries.append(backend.total_calls - calls)
+        at.button(key="public_next").click()
+        next_page.append(timed_run(at))
+    print(f"new session               p50 {1000 * percentile(cold, 0.5):8.0f} ms")
+    print(f"rerun                     p50 {1000 * percentile(warm, 0.5):8.0f} ms   p95 {1000 * percentile(warm, 0.95):6.0f} ms")
+    print(f"next page of public ones  p50 {1000 * percentile(next_page, 0.5):8.0f} ms")
+    print(f"queries, first run and rerun {sum(queries) / len(queries):5.1f}")
+
+    levels = measure_concurrency(users, [int(level) for level in args.concurrency.split(",")], args.duration, pages=[PAGE])
+    print(f"\n{'sessions':>8} {'runs/s':>8} {'p50':>8} {'p95':>8} {'errors':>7}")
+    for level in levels:
+        print(f"{level['sessions']:8} {level['runs_per_s']:8.1f} {level['p50_ms']:6.0f}ms {level['p95_ms']:6.0f}ms {level['errors']:7}")
+        if level["first_error"]:
+            print(f"{'':8} first error: {level['first_error']}")
+    print(f"\nThroughput stops growing at about {saturation(levels)} concurrent sessions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Time from a partner's edit of a meal plan until it shows on the Meal Planner of
+# the other partner's open session. The edit is written to the stand-in backend,
+# pushed through the realtime stand-in after a simulated network delay, and picked
+# up by the session on its next live-update tick. Ticks are page runs through
+# AppTest every --interval seconds; in the browser only the small timer fragment
+# runs, so the tick times here are an upper bound.
+#
+#   python benchmarks/live.py --edits 30 --interval 3
+
+import argparse
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from load_test import install, percentile, session, timed_run
+from backend import FakeRealtime, FakeSupabase
+from synthetic import generate
+
+from live_updates import meal_plan_feed
+from replica import replica
+
+PAGE = "pages/1_Meal_Planner.py"
+SUBSCRIBE_TIMEOUT = 10  # seconds to wait for the session's channel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long a partner's edit takes to show up.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--recipes-per-user", type=int, default=50)
+    parser.add_argument("--edits", type=int, default=30)
+    parser.add_argument("--interval", type=float, default=3, help="seconds between ticks, LIVE_UPDATE_EVERY of the page")
+    parser.add_argument("--push-delay", type=float, default=0.05, help="seconds from commit to the realtime message")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    data = generate(args.users, args.recipes_per_user, weeks=4, partner_share=1.0, seed=args.seed)
+    backend = FakeSupabase(data["tables"])
+    install(backend)
+    pair = data["tables"]["partners"][0]
+    user = next(user for user in data["users"] if user[0] == pair["partnerA"])
+    channel = f"meal_plans:{':'.join(sorted(pair.values()))}"
+
+    at = session(PAGE, user)
+    timed_run(at)
+    deadline = time.time() + SUBSCRIBE_TIMEOUT
+    while not any(name == channel for name, _ in FakeRealtime.channels) and time.time() < deadline:
+        time.sleep(0.01)
+    local = replica(backend)
+    week = (date.today() - timedelta(days=date.today().weekday())).strftime("%Y-%m-%d")
+    rows = [row for row in data["tables"]["meal_plans"] if row["user"] in pair.values() and row["week"] == week]
+
+    pending = {}  # row id -> (rating, commit time)
+    shown = threading.Event()
+    shown.set()
+
+    def partner():
+        for _ in range(args.edits):
+            shown.wait()
+            shown.clear()
+            time.sleep(rng.uniform(0, args.interval))
+            row = rng.choice(rows)
+            rating = rng.choice([rating for rating in range(1, 6) if rating != row.get("rating")])
+            updated = backend.table("meal_plans").update({"rating": rating}).eq("id", row["id"]).execute().data[0]
+            pending[row["id"]] = (rating, time.time())
+            time.sleep(args.push_delay)
+            FakeRealtime.deliver(channel, {"data": {
+                "type": "UPDATE", "record": updated, "old_record": {"id": row["id"]}, "commit_timestamp": updated["updated_at"],
+            }})
+
+    threading.Thread(target=partner, daemon=True).start()
+    latencies, ticks = [], []
+    next_tick = time.perf_counter()
+    while len(latencies) < args.edits:
+        time.sleep(max(0.0, next_tick - time.perf_counter()))
+        next_tick += args.interval
+        ticks.append(timed_run(at))
+        for row_id, (rating, committed) in list(pending.items()):
+            if local.get("meal_plans", row_id)["rating"] == rating:
+                latencies.append(time.time() - committed)
+                del pending[row_id]
+                shown.set()
+
+    lag = meal_plan_feed().lag_stats()
+    print(f"{args.edits} edits by the partner, a tick every {args.interval:g} s, {1000 * args.push_delay:.0f} ms push delay\n")
+    print(f"  edit until shown      p50 {1000 * percentile(latencies, 0.5):6.0f} ms   p95 {1000 * percentile(latencies, 0.95):6.0f} ms"
+          f"   max {1000 * max(latencies):6.0f} ms")
+    print(f"  commit until applied  p50 {1000 * lag['p50']:6.0f} ms   p95 {1000 * lag['p95']:6.0f} ms   (the page's own record)")
+    print(f"  page run per tick     p50 {1000 * percentile(ticks, 0.5):6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
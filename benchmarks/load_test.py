@@ -0,0 +1,247 @@
+# Drives Home.py and every page through Streamlit's AppTest against the stand-ins
+# in backend.py, with synthetic data from synthetic.py. Reports per page the rerun
+# latency, Supabase round trips and memory per session, then runs N concurrent
+# sessions to find where the single-process server saturates.
+#
+#   python benchmarks/load_test.py --users 200 --recipes-per-user 50 --weeks 52 --concurrency 1,2,4,8,16
+#
+# Everything runs in this one process, like the app on a single server; the time
+# the stand-in backend spends evaluating queries is reported separately. Memory per
+# session is measured with tracemalloc; values of a few KB either way are noise from
+# background threads.
+
+import argparse
+import gc
+import glob
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The replica and the other local caches go to a fresh directory per run
+os.environ.setdefault("MEAL_PLANNER_CACHE_DIR", tempfile.mkdtemp(prefix="meal-planner-bench-"))
+
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+from unittest.mock import MagicMock
+
+import live_updates
+import llm
+import utils
+from backend import FakeGroq, FakeRealtime, FakeSupabase
+from synthetic import generate
+
+PAGES = ["Home.py"] + sorted(os.path.relpath(path, ROOT) for path in glob.glob(os.path.join(ROOT, "pages", "*.py")))
+SECRETS = {"SUPABASE_URL": "http://bench.invalid", "SUPABASE_KEY": "bench", "GROQ_API_KEY": "bench"}
+RUN_TIMEOUT = 120  # seconds per script run
+
+
+def _click(label):
+    def action(at):
+        button = next((button for button in at.button if button.label.startswith(label)), None)
+        if button is not None:
+            button.click()
+    return action
+
+
+def _leftovers(at):
+    at.text_area[0].input("karotten, spinat, tofu, 200 g rice")
+    at.button[0].click()
+
+
+# One interaction per page after the first run, so the write and LLM paths are measured too
+ACTIONS = {
+    "pages/1_Meal_Planner.py": _click("✨ Auto-fill"),
+    "pages/3_Shopping_List.py": _click("Ask Groq"),
+    "pages/4_Leftover_Finder.py": _leftovers,
+}
+
+
+def install(backend):
+    utils.create_client = lambda url, key: backend
+    llm.Groq = FakeGroq
+    live_updates.AsyncRealtimeClient = FakeRealtime
+
+    # AppTest swaps in a mock runtime and the secrets for the length of each run and
+    # resets them afterwards, which breaks runs on other threads. One runtime and one
+    # set of secrets for the whole process, like a real server, avoids that.
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    st.secrets = Secrets()
+    st.secrets._secrets = dict(SECRETS)
+
+
+def session(page, user) -> AppTest:
+    at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=RUN_TIMEOUT)
+    at.session_state["cookies"] = {}
+    at.session_state["user"] = SimpleNamespace(id=user[0], email=user[1])
+    return at
+
+
+def timed_run(at) -> float:
+    started = time.perf_counter()
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return time.perf_counter() - started
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] if values else float("nan")
+
+
+def measure_pages(backend, users, sessions, reruns) -> dict:
+    # Cold first run, the page's interaction and warm reruns of a few sessions per page
+    results = {}
+    for page in PAGES:
+        cold, warm, queries, busy = [], [], [], []
+        for user in random.sample(users, sessions):
+            at = session(page, user)
+            for n in range(reruns + 2):
+                if n == 1 and page in ACTIONS:
+                    ACTIONS[page](at)
+                calls, backend_busy = backend.total_calls, backend.busy
+                (cold if n == 0 else warm).append(timed_run(at))
+                queries.append(backend.total_calls - calls)
+                busy.append(backend.busy - backend_busy)
+        results[page] = {
+            "cold_p50_ms": 1000 * percentile(cold, 0.5),
+            "warm_p50_ms": 1000 * percentile(warm, 0.5),
+            "warm_p95_ms": 1000 * percentile(warm, 0.95),
+            "queries_per_run": sum(queries) / len(queries),
+            "backend_ms_per_run": 1000 * sum(busy) / len(busy),
+        }
+    return results
+
+
+def measure_memory(users, sessions) -> dict:
+    # Memory still held after a session's first run, averaged over a few sessions.
+    # Process-wide caches are warm by now, so this is what each extra session costs.
+    results = {}
+    tracemalloc.start()
+    for page in PAGES:
+        timed_run(session(page, random.choice(users)))  # settles the page's lazily built caches
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = []
+        for user in random.sample(users, sessions):
+            at = session(page, user)
+            timed_run(at)
+            kept.append(at)
+        gc.collect()
+        results[page] = (tracemalloc.get_traced_memory()[0] - before) / sessions / 1024
+        del kept
+    tracemalloc.stop()
+    return results
+
+
+def measure_concurrency(users, levels, duration, pages=PAGES) -> list:
+    # N threads, each opening sessions on random pages and rerunning them, for
+    # `duration` seconds per level
+    results = []
+    for level in levels:
+        latencies, errors = [], []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def worker():
+            rng = random.Random()
+            while time.perf_counter() < deadline:
+                at = session(rng.choice(pages), rng.choice(users))
+                for _ in range(3):
+                    try:
+                        elapsed = timed_run(at)
+                    except Exception as e:
+                        with lock:
+                            errors.append(str(e))
+                        break
+                    with lock:
+                        latencies.append(elapsed)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(level)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        results.append({
+            "sessions": level,
+            "runs_per_s": len(latencies) / elapsed,
+            "p50_ms": 1000 * percentile(latencies, 0.5),
+            "p95_ms": 1000 * percentile(latencies, 0.95),
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None,
+        })
+    return results
+
+
+def saturation(levels) -> int:
+    # The first level after which more sessions add less than 10% throughput
+    for previous, level in zip(levels, levels[1:]):
+        if level["runs_per_s"] < 1.1 * previous["runs_per_s"]:
+            return previous["sessions"]
+    return levels[-1]["sessions"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the pages headlessly against local stand-ins.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--recipes-per-user", type=int, default=30)
+    parser.add_argument("--weeks", type=int, default=26, help="meal-plan history per user")
+    parser.add_argument("--round-trip-ms", type=float, default=5, help="simulated Supabase latency")
+    parser.add_argument("--sessions", type=int, default=3, help="sessions per page for latency and memory")
+    parser.add_argument("--reruns", type=int, default=3, help="warm reruns per session")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma-separated numbers of concurrent sessions")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per concurrency level")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    data = generate(args.users, args.recipes_per_user, args.weeks, seed=args.seed)
+    backend = FakeSupabase(data["tables"], round_trip=args.round_trip_ms / 1000)
+    install(backend)
+    users = data["users"]
+    print(f"{len(users)} users, {len(data['tables']['recipes'])} recipes, {len(data['tables']['meal_plans'])} planned meals")
+
+    pages = measure_pages(backend, users, args.sessions, args.reruns)
+    memory = measure_memory(users, args.sessions)
+    print(f"\n{'page':32} {'cold p50':>9} {'warm p50':>9} {'warm p95':>9} {'queries':>8} {'backend':>8} {'KB/session':>11}")
+    for page, stats in pages.items():
+        print(
+            f"{page:32} {stats['cold_p50_ms']:7.0f}ms {stats['warm_p50_ms']:7.0f}ms {stats['warm_p95_ms']:7.0f}ms "
+            f"{stats['queries_per_run']:8.1f} {stats['backend_ms_per_run']:6.1f}ms {memory[page]:11.0f}"
+        )
+
+    levels = measure_concurrency(users, [int(level) for level in args.concurrency.split(",")], args.duration)
+    print(f"\n{'sessions':>8} {'runs/s':>8} {'p50':>8} {'p95':>8} {'errors':>7}")
+    for level in levels:
+        print(f"{level['sessions']:8} {level['runs_per_s']:8.1f} {level['p50_ms']:6.0f}ms {level['p95_ms']:6.0f}ms {level['errors']:7}")
+    print(f"\nThroughput stops growing at about {saturation(levels)} concurrent sessions.")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "pages": pages, "memory_kb": memory, "concurrency": levels}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
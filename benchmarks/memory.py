@@ -0,0 +1,72 @@
+# Memory of the shared public-recipe cache and of N concurrent Recipe Library
+# sessions, measured with tracemalloc. Compares the compact shared copy with the
+# plain list of dicts each session would otherwise keep.
+#
+#   python benchmarks/memory.py --users 1000 --recipes-per-user 50 --sessions 1000
+
+import argparse
+import gc
+import random
+import tracemalloc
+
+from load_test import install, session, timed_run
+from backend import FakeSupabase
+from synthetic import generate
+
+from public_recipes import COLUMNS, PublicRecipes
+
+PAGE = "pages/2_Recipe_Library.py"
+
+
+def allocated(build):
+    # Bytes still held by what `build` returns
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    return kept, tracemalloc.get_traced_memory()[0] - before
+
+
+def open_sessions(users, count) -> list:
+    sessions = []
+    for _ in range(count):
+        at = session(PAGE, random.choice(users))
+        timed_run(at)
+        sessions.append(at)
+    return sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory of the public-recipe cache and of many sessions.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--recipes-per-user", type=int, default=50)
+    parser.add_argument("--public-share", type=float, default=0.3)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    data = generate(args.users, args.recipes_per_user, weeks=4, public_share=args.public_share, seed=args.seed)
+    backend = FakeSupabase(data["tables"], round_trip=0)
+    install(backend)
+    tracemalloc.start()
+
+    shared, shared_bytes = allocated(lambda: PublicRecipes(backend))
+    rows, rows_bytes = allocated(lambda: backend.table("recipes").select(COLUMNS).eq("public", True).execute().data)
+    print(f"{len(shared)} public recipes")
+    print(f"  shared compact copy      {shared_bytes / 2**20:8.1f} MB")
+    print(f"  as a list of dicts       {rows_bytes / 2**20:8.1f} MB")
+    del rows
+
+    # The first session builds the process-wide caches (indexes, shared copy, replica)
+    timed_run(session(PAGE, data["users"][0]))
+    sessions, sessions_bytes = allocated(lambda: open_sessions(data["users"], args.sessions))
+    per_session = sessions_bytes / args.sessions
+    print(f"\n{args.sessions} Recipe Library sessions")
+    print(f"  per session              {per_session / 1024:8.1f} KB (including AppTest's copy of the page)")
+    print(f"  all sessions             {sessions_bytes / 2**20:8.1f} MB")
+    print(f"  with a copy per session  {(sessions_bytes + args.sessions * rows_bytes) / 2**20:8.1f} MB")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Timings of the app's in-memory structures on a synthetic library, without
+# Streamlit in the loop: index builds, search, recommendations, the leftover
+# ranking, the weekly planner, the local shopping list, the nutrition estimates
+# and the seasonal scores.
+#
+#   python benchmarks/micro.py --users 1000 --recipes-per-user 50
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # the nutrient data is read relative to the app
+
+import nutrition
+import seasonal
+from ingredients import ingredient_name
+from planner import PlannerIndex, average_ratings, plan_weeks
+from recommend import SimilarityIndex
+from search import RecipeIndex
+from shopping import aggregate
+from synthetic import generate
+
+
+def timed(label, function, repeat=1):
+    # Runs the function `repeat` times and prints the time per call
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{label:44} {1000 * elapsed:10.2f} ms")
+    return result
+
+
+def build(index_class, recipes):
+    index = index_class()
+    for recipe in recipes:
+        index.add(recipe)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the app's indexes, planner and nutrition estimates.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--recipes-per-user", type=int, default=50)
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--repeat", type=int, default=20, help="calls per query benchmark")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    data = generate(args.users, args.recipes_per_user, args.weeks, seed=args.seed)
+    recipes = data["tables"]["recipes"]
+    user_id = data["users"][0][0]
+    own = [recipe for recipe in recipes if recipe["author"] == user_id]
+    own_plans = [plan for plan in data["tables"]["meal_plans"] if plan["user"] == user_id]
+    print(f"{len(recipes)} recipes, {len(own)} in the user's library\n")
+
+    search = timed("search index build", lambda: build(RecipeIndex, recipes))
+    timed("search 'curry'", lambda: search.search("curry", user_id=user_id), args.repeat)
+    timed("search 'reis' with ingredient 'tofu'", lambda: search.search("reis", ["tofu"], user_id=user_id), args.repeat)
+
+    similarity = timed("similarity index build", lambda: build(SimilarityIndex, recipes))
+    ratings = {plan["recipe"]: plan["rating"] for plan in own_plans if plan["rating"] is not None}
+    timed("recommend from the user's ratings", lambda: similarity.recommend(ratings, 10, [user_id]), args.repeat)
+    timed("similar to one recipe", lambda: similarity.similar(own[0]["id"], 5, [user_id]), args.repeat)
+    leftovers = [ingredient_name(text) for text in rng.choice(own)["ingredients"][:4]]
+    timed("cover 4 leftovers", lambda: similarity.cover(leftovers, 10, [user_id]), args.repeat)
+
+    planner = timed("planner index of the user's library", lambda: PlannerIndex(own))
+    averages = average_ratings(own_plans)
+    timed("plan 4 weeks", lambda: plan_weeks(planner, averages, [{}] * 4), args.repeat)
+
+    week = rng.sample(recipes, 5)
+    timed("shopping list of a week", lambda: aggregate(week), args.repeat)
+    timed("shopping list of 4 weeks", lambda: aggregate(rng.sample(recipes, 20)), args.repeat)
+    lines = [text for recipe in recipes for text in recipe["ingredients"]]
+    unparsed = aggregate(recipes)[1]
+    print(f"{'lines left for the Groq fallback':44} {len(unparsed):10} of {len(set(lines))} distinct")
+
+    nutrition.nutrient_table()
+
+    def cold_week():
+        nutrition.line_nutrients.cache_clear()
+        nutrition._recipe_nutrients.cache_clear()
+        return nutrition.weekly_totals(week)
+
+    timed("weekly nutrition, cold caches", cold_week, args.repeat)
+    timed("weekly nutrition, warm caches", lambda: nutrition.weekly_totals(week), args.repeat)
+    timed("nutrition of every recipe", lambda: [nutrition.recipe_nutrients(recipe) for recipe in recipes])
+
+    incidence = timed("produce of every recipe", lambda: seasonal.produce_incidence(recipes))
+    timed("season and price scores, one month", lambda: seasonal.score_incidence(incidence, "de", 1 + rng.randrange(12)), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
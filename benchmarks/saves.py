@@ -0,0 +1,98 @@
+# Supabase round trips per "Save Meal Plan" on the Meal Planner, driven through
+# AppTest against the stand-in backend. Each save picks new recipes for some days,
+# clears others and keeps the rest; the page saves to the local replica, and the
+# requests its sync thread then sends are counted. Saving day by day, as before
+# the batched save, took one request per changed day.
+#
+#   python benchmarks/saves.py --saves 50 --recipes-per-user 200
+
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from load_test import install, percentile, session, timed_run
+from backend import FakeSupabase
+from synthetic import generate
+
+from replica import replica
+
+PAGE = "pages/1_Meal_Planner.py"
+DAYS = 5
+SYNC_TIMEOUT = 30  # seconds to wait for the replica to push a save
+
+
+def new_plan(rng, current, options) -> dict:
+    # Per day: keep, clear or pick another recipe
+    plan = {}
+    for day in range(DAYS):
+        roll = rng.random()
+        if roll < 0.4:
+            plan[day] = current.get(day)
+        elif roll < 0.55:
+            plan[day] = None
+        else:
+            plan[day] = rng.choice(options)
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count the Supabase requests per meal plan save.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--recipes-per-user", type=int, default=50)
+    parser.add_argument("--saves", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    data = generate(args.users, args.recipes_per_user, weeks=4, seed=args.seed)
+    backend = FakeSupabase(data["tables"])
+    install(backend)
+    requests = Counter()
+
+    def count(request):
+        if threading.current_thread().name == "replica-sync":
+            requests[request.method] += 1
+
+    backend.postgrest.session.event_hooks["request"].append(count)
+
+    user = data["users"][0]
+    week = (date.today() - timedelta(days=date.today().weekday())).strftime("%Y-%m-%d")
+    at = session(PAGE, user)
+    timed_run(at)
+    local = replica(backend)
+    options = [recipe["id"] for recipe in local.recipes(at.session_state["household"])]
+    # Only the pushes are counted; the background pulls of the household are paused
+    local.pull = lambda owners: None
+
+    changed_days, sent, runs = [], [], []
+    for _ in range(args.saves):
+        current = {day: at.selectbox(key=f"meal_{week}_{day}").value for day in range(DAYS)}
+        plan = new_plan(rng, current, options)
+        for day, recipe in plan.items():
+            selectbox = at.selectbox(key=f"meal_{week}_{day}")
+            if recipe is None:
+                selectbox.select_index(0)  # set_value(None) leaves the box as it is
+            else:
+                selectbox.set_value(recipe)
+        next(button for button in at.button if button.label == "Save Meal Plan").click()
+        before = sum(requests.values())
+        runs.append(timed_run(at))
+        deadline = time.time() + SYNC_TIMEOUT
+        while local.pending() and time.time() < deadline:
+            time.sleep(0.01)
+        changed_days.append(sum(plan[day] != current[day] for day in range(DAYS)))
+        sent.append(sum(requests.values()) - before)
+
+    saves = [n for n, days in zip(sent, changed_days) if days]
+    print(f"{len(saves)} saves that changed something, {sum(changed_days) / len(saves):.1f} changed days on average\n")
+    print(f"  requests per save, batched   avg {sum(saves) / len(saves):.1f}   max {max(saves)}")
+    print(f"  requests per save, per day   avg {sum(changed_days) / len(saves):.1f}   max {max(changed_days)}")
+    print(f"  requests by method           {dict(requests)}")
+    print(f"  page run after the save      p50 {1000 * percentile(runs, 0.5):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
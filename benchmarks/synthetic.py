@@ -0,0 +1,81 @@
+# Synthetic users, households, recipe libraries and meal-plan histories for the
+# benchmarks, built from the app's own category lists so the parser, planner and
+# indexes see realistic ingredients.
+
+import random
+from datetime import date, timedelta
+
+from categories import BASES, PROTEINS, SAUCES, TOPPINGS, TYPES, VEGGIES
+
+AMOUNTS = ["200 g", "400 g", "1", "2", "1 Dose", "1 EL", "2 tbsp", "100 ml", ""]
+EXTRAS = ["salt", "pepper", "olive oil", "zwiebel", "knoblauch", "ingwer", "limette", "soy sauce", "1 Prise Zucker"]
+
+
+def _line(name, rng) -> str:
+    amount = rng.choice(AMOUNTS)
+    return f"{amount} {name}".strip()
+
+
+def recipe(rng, recipe_id, author, public) -> dict:
+    ingredients = [_line(rng.choice(BASES[1:]), rng), _line(rng.choice(PROTEINS[1:]), rng)]
+    if rng.random() < 0.7:
+        ingredients.append(rng.choice(SAUCES[1:]))
+    ingredients += [_line(name, rng) for name in rng.sample(VEGGIES, rng.randint(1, 4))]
+    ingredients += rng.sample(TOPPINGS, rng.randint(0, 2)) + rng.sample(EXTRAS, rng.randint(1, 4))
+    return {
+        "id": recipe_id,
+        "name": f"{rng.choice(TYPES[1:]).title()} #{recipe_id}",
+        "ingredients": ingredients,
+        "instructions": "Cook everything, season and serve. " * rng.randint(1, 6),
+        "author": author,
+        "public": public,
+        "updated_at": "2024-01-01T00:00:00+00:00",
+    }
+
+
+def generate(users=20, recipes_per_user=50, weeks=52, public_share=0.2, partner_share=0.5, seed=1) -> dict:
+    # Returns the tables for FakeSupabase and the users as (id, email)
+    rng = random.Random(seed)
+    people = [(f"user-{n:05d}", f"user{n}@example.com") for n in range(users)]
+    partners = [
+        {"partnerA": people[n][0], "partnerB": people[n + 1][0]}
+        for n in range(0, users - 1, 2) if rng.random() < partner_share
+    ]
+    recipes, meal_plans = [], []
+    by_author = {}
+    for user_id, _ in people:
+        for _ in range(recipes_per_user):
+            recipes.append(recipe(rng, len(recipes) + 1, user_id, rng.random() < public_share))
+            by_author.setdefault(user_id, []).append(recipes[-1]["id"])
+
+    # One plan per household, week and day (sql/003_household_meal_plans.sql), made
+    # by either partner from their own recipes
+    linked = {pair["partnerA"] for pair in partners} | {pair["partnerB"] for pair in partners}
+    households = [(pair["partnerA"], pair["partnerB"]) for pair in partners]
+    households += [(user_id,) for user_id, _ in people if user_id not in linked]
+    monday = date.today() - timedelta(days=date.today().weekday())
+    for household in households:
+        for back in range(weeks):
+            week = (monday - timedelta(weeks=back)).strftime("%Y-%m-%d")
+            for day in range(5):
+                if rng.random() < 0.15:
+                    continue
+                user_id = rng.choice(household)
+                meal_plans.append({
+                    "id": 10_000_000 + len(meal_plans),
+                    "week": week,
+                    "day": day,
+                    "recipe": rng.choice(by_author[user_id]),
+                    "user": user_id,
+                    "rating": rng.choice([None, 2, 3, 4, 4, 5, 5]) if back > 0 else None,
+                    "comment": None,
+                    "updated_at": "2024-01-01T00:00:00+00:00",
+                })
+    tables = {
+        "users": [{"id": user_id, "email": email} for user_id, email in people],
+        "partners": partners,
+        "recipes": recipes,
+        "meal_plans": meal_plans,
+        "feature_requests": [],
+    }
+    return {"tables": tables, "users": people}
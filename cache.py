@@ -0,0 +1,84 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+CACHE_DIR = os.environ.get("MEAL_PLANNER_CACHE_DIR", ".cache")
+
+
+class SqliteCache:
+    # Small persistent key/value store (JSON values) with LRU eviction and
+    # optional expiry, shared by all sessions of the process.
+
+    def __init__(self, name: str, max_entries: int = 1000):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, accessed_at REAL NOT NULL, expires_at REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, key: str):
+        # Returns (value, stored_at), or None if missing or expired
+        now = time.time()
+        with self._lock, self._connect() as db:
+            row = db.execute(
+                "SELECT value, stored_at FROM entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._stats["hits"] += 1
+            return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value, ttl: float | None = None):
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, stored_at, accessed_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now, now + ttl if ttl else None),
+            )
+            self._stats["writes"] += 1
+            excess = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                db.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+                self._stats["evictions"] += excess
+
+    def touch(self, key: str):
+        # Marks an entry as freshly stored, e.g. after a successful revalidation
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+
+    def delete(self, key: str):
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,16 @@
+# --- CATEGORY OPTIONS (with empty option for optionality) ---
+TYPES = [""] + ["salad", "soup", "wraps/burrito", "bowl (graupe)", "veggie+base+protein", "potato+schnitzel+veggie"]
+BASES = [""] + ["rice noodles", "rice", "pasta", "gnocchi", "tortellini", "rice paper"]
+PROTEINS = [""] + ["lentils", "tofu", "kichererbsen", "fake chicken", "veggie hack", "kidney beans"]
+SAUCES = [""] + ["peanut butter", "tahin", "honig/senf", "sahne", "yogurt"]
+VEGGIES = ["blumenkohl", "karotten", "pilze", "chinakohl", "spinat", "brokkoli", "grüner spargel", "sweet potato", "lauch", "kartoffel", "tomaten", "pak choi"]
+TOPPINGS = ["lauchzwiebel", "sesam", "cashews/peanut", "petersilie", "koriander"]
+
+# Category values usable as ingredient filters in the recipe search
+FACETS = {
+    "Base": BASES[1:],
+    "Protein": PROTEINS[1:],
+    "Sauce": SAUCES[1:],
+    "Vegetables": VEGGIES,
+    "Toppings": TOPPINGS,
+}
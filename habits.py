@@ -0,0 +1,114 @@
+import json
+
+from ingredients import category, ingredient_name
+from planner import base_and_protein
+
+# Rollups of the eating habits, kept in the replica's database next to the rows
+# they summarize and updated in the same transaction as every write, so the
+# dashboard reads a few rows per week instead of the whole history.
+SCHEMA = [
+    # meals per user, week and base / protein / vegetable
+    "CREATE TABLE IF NOT EXISTS habit_counts ("
+    " user TEXT NOT NULL, week TEXT NOT NULL, dimension TEXT NOT NULL, value TEXT NOT NULL, meals INTEGER NOT NULL,"
+    " PRIMARY KEY (user, week, dimension, value))",
+    "CREATE TABLE IF NOT EXISTS habit_weeks ("
+    " user TEXT NOT NULL, week TEXT NOT NULL, meals INTEGER NOT NULL, rated INTEGER NOT NULL, rating_sum INTEGER NOT NULL,"
+    " PRIMARY KEY (user, week))",
+    # times each recipe was planned, for repetition
+    "CREATE TABLE IF NOT EXISTS habit_recipes ("
+    " user TEXT NOT NULL, recipe INTEGER NOT NULL, meals INTEGER NOT NULL, PRIMARY KEY (user, recipe))",
+]
+
+
+def recipe_features(ingredients) -> set:
+    # (dimension, value) pairs a planned recipe adds to the habit counts
+    names = [ingredient_name(text) for text in ingredients or []]
+    base, protein = base_and_protein(names)
+    features = {("vegetable", name) for name in names if category(name) == "vegetables"}
+    features.update((dimension, value) for dimension, value in (("base", base), ("protein", protein)) if value)
+    return features
+
+
+def _features_of(db, recipe_id) -> set:
+    row = db.execute("SELECT ingredients FROM recipes WHERE id = ?", (recipe_id,)).fetchone()
+    return recipe_features(json.loads(row["ingredients"]) if row and row["ingredients"] else None)
+
+
+def _count(db, user, week, features, sign):
+    db.executemany(
+        "INSERT INTO habit_counts (user, week, dimension, value, meals) VALUES (?, ?, ?, ?, ?)"
+        " ON CONFLICT (user, week, dimension, value) DO UPDATE SET meals = meals + excluded.meals",
+        [(user, week, dimension, value, sign) for dimension, value in features],
+    )
+
+
+def _add_plan(db, plan, sign):
+    user, week, rating = plan["user"], plan["week"], plan.get("rating")
+    db.execute(
+        "INSERT INTO habit_weeks (user, week, meals, rated, rating_sum) VALUES (?, ?, ?, ?, ?)"
+        " ON CONFLICT (user, week) DO UPDATE SET meals = meals + excluded.meals,"
+        " rated = rated + excluded.rated, rating_sum = rating_sum + excluded.rating_sum",
+        (user, week, sign, sign if rating is not None else 0, sign * (rating or 0)),
+    )
+    db.execute(
+        "INSERT INTO habit_recipes (user, recipe, meals) VALUES (?, ?, ?)"
+        " ON CONFLICT (user, recipe) DO UPDATE SET meals = meals + excluded.meals",
+        (user, plan["recipe"], sign),
+    )
+    _count(db, user, week, _features_of(db, plan["recipe"]), sign)
+
+
+def _prune(db, user, week, recipe=None):
+    # Drops the rows of one user and week (and recipe) that a write took down to
+    # zero meals; the deletes are lookups on the primary key, not table scans
+    db.execute("DELETE FROM habit_counts WHERE user = ? AND week = ? AND meals = 0", (user, week))
+    db.execute("DELETE FROM habit_weeks WHERE user = ? AND week = ? AND meals = 0", (user, week))
+    if recipe is not None:
+        db.execute("DELETE FROM habit_recipes WHERE user = ? AND recipe = ? AND meals = 0", (user, recipe))
+
+
+def on_write(db, table, old, new):
+    # Called with the old and the new version of every written or deleted row
+    if table == "meal_plans":
+        if old is not None:
+            _add_plan(db, old, -1)
+        if new is not None:
+            _add_plan(db, new, 1)
+        if old is not None:
+            _prune(db, old["user"], old["week"], old["recipe"])
+    elif table == "recipes":
+        recipe_id = (new or old)["id"]
+        before = recipe_features(old["ingredients"]) if old else set()
+        after = recipe_features(new["ingredients"]) if new else set()
+        if before == after:
+            return
+        for plan in db.execute("SELECT user, week FROM meal_plans WHERE recipe = ?", (recipe_id,)).fetchall():
+            _count(db, plan["user"], plan["week"], before - after, -1)
+            _count(db, plan["user"], plan["week"], after - before, 1)
+            _prune(db, plan["user"], plan["week"])
+
+
+def create(db):
+    # Creates the rollup tables and fills them from the rows already replicated
+    for statement in SCHEMA:
+        db.execute(statement)
+    if db.execute("SELECT 1 FROM habit_weeks LIMIT 1").fetchone() is None:
+        for plan in db.execute("SELECT * FROM meal_plans").fetchall():
+            _add_plan(db, dict(plan), 1)
+
+
+def read(db, users, first_week) -> dict:
+    # The rollup rows of the given users from `first_week` on
+    marks = ", ".join("?" * len(users))
+    params = (*users, first_week)
+    return {
+        "counts": [dict(row) for row in db.execute(
+            f"SELECT * FROM habit_counts WHERE user IN ({marks}) AND week >= ?", params
+        )],
+        "weeks": [dict(row) for row in db.execute(
+            f"SELECT * FROM habit_weeks WHERE user IN ({marks}) AND week >= ? ORDER BY week", params
+        )],
+        "recipes": [dict(row) for row in db.execute(
+            f"SELECT * FROM habit_recipes WHERE user IN ({marks})", tuple(users)
+        )],
+    }
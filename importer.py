@@ -0,0 +1,247 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import streamlit as st
+from recipe_scrapers import scrape_html
+
+from cache import SqliteCache
+from profiling import span, traced
+
+IMPORT_WORKERS = 4
+FETCH_TIMEOUT = 15  # seconds per page download
+HOST_MIN_INTERVAL = 2.0  # seconds between two downloads from the same host
+SCRAPE_CACHE_SIZE = 5000  # parsed pages kept on disk
+SCRAPE_FRESH_FOR = 24 * 3600  # seconds a parsed page is reused without asking the site again
+FINISHED_JOBS_KEPT = 1000  # finished jobs kept for the pages to read, oldest dropped first
+HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; meal-planning-assistant recipe import)"}
+
+PENDING_STATUSES = ("queued", "fetching")
+
+
+def canonical_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not k.startswith("utm_")))
+    return urlunsplit(("https", host, parts.path.rstrip("/") or "/", query, ""))
+
+
+def content_hash(name, ingredients, instructions) -> str:
+    content = json.dumps(
+        [(name or "").strip().lower(), [i.strip().lower() for i in ingredients or []], (instructions or "").strip()],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def fetch_html(url: str, headers=None):
+    # Returns the decoded page and the response headers
+    with urlopen(Request(url, headers={**HEADERS, **(headers or {})}), timeout=FETCH_TIMEOUT) as response:
+        html = response.read().decode(response.headers.get_content_charset() or "utf-8", errors="replace")
+        return html, response.headers
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+class ImportQueue:
+    # Imports recipe URLs on a bounded worker pool, outside the Streamlit script run.
+    # Jobs are plain dicts; the page polls them with jobs(). Each job saves with the
+    # client of the session that submitted it, so its inserts carry that user's token.
+    # A dispatcher thread hands the pool one job per host at a time, once the host's
+    # next download is allowed, so a burst of URLs for one site leaves the workers
+    # free for the other sites.
+
+    def __init__(self, supabase):
+        self._supabase = supabase
+        self._pool = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="recipe-import")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._jobs_by_url = {}  # (user id, canonical url) -> job id
+        self._finished = deque()  # ids of finished jobs, oldest first
+        self._recipe_hashes = {}  # user id -> content hashes of their recipes
+        self._waiting = {}  # host -> deque of job arguments not handed to the pool yet
+        self._hosts_running = set()  # hosts with a job on the pool
+        self._host_next_fetch = {}  # host -> time.monotonic() of its next allowed download
+        self._wakeup = threading.Condition(self._lock)
+        self._scrape_cache = SqliteCache("scrapes", max_entries=SCRAPE_CACHE_SIZE)
+        self._scrape_stats = {"not_modified": 0, "downloads": 0}
+        threading.Thread(target=self._dispatch, name="recipe-import-hosts", daemon=True).start()
+
+    def submit(self, urls, user_id, public=False, supabase=None) -> list:
+        supabase = supabase or self._supabase
+        job_ids = []
+        for url in urls:
+            key = (user_id, canonical_url(url))
+            with self._lock:
+                existing = self._jobs.get(self._jobs_by_url.get(key))
+                # Re-submitting a URL only retries it if the previous attempt failed
+                if existing and existing["status"] != "failed":
+                    job_ids.append(existing["id"])
+                    continue
+                job = {
+                    "id": uuid.uuid4().hex,
+                    "user": user_id,
+                    "url": url.strip(),
+                    "canonical_url": key[1],
+                    "status": "queued",
+                    "error": None,
+                    "recipe": None,
+                }
+                self._jobs[job["id"]] = job
+                self._jobs_by_url[key] = job["id"]
+                self._waiting.setdefault(_host(job["url"]), deque()).append((job, supabase, user_id, public))
+                self._wakeup.notify()
+            job_ids.append(job["id"])
+        return job_ids
+
+    def jobs(self, job_ids) -> list:
+        with self._lock:
+            return [dict(self._jobs[job_id]) for job_id in job_ids if job_id in self._jobs]
+
+    def scrape_stats(self) -> dict:
+        with self._lock:
+            return {**self._scrape_cache.stats(), **self._scrape_stats}
+
+    def _count(self, name):
+        with self._lock:
+            self._scrape_stats[name] += 1
+
+    def _scrape(self, url, canonical):
+        # Parsed pages are cached by canonical URL and revalidated with ETag/Last-Modified
+        cached = self._scrape_cache.get(canonical)
+        if cached and cached[1] > time.time() - SCRAPE_FRESH_FOR:
+            return cached[0]
+
+        conditional = {}
+        if cached and cached[0].get("etag"):
+            conditional["If-None-Match"] = cached[0]["etag"]
+        if cached and cached[0].get("last_modified"):
+            conditional["If-Modified-Since"] = cached[0]["last_modified"]
+
+        with self._lock:
+            self._host_next_fetch[_host(url)] = time.monotonic() + HOST_MIN_INTERVAL
+        try:
+            with span("scrape fetch", host=urlsplit(url).netloc) as attributes:
+                html, headers = fetch_html(url, conditional)
+                attributes["bytes"] = len(html)
+        except HTTPError as e:
+            if e.code == 304 and cached:
+                self._count("not_modified")
+                self._scrape_cache.touch(canonical)
+                return cached[0]
+            raise
+        self._count("downloads")
+
+        with span("scrape parse"):
+            scraper = scrape_html(html, org_url=url)
+            page = {
+                "name": scraper.title(),
+                "ingredients": scraper.ingredients(),
+                "instructions": scraper.instructions(),
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+            }
+        self._scrape_cache.set(canonical, page)
+        return page
+
+    def forget_recipes(self, user_id):
+        # Called when the user's library changed outside the queue
+        with self._lock:
+            self._recipe_hashes.pop(user_id, None)
+            for key in [key for key in self._jobs_by_url if key[0] == user_id]:
+                if self._jobs[self._jobs_by_url[key]]["status"] not in PENDING_STATUSES:
+                    del self._jobs_by_url[key]
+
+    def _update(self, job, **fields):
+        with self._lock:
+            job.update(fields)
+            if job["status"] not in PENDING_STATUSES:
+                self._finish(job)
+
+    def _finish(self, job):
+        # Finished jobs stay readable and keep their URL from being imported again
+        # until FINISHED_JOBS_KEPT newer ones have finished
+        self._finished.append(job["id"])
+        while len(self._finished) > FINISHED_JOBS_KEPT:
+            old = self._jobs.pop(self._finished.popleft())
+            key = (old["user"], old["canonical_url"])
+            if self._jobs_by_url.get(key) == old["id"]:
+                del self._jobs_by_url[key]
+
+    def _dispatch(self):
+        with self._wakeup:
+            while True:
+                now, wait = time.monotonic(), None
+                for host in list(self._waiting):
+                    if host in self._hosts_running:
+                        continue
+                    delay = self._host_next_fetch.get(host, 0) - now
+                    if delay > 0:
+                        wait = delay if wait is None else min(wait, delay)
+                        continue
+                    self._hosts_running.add(host)
+                    self._pool.submit(self._run, *self._waiting[host].popleft())
+                    if not self._waiting[host]:
+                        del self._waiting[host]
+                # Woken by submit() and by finished jobs, or when a host's wait is over
+                self._wakeup.wait(wait)
+
+    def _user_hashes(self, supabase, user_id):
+        with self._lock:
+            hashes = self._recipe_hashes.get(user_id)
+        if hashes is None:
+            rows = supabase.table("recipes").select("name, ingredients, instructions").eq("author", user_id).execute().data
+            hashes = {content_hash(r["name"], r["ingredients"], r["instructions"]) for r in rows}
+            with self._lock:
+                hashes = self._recipe_hashes.setdefault(user_id, hashes)
+        return hashes
+
+    @traced("import")
+    def _run(self, job, supabase, user_id, public):
+        try:
+            self._update(job, status="fetching")
+            page = self._scrape(job["url"], job["canonical_url"])
+            new_recipe = {
+                "name": page["name"],
+                "ingredients": page["ingredients"],
+                "instructions": page["instructions"],
+                "author": user_id,
+                "public": public,
+            }
+
+            digest = content_hash(new_recipe["name"], new_recipe["ingredients"], new_recipe["instructions"])
+            hashes = self._user_hashes(supabase, user_id)
+            with self._lock:
+                duplicate = digest in hashes
+                hashes.add(digest)
+            if duplicate:
+                self._update(job, status="duplicate", recipe=new_recipe)
+                return
+
+            try:
+                response = supabase.table("recipes").insert(new_recipe).execute()
+            except Exception:
+                with self._lock:
+                    hashes.discard(digest)
+                raise
+            self._update(job, status="done", recipe=response.data[0])
+        except Exception as e:
+            self._update(job, status="failed", error=str(e))
+        finally:
+            with self._wakeup:
+                self._hosts_running.discard(_host(job["url"]))
+                self._wakeup.notify()
+
+
+@st.cache_resource
+def import_queue(_supabase):
+    return ImportQueue(_supabase)
@@ -0,0 +1,182 @@
+import re
+from fractions import Fraction
+from functools import lru_cache
+
+from categories import SAUCES, VEGGIES
+
+# canonical unit -> (dimension, factor to the dimension's base unit)
+UNITS = {
+    "g": ("mass", 1), "kg": ("mass", 1000), "mg": ("mass", 0.001),
+    "ml": ("volume", 1), "cl": ("volume", 10), "dl": ("volume", 100), "l": ("volume", 1000),
+    "tsp": ("volume", 5), "tbsp": ("volume", 15), "cup": ("volume", 240),
+    "pinch": ("pinch", 1), "clove": ("clove", 1), "can": ("can", 1), "bunch": ("bunch", 1),
+    "pack": ("pack", 1), "piece": ("piece", 1),
+}
+BASE_UNITS = {"mass": "g", "volume": "ml"}
+COUNTED_UNITS = {"pinch", "clove", "can", "bunch", "pack"}
+
+UNIT_ALIASES = {
+    "g": "g", "gr": "g", "gram": "g", "grams": "g", "gramm": "g",
+    "kg": "kg", "kilo": "kg", "kilogram": "kg", "kilogramm": "kg",
+    "mg": "mg",
+    "ml": "ml", "milliliter": "ml", "millilitre": "ml",
+    "cl": "cl", "dl": "dl",
+    "l": "l", "liter": "l", "litre": "l", "liters": "l", "litres": "l",
+    "tsp": "tsp", "teaspoon": "tsp", "teaspoons": "tsp", "tl": "tsp",
+    "tbsp": "tbsp", "tbs": "tbsp", "tablespoon": "tbsp", "tablespoons": "tbsp", "el": "tbsp",
+    "cup": "cup", "cups": "cup", "tasse": "cup", "tassen": "cup",
+    "pinch": "pinch", "prise": "pinch", "prisen": "pinch",
+    "clove": "clove", "cloves": "clove", "zehe": "clove", "zehen": "clove",
+    "can": "can", "cans": "can", "dose": "can", "dosen": "can", "tin": "can", "tins": "can",
+    "bunch": "bunch", "bund": "bunch",
+    "pack": "pack", "packs": "pack", "package": "pack", "packung": "pack", "päckchen": "pack", "pck": "pack",
+    "piece": "piece", "pieces": "piece", "stück": "piece", "stk": "piece", "pc": "piece", "pcs": "piece",
+}
+
+# canonical name -> other spellings (German and English); canonical names follow
+# the category lists so merged items keep the names users picked in the forms
+SYNONYMS = {
+    "karotten": ["karotte", "möhre", "möhren", "carrot", "carrots"],
+    "blumenkohl": ["cauliflower"],
+    "pilze": ["pilz", "champignons", "champignon", "mushroom", "mushrooms"],
+    "chinakohl": ["napa cabbage", "chinese cabbage"],
+    "spinat": ["spinach", "babyspinat", "baby spinach"],
+    "brokkoli": ["broccoli", "brokoli"],
+    "grüner spargel": ["green asparagus", "asparagus", "spargel"],
+    "sweet potato": ["sweet potatoes", "süßkartoffel", "süßkartoffeln", "süsskartoffel"],
+    "lauch": ["leek", "leeks", "porree"],
+    "kartoffel": ["kartoffeln", "potato", "potatoes"],
+    "tomaten": ["tomate", "tomato", "tomatoes", "cherry tomatoes", "cherrytomaten"],
+    "pak choi": ["pak choy", "bok choy", "bok choi"],
+    "lauchzwiebel": ["lauchzwiebeln", "frühlingszwiebel", "frühlingszwiebeln", "spring onion", "spring onions", "scallion", "scallions", "green onion", "green onions"],
+    "kichererbsen": ["kichererbse", "chickpea", "chickpeas", "garbanzo beans"],
+    "lentils": ["lentil", "linsen", "linse", "red lentils", "rote linsen"],
+    "kidney beans": ["kidneybohnen", "kidney bean"],
+    "tofu": ["smoked tofu", "räuchertofu", "firm tofu"],
+    "petersilie": ["parsley"],
+    "koriander": ["coriander", "cilantro"],
+    "sesam": ["sesame", "sesame seeds", "sesamsamen"],
+    "tahin": ["tahini", "tahina"],
+    "sahne": ["cream", "heavy cream", "schlagsahne"],
+    "yogurt": ["yoghurt", "joghurt"],
+    "peanut butter": ["erdnussbutter"],
+    "rice": ["reis", "basmati rice", "basmatireis", "jasmine rice", "jasminreis"],
+    "rice noodles": ["reisnudeln", "rice noodle"],
+    "pasta": ["nudeln", "spaghetti", "penne", "fusilli"],
+    "zwiebel": ["zwiebeln", "onion", "onions", "red onion", "rote zwiebel"],
+    "knoblauch": ["garlic", "knoblauchzehe", "knoblauchzehen", "garlic clove", "garlic cloves"],
+    "paprika": ["bell pepper", "bell peppers", "red bell pepper", "paprikaschote", "paprikaschoten"],
+    "zucchini": ["courgette", "courgettes", "zucchinis"],
+    "gurke": ["cucumber", "gurken"],
+    "ingwer": ["ginger"],
+    "limette": ["lime", "limes", "limetten"],
+    "zitrone": ["lemon", "lemons", "zitronen"],
+    "soy sauce": ["sojasauce", "sojasoße", "soja sauce"],
+    "olive oil": ["olivenöl"],
+    "salt": ["salz"],
+    "pepper": ["pfeffer", "black pepper"],
+    "vinegar": ["essig"],
+    "maple syrup": ["ahornsirup"],
+    "curry powder": ["currypulver"],
+}
+
+VEGETABLES = set(VEGGIES) | {
+    "zwiebel", "knoblauch", "paprika", "zucchini", "gurke", "ingwer", "limette", "zitrone", "lauchzwiebel",
+    "petersilie", "koriander", "aubergine", "avocado", "mais", "erbsen", "salat", "rucola", "kohlrabi",
+}
+PANTRY = set(SAUCES[1:]) | {
+    "salt", "pepper", "olive oil", "oil", "öl", "sesame oil", "sesamöl", "soy sauce", "sriracha", "vinegar",
+    "maple syrup", "honey", "honig", "curry powder", "curry", "cumin", "kreuzkümmel", "paprika powder",
+    "paprikapulver", "chili flakes", "chiliflocken", "sugar", "zucker", "flour", "mehl", "mustard", "senf",
+    "tomato paste", "tomatenmark", "vegetable stock", "gemüsebrühe", "brühe", "sesam", "oregano", "basil",
+    "basilikum", "thyme", "thymian", "garam masala", "turmeric", "kurkuma", "cinnamon", "zimt",
+}
+
+MAX_NAME_WORDS = 4  # longer leftovers are treated as free text the parser does not understand
+
+_CANONICAL = {variant: canonical for canonical, variants in SYNONYMS.items() for variant in variants}
+_UNICODE_FRACTIONS = {"½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4", "⅛": "1/8"}
+_NUMBER = r"\d+/\d+|\d+(?:[.,]\d+)?(?:\s+\d+/\d+)?"
+_QUANTITY_RE = re.compile(rf"^\s*(?P<qty>{_NUMBER})(?:\s*(?:-|–|to|bis)\s*(?P<upper>{_NUMBER}))?\s*")
+_UNIT_RE = re.compile(r"^(?P<unit>[^\W\d_]+)\.?(?:\s+|$)")
+_DESCRIPTORS = re.compile(
+    r"\b(fresh|frisch|frische|frischer|chopped|gehackt|gehackte|sliced|geschnitten|diced|gewürfelt|"
+    r"minced|grated|gerieben|large|small|medium|groß|große|klein|kleine|optional|to taste|nach belieben|"
+    r"of|von)\b"
+)
+
+
+_LIST_SEPARATOR = re.compile(r",(?!\d)|(?<!\d),")  # but not the decimal comma in "1,5 kg"
+
+
+def _number(text: str) -> float:
+    text = text.replace(",", ".")
+    return float(sum(Fraction(part) for part in text.split()))
+
+
+def normalize_name(name: str) -> str:
+    name = re.sub(r"\(.*?\)", " ", name.lower())
+    name = name.split(",")[0]
+    name = _DESCRIPTORS.sub(" ", name)
+    name = " ".join(name.replace("/", " / ").split()).strip(" -/.")
+    name = _CANONICAL.get(name, name)
+    # Plain English plurals ("onions") fall back to the singular if that is known
+    if name not in _CANONICAL.values() and name.endswith("s") and _CANONICAL.get(name[:-1], name[:-1]) in SYNONYMS:
+        name = _CANONICAL.get(name[:-1], name[:-1])
+    return name
+
+
+def split_ingredients(text: str) -> list:
+    # Comma-separated ingredients as typed into the forms
+    return [part.strip() for part in _LIST_SEPARATOR.split(text or "") if part.strip()]
+
+
+def parse_ingredient(text: str):
+    # Returns {"quantity", "unit", "name", "raw"}, or None if the text does not look
+    # like a single ingredient
+    raw = text
+    for symbol, fraction in _UNICODE_FRACTIONS.items():
+        text = text.replace(symbol, f" {fraction}")
+    text = text.strip()
+
+    quantity, unit = None, None
+    match = _QUANTITY_RE.match(text)
+    if match:
+        try:
+            quantity = _number(match["upper"] or match["qty"])
+        except (ValueError, ZeroDivisionError):
+            return None
+        text = text[match.end():]
+        unit_match = _UNIT_RE.match(text)
+        if unit_match and unit_match["unit"].lower() in UNIT_ALIASES:
+            unit = UNIT_ALIASES[unit_match["unit"].lower()]
+            text = text[unit_match.end():]
+    else:
+        # "pinch of salt", "bunch of parsley"
+        unit_match = _UNIT_RE.match(text)
+        if unit_match and UNIT_ALIASES.get(unit_match["unit"].lower()) in COUNTED_UNITS:
+            quantity, unit = 1, UNIT_ALIASES[unit_match["unit"].lower()]
+            text = text[unit_match.end():]
+    if quantity is not None and unit is None:
+        unit = "piece"
+
+    name = normalize_name(text)
+    if not name or len(name.split()) > MAX_NAME_WORDS:
+        return None
+    return {"quantity": quantity, "unit": unit, "name": name, "raw": raw}
+
+
+@lru_cache(maxsize=65536)
+def ingredient_name(text: str) -> str:
+    # Just the normalized name of an ingredient line; the same lines come up again
+    # and again across a library, so the result is cached
+    parsed = parse_ingredient(text)
+    return parsed["name"] if parsed else normalize_name(text)
+
+
+def category(name: str) -> str:
+    if name in VEGETABLES:
+        return "vegetables"
+    if name in PANTRY or name.endswith((" sauce", "sauce", " oil", "öl", " powder", "pulver")):
+        return "at home"
+    return "other"
@@ -0,0 +1,99 @@
+import asyncio
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+from datetime import datetime
+
+import streamlit as st
+from realtime import AsyncRealtimeClient
+
+LAG_LOG_SIZE = 200
+
+
+class MealPlanFeed:
+    # Pushes row changes of meal_plans to the sessions showing a household's plan.
+    # One websocket per process and one channel per household, driven by a private
+    # event loop; sessions only read their inbox and never query the database for it.
+
+    def __init__(self, url: str, key: str):
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="realtime", daemon=True).start()
+        self._client = AsyncRealtimeClient(f"{url}/realtime/v1", key)
+        self._connecting = None  # asyncio.Lock, created on the feed's loop
+        self._lock = threading.RLock()
+        self._inboxes = {}  # household -> WeakSet of session inboxes
+        self._channels = {}  # household -> Future of the joined channel
+        self._lags = deque(maxlen=LAG_LOG_SIZE)
+
+    def subscribe(self, household: tuple) -> queue.Queue:
+        # The inbox lives in the session; once the session is gone it is dropped here too
+        inbox = queue.Queue()
+        with self._lock:
+            self._inboxes.setdefault(household, weakref.WeakSet()).add(inbox)
+            if household not in self._channels:
+                joined = asyncio.run_coroutine_threadsafe(self._join(household), self._loop)
+                joined.add_done_callback(lambda future: self._joined(household, future))
+                self._channels[household] = joined
+        return inbox
+
+    def record_lag(self, commit_timestamp: str):
+        # Time from the partner's commit until the change was shown in this session
+        committed = datetime.fromisoformat(commit_timestamp.replace("Z", "+00:00")).timestamp()
+        with self._lock:
+            self._lags.append(max(0.0, time.time() - committed))
+
+    def lag_stats(self) -> dict:
+        with self._lock:
+            lags = sorted(self._lags)
+        if not lags:
+            return {"changes": 0, "p50": None, "p95": None}
+        return {"changes": len(lags), "p50": lags[len(lags) // 2], "p95": lags[int(len(lags) * 0.95)]}
+
+    async def _join(self, household):
+        if self._connecting is None:
+            self._connecting = asyncio.Lock()
+        async with self._connecting:
+            await self._client.connect()  # returns at once if already connected
+        channel = self._client.channel(f"meal_plans:{':'.join(household)}")
+        channel.on_postgres_changes(
+            "*",
+            table="meal_plans",
+            schema="public",
+            filter=f"user=in.({','.join(household)})",
+            callback=lambda payload: self._dispatch(household, payload),
+        )
+        await channel.subscribe()
+        return channel
+
+    def _joined(self, household, joined):
+        # A failed join is retried by the next subscribe()
+        if joined.cancelled() or joined.exception() is not None:
+            with self._lock:
+                if self._channels.get(household) is joined:
+                    del self._channels[household]
+
+    def _dispatch(self, household, payload):
+        data = payload["data"]
+        change = {
+            "type": data["type"],
+            "record": data.get("record") or {},
+            "old_record": data.get("old_record") or {},
+            "commit_timestamp": data["commit_timestamp"],
+        }
+        with self._lock:
+            inboxes = list(self._inboxes.get(household, ()))
+            if not inboxes:
+                # Nobody looks at this household any more
+                self._inboxes.pop(household, None)
+                joined = self._channels.pop(household, None)
+                if joined is not None and joined.done() and not joined.exception():
+                    self._loop.create_task(self._client.remove_channel(joined.result()))
+        for inbox in inboxes:
+            inbox.put(change)
+
+
+@st.cache_resource
+def meal_plan_feed():
+    return MealPlanFeed(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from collections import deque
+
+import groq
+import streamlit as st
+from groq import Groq
+
+from profiling import record
+
+DEFAULT_MODELS = ["llama-3.1-8b-instant", "llama3-8b-8192"]  # tried in this order
+LLM_TIMEOUT = 20  # seconds per request
+LLM_RETRIES = 2  # extra attempts per model for transient errors
+LLM_BACKOFF = 0.5  # seconds, doubled after every retry
+CALL_LOG_SIZE = 200
+
+# Worth retrying on the same model; anything else moves on to the next model
+TRANSIENT_ERRORS = (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)
+
+
+@st.cache_resource
+def llm_client():
+    # Retries are handled by stream_completion(), which can also switch models
+    return Groq(api_key=st.secrets["GROQ_API_KEY"], timeout=LLM_TIMEOUT, max_retries=0)
+
+
+def llm_models():
+    return list(st.secrets.get("GROQ_MODELS", DEFAULT_MODELS))
+
+
+@st.cache_resource
+def _call_log():
+    return {"lock": threading.Lock(), "calls": deque(maxlen=CALL_LOG_SIZE)}
+
+
+def call_log() -> list:
+    log = _call_log()
+    with log["lock"]:
+        return list(log["calls"])
+
+
+def _record(call):
+    log = _call_log()
+    with log["lock"]:
+        log["calls"].append(call)
+
+
+def stream_completion(client, prompt, models, call=None, temperature=0.2):
+    # Yields the completion as it arrives. Before the first token, transient errors
+    # are retried with backoff and other errors fall through to the next model.
+    # Timings and token usage are written to `call` and kept in call_log().
+    call = {} if call is None else call
+    call.update(started=time.time(), attempts=0, model=None, ttft=None, latency=None, tokens=None, error=None)
+    started = time.perf_counter()
+    started_ns = time.time_ns()
+    last_error = None
+    try:
+        for model in models:
+            for attempt in range(LLM_RETRIES + 1):
+                call["attempts"] += 1
+                try:
+                    stream = client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=temperature,
+                        stream=True,
+                    )
+                    for chunk in stream:
+                        usage = chunk.usage or (chunk.x_groq.usage if chunk.x_groq else None)
+                        if usage:
+                            call["tokens"] = usage.total_tokens
+                        text = chunk.choices[0].delta.content if chunk.choices else None
+                        if text:
+                            if call["ttft"] is None:
+                                call["ttft"] = time.perf_counter() - started
+                                call["model"] = model
+                            yield text
+                    call["model"] = model
+                    return
+                except TRANSIENT_ERRORS as e:
+                    if call["ttft"] is not None:
+                        raise
+                    last_error = e
+                    if attempt < LLM_RETRIES:
+                        time.sleep(LLM_BACKOFF * 2 ** attempt * (1 + random.random()))
+                except groq.APIStatusError as e:
+                    if call["ttft"] is not None:
+                        raise
+                    last_error = e
+                    break
+        raise last_error or RuntimeError("No LLM models configured.")
+    except Exception as e:
+        call["error"] = str(e)
+        raise
+    finally:
+        call["latency"] = time.perf_counter() - started
+        _record(dict(call))
+        # Recorded once the stream is done, in the thread that consumed it
+        record("llm", started_ns, time.time_ns(), error=call["error"], model=call["model"], attempts=call["attempts"], tokens=call["tokens"])
+
+
+def format_call(call) -> str:
+    parts = [call["model"] or "no model"]
+    if call["ttft"] is not None:
+        parts.append(f"first token after {1000 * call['ttft']:.0f} ms")
+    parts.append(f"{1000 * call['latency']:.0f} ms total")
+    if call["tokens"]:
+        parts.append(f"{call['tokens']} tokens")
+    if call["attempts"] > 1:
+        parts.append(f"{call['attempts']} attempts")
+    return " · ".join(parts)
@@ -0,0 +1,104 @@
+import csv
+import os
+from functools import lru_cache
+
+import numpy as np
+import streamlit as st
+
+from ingredients import UNITS, normalize_name, parse_ingredient
+
+NUTRIENTS_PATH = os.path.join(os.path.dirname(__file__), "data", "nutrients.csv")
+MACROS = ("kcal", "protein", "carbs", "fat")  # per 100 g in the data file
+UNIT_GRAMS = {"pinch": 0.5, "can": 400, "pack": 200, "bunch": 100}  # counted units without a per-item weight
+
+
+class NutrientTable:
+    # The bundled nutrient data as numpy columns, one row per ingredient. Values are
+    # kept per gram so an ingredient line is one row times its weight, and a week
+    # is one sum over a matrix of recipe vectors.
+
+    def __init__(self, path=NUTRIENTS_PATH):
+        with open(path, encoding="utf-8") as f:
+            records = list(csv.DictReader(f))
+        self.rows = {}  # normalized name or alias -> row
+        for row, record in enumerate(records):
+            for name in [record["name"], *filter(None, record["aliases"].split("|"))]:
+                self.rows.setdefault(normalize_name(name), row)
+        self.per_gram = np.array([[float(record[macro]) / 100 for macro in MACROS] for record in records], dtype=np.float32)
+        self.piece_g = np.array([float(record["piece_g"] or "nan") for record in records], dtype=np.float32)
+        self.portion_g = np.array([float(record["portion_g"]) for record in records], dtype=np.float32)
+        self.density = np.array([float(record["density"] or 1) for record in records], dtype=np.float32)
+
+    def grams(self, row, quantity, unit) -> float:
+        # Weight of an ingredient line; without a quantity a typical portion is assumed
+        if quantity is None:
+            return float(self.portion_g[row])
+        dimension, factor = UNITS[unit]
+        if dimension == "mass":
+            return quantity * factor
+        if dimension == "volume":
+            return quantity * factor * float(self.density[row])
+        if unit in UNIT_GRAMS:
+            return quantity * UNIT_GRAMS[unit]
+        piece = self.piece_g[row]
+        return quantity * float(piece if not np.isnan(piece) else self.portion_g[row])
+
+
+@st.cache_resource
+def nutrient_table():
+    return NutrientTable()
+
+
+@lru_cache(maxsize=65536)
+def line_nutrients(text: str):
+    # (macros as a vector, weight known from the line) of one ingredient line, or
+    # None if the ingredient is not in the data
+    table = nutrient_table()
+    item = parse_ingredient(text) or {"quantity": None, "unit": None, "name": normalize_name(text)}
+    row = table.rows.get(item["name"])
+    if row is None:
+        return None
+    return table.per_gram[row] * table.grams(row, item["quantity"], item["unit"]), item["quantity"] is not None
+
+
+@lru_cache(maxsize=16384)
+def _recipe_nutrients(ingredients: tuple):
+    total = np.zeros(len(MACROS), dtype=np.float32)
+    matched = measured = 0
+    for text in ingredients:
+        found = line_nutrients(text)
+        if found is None:
+            continue
+        total += found[0]
+        matched += 1
+        measured += found[1]
+    total.setflags(write=False)
+    return total, matched, measured
+
+
+def recipe_nutrients(recipe: dict) -> dict:
+    # Macros of a whole recipe as written, computed once per ingredient list.
+    # "matched" counts the lines found in the data, "measured" those with a quantity.
+    ingredients = tuple(text for text in recipe.get("ingredients") or [] if text and text.strip())
+    total, matched, measured = _recipe_nutrients(ingredients)
+    return {"macros": total, "lines": len(ingredients), "matched": matched, "measured": measured}
+
+
+def weekly_totals(recipes) -> dict:
+    # Per-recipe vectors stacked into one matrix and summed in one go
+    nutrients = [recipe_nutrients(recipe) for recipe in recipes]
+    if not nutrients:
+        return {"per_recipe": np.zeros((0, len(MACROS)), dtype=np.float32), "total": np.zeros(len(MACROS)), "lines": 0, "matched": 0, "measured": 0}
+    per_recipe = np.vstack([n["macros"] for n in nutrients])
+    return {
+        "per_recipe": per_recipe,
+        "total": per_recipe.sum(axis=0),
+        "lines": sum(n["lines"] for n in nutrients),
+        "matched": sum(n["matched"] for n in nutrients),
+        "measured": sum(n["measured"] for n in nutrients),
+    }
+
+
+def format_macros(macros) -> str:
+    kcal, protein, carbs, fat = (float(value) for value in macros)
+    return f"{kcal:.0f} kcal · {protein:.0f} g protein · {carbs:.0f} g carbs · {fat:.0f} g fat"
@@ -1,158 +1,340 @@
 import streamlit as st
+import time
 from datetime import date, timedelta
 import pandas as pd
 from utils import *
+from live_updates import meal_plan_feed
+from planner import PlannerIndex, average_ratings, disliked_recipes, plan_weeks
+from recommend import similarity_index
+from replica import replica
+from nutrition import MACROS, format_macros, weekly_totals
+from seasonal import current_region, format_score, household_scores, suggestions as produce_suggestions, week_score
 
 st.set_page_config(page_title="Meal Planner", layout="centered")
 st.title("📅 Meal Planner")
 
-supabase, controller = authenticate()
-show_login(controller)
+with track_page("Meal Planner"):
+    supabase, controller = authenticate()
+    show_login(controller)
 
-if "user" not in st.session_state:
-            st.warning("Please log in to access the meal planner.")
-            st.stop()
+    if "user" not in st.session_state:
+                st.warning("Please log in to access the meal planner.")
+                st.stop()
 
-def get_start_of_week(d: date):
-    return d - timedelta(days=d.weekday())
+    def get_start_of_week(d: date):
+        return d - timedelta(days=d.weekday())
 
-today = date.today()
-selected_date = st.date_input("Select any day in the target week", today)
-week_start = get_start_of_week(selected_date)
-week_start_str = week_start.strftime("%Y-%m-%d")
+    today = date.today()
+    selected_date = st.date_input("Select any day in the target week", today)
+    week_start = get_start_of_week(selected_date)
+    week_start_str = week_start.strftime("%Y-%m-%d")
 
-st.markdown(f"### Plan 5 recipes for the week starting **{week_start_str}**")
+    st.markdown(f"### Plan 5 recipes for the week starting **{week_start_str}**")
 
-def fetch_recipes():
-    user_recipes = supabase.table("recipes").select("*").eq("author", st.session_state.user.id).execute()
-    return user_recipes.data
+    LIVE_UPDATE_EVERY = 3  # seconds between looks into the session's inbox of pushed changes
+    AUTO_PLAN_MAX_WEEKS = 4
+    RECENT_WEEKS = 2  # recipes planned this many weeks back are only picked again if little else fits
+    SUGGESTION_COUNT = 3
 
-def fetch_meal_plan():
-    response = supabase.table("meal_plans").select("*, recipes(*)").eq("user", st.session_state.user.id).eq("week", week_start_str).execute()
-    if not response:
-        st.error(f"Error fetching meal plans.")
-        return []
-    return response.data
+    # Reads and writes go to the local replica, which syncs with Supabase in the background
+    household = household_ids(supabase)
+    local = replica(shared_client())
+    try:
+        local.ensure_pulled(household, supabase)
+    except Exception as e:
+        st.error(f"Error fetching meal plans: {e}")
+        st.stop()
+    show_sync_status(local)
+    recipes = local.recipes(household)
 
-recipes = fetch_recipes()
-meal_plan = fetch_meal_plan()
+    if not recipes:
+        st.warning("No recipes found in the library. Please add recipes first!")
+        st.stop()
 
-if not recipes:
-    st.warning("No recipes found in the library. Please add recipes first!")
-    st.stop()
+    # Prepare recipe names list with an empty option
+    recipe_names = [""] + [r["name"] for r in recipes]
+    recipes_by_id = {r["id"]: r for r in recipes}
+    recipe_options = [None] + list(recipes_by_id)
 
-# Prepare recipe names list with an empty option
-recipe_names = [""] + [r["name"] for r in recipes]
+    def week_entries(week_str=week_start_str):
+        # The household's plan for the week, one entry per day like the shopping list
+        return household_week(local, household, week_str)
 
-# Filter meal plans for the selected week
-current_week_entries = {entry.get("day"): entry for entry in meal_plan}
-days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+    current_week_entries = week_entries()
 
-with st.form("meal_planner_form"):
-    for i, day in enumerate(days):
-        if i not in current_week_entries:
-            recipe_name = ""
-        else:
-            recipe_id = current_week_entries[i].get("recipe")
-            recipe_name = current_week_entries[i].get("recipes").get("name")
+    def recipe_of(entry):
+        return recipes_by_id.get(entry["recipe"], {"name": "", "ingredients": [], "instructions": None})
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
 
-        meal = st.selectbox(f"{day}'s meal", options=recipe_names, index=recipe_names.index(recipe_name) if recipe_name in recipe_names else 0, key=f"meal_{week_start_str}_{i}")
+    def live_inbox():
+        # Subscribed once per session and household; without realtime the page still
+        # works, partner changes then show up with the next rerun
+        inbox = st.session_state.get("live_inbox")
+        if inbox is None or inbox[0] != household:
+            try:
+                inbox = st.session_state.live_inbox = (household, meal_plan_feed().subscribe(household))
+            except Exception:
+                return None
+        return inbox[1]
 
-    submitted = st.form_submit_button("Save Meal Plan")
-
-    if submitted:
-        for i in range(5):
-            meal = st.session_state.get(f"meal_{week_start_str}_{i}")
-            if meal:
-                # Check if the meal already exists in the current week entries
-                if i in current_week_entries:
-                    # Update the meal plan entry if the recipe has changed
-                    if current_week_entries[i]["recipes"]["name"] != meal:
-                        data = {"recipe": next((r["id"] for r in recipes if r["name"] == meal), None)}
-                        response = supabase.table("meal_plans").update(
-                            data
-                        ).eq("id", current_week_entries[i]["id"]).execute()
-                else:
-                    # Insert a new meal plan entry if it doesn't exist
-                    supabase.table("meal_plans").insert(
-                        {"week": week_start_str, "day": i, "recipe": next((r["id"] for r in recipes if r["name"] == meal), None), "user": st.session_state.user.id}
-                    ).execute()
+    def apply_live_changes():
+        # Only the changed rows are patched into the replica; nothing is queried again.
+        # Returns True if the shown week changed and the page has to be redrawn.
+        inbox = live_inbox()
+        redraw = False
+        while inbox is not None and not inbox.empty():
+            change = inbox.get_nowait()
+            if change["type"] == "DELETE":
+                row_id = change["old_record"]["id"]
+                old_entry, new_entry = local.remove_remote("meal_plans", [row_id])[row_id], None
             else:
-                # If the meal is not set, delete the entry if it exists
+                row_id = change["record"]["id"]
+                old_entry, new_entry = local.apply_remote("meal_plans", [change["record"]]).get(row_id), change["record"]
+            redraw = redraw or any(entry and entry.get("week") == week_start_str for entry in (old_entry, new_entry))
+            if (old_entry or {}).get("recipe") != (new_entry or {}).get("recipe"):
+                for entry in (old_entry, new_entry):
+                    if entry and entry.get("week") == week_start_str:
+                        # Let the day's selectbox pick up the new recipe
+                        st.session_state.pop(f"meal_{week_start_str}_{entry['day']}", None)
+                if new_entry and new_entry["recipe"] not in recipes_by_id:
+                    # The partner planned a recipe that has not been synced yet
+                    local.request_sync()
+            meal_plan_feed().record_lag(change["commit_timestamp"])
+        return redraw
+
+    def diff_meal_plan(selected):
+        # Compare the selected recipe ids per day with the stored entries and return
+        # the rows to upsert (new days and changed recipes) and the entry ids to delete.
+        upserts, deletes = [], []
+        for i, recipe_id in selected.items():
+            entry = current_week_entries.get(i)
+            if recipe_id is None:
+                if entry:
+                    deletes.append(entry["id"])
+            elif entry is None:
+                upserts.append({"week": week_start_str, "day": i, "recipe": recipe_id, "user": st.session_state.user.id})
+            elif entry["recipe"] != recipe_id:
+                upserts.append({"id": entry["id"], "week": entry["week"], "day": i, "recipe": recipe_id, "user": entry["user"]})
+        return upserts, deletes
+
+    def save_meal_plan(upserts, deletes):
+        # Saved locally right away; the replica pushes the changes in one batch
+        if upserts:
+            local.save("meal_plans", upserts)
+        if deletes:
+            local.delete("meal_plans", deletes)
+
+    def planner_index():
+        # Feature vectors are only rebuilt when the household's recipes changed
+        version = (household, local.versions["recipes"])
+        cached = st.session_state.get("planner_index")
+        if cached is None or cached[0] != version:
+            cached = st.session_state.planner_index = (version, PlannerIndex(recipes))
+        return cached[1]
+
+    def auto_plan(weeks_ahead):
+        # Fills the empty days of the selected and the following weeks and saves them;
+        # returns the number of planned meals and the solve time
+        weeks = [week_start + timedelta(weeks=n) for n in range(weeks_ahead)]
+        history = rating_history(supabase)
+
+        started = time.perf_counter()
+        recent_from = (week_start - timedelta(weeks=RECENT_WEEKS)).strftime("%Y-%m-%d")
+        recent = {row["recipe"] for row in history if recent_from <= row["week"] < week_start_str}
+        week_strs = [week.strftime("%Y-%m-%d") for week in weeks]
+        planned = plan_weeks(
+            planner_index(),
+            average_ratings(history),
+            [{day: entry["recipe"] for day, entry in week_entries(week).items()} for week in week_strs],
+            recent,
+            disliked_recipes(history),
+        )
+        solve_seconds = time.perf_counter() - started
+
+        rows = [
+            {"week": week, "day": day, "recipe": recipe_id, "user": st.session_state.user.id}
+            for week, week_plan in zip(week_strs, planned)
+            for day, recipe_id in week_plan.items()
+        ]
+        if rows:
+            local.save("meal_plans", rows)
+            # Let the selectboxes below show the new recipes
+            for day in planned[0]:
+                st.session_state.pop(f"meal_{week_start_str}_{day}", None)
+        return len(rows), solve_seconds
+
+    suggestions = similarity_index(shared_client()).recommend(
+        average_ratings(rating_history(supabase)),
+        k=SUGGESTION_COUNT,
+        user_ids=household,
+        exclude=[entry["recipe"] for entry in current_week_entries.values()],
+        only_from=household,
+    )
+    if suggestions:
+        st.caption("💡 Suggested from your ratings: " + " · ".join(name for _, name, _ in suggestions))
+    produce = produce_suggestions(current_region(), week_start.month, k=SUGGESTION_COUNT)
+    if produce["seasonal"] or produce["budget"]:
+        st.caption(
+            "🌱 In season: " + (", ".join(produce["seasonal"]) or "–")
+            + " · 💸 Cheaper than usual: " + (", ".join(name for name, _ in produce["budget"]) or "–")
+        )
+
+    col1, col2 = st.columns([1, 2], vertical_alignment="bottom")
+    auto_plan_weeks = col1.number_input("Weeks to fill", min_value=1, max_value=AUTO_PLAN_MAX_WEEKS, value=1)
+    if col2.button("✨ Auto-fill empty days", help="Picks well-rated recipes with varied bases and proteins that share ingredients"):
+        count, solve_seconds = auto_plan(auto_plan_weeks)
+        if count:
+            st.toast(f"Planned {count} meals in {1000 * solve_seconds:.0f} ms.")
+            st.rerun()
+        st.info("No empty days left to fill, or no recipes fit.")
+
+    with st.form("meal_planner_form"):
+        for i, day in enumerate(days):
+            recipe_id = current_week_entries[i].get("recipe") if i in current_week_entries else None
+
+            meal = st.selectbox(
+                f"{day}'s meal",
+                options=recipe_options,
+                index=recipe_options.index(recipe_id) if recipe_id in recipes_by_id else 0,
+                format_func=lambda recipe_id: recipes_by_id[recipe_id]["name"] if recipe_id is not None else "",
+                key=f"meal_{week_start_str}_{i}",
+            )
+
+        submitted = st.form_submit_button("Save Meal Plan")
+
+        if submitted:
+            upserts, deletes = diff_meal_plan({i: st.session_state.get(f"meal_{week_start_str}_{i}") for i in range(5)})
+            save_meal_plan(upserts, deletes)
+
+            st.success(f"Meal plan for week {week_start_str} saved!")
+            st.rerun()
+
+    st.divider()
+
+    def feedback_value(value):
+        return None if pd.isna(value) or value == "" else value
+
+    def show_weekly_nutrition(entries):
+        planned_days = sorted(entries)
+        nutrition = weekly_totals([recipe_of(entries[i]) for i in planned_days])
+        st.markdown("#### Nutrition this week")
+        st.dataframe(
+            pd.DataFrame(nutrition["per_recipe"].round(), columns=MACROS, index=[days[i] for i in planned_days]),
+            column_config={"kcal": st.column_config.NumberColumn(format="%d")}
+            | {macro: st.column_config.NumberColumn(f"{macro} (g)", format="%d") for macro in MACROS[1:]},
+        )
+        st.write(f"**Total:** {format_macros(nutrition['total'])}")
+        st.caption(
+            f"Estimated per recipe as written, from {nutrition['matched']} of {nutrition['lines']} ingredients; "
+            f"{nutrition['matched'] - nutrition['measured']} without an amount count as a typical portion."
+        )
+
+    @st.fragment(run_every=LIVE_UPDATE_EVERY)
+    def watch_live_changes():
+        # The only thing on a timer: drains the inbox and draws nothing, so the plan
+        # below is only drawn again when a change to the shown week came in
+        if apply_live_changes():
+            st.rerun(scope="app")
+
+    @st.fragment
+    def show_current_plan():
+        current_week_entries = week_entries()
+
+        # Display current plan in a table
+        st.markdown(f"### Current meal plan for week {week_start_str}")
+
+        df = pd.DataFrame({
+            "Day": days,
+            "Recipe": [recipe_of(current_week_entries[i])["name"] if i in current_week_entries else "" for i in range(5)],
+            "Rate": [current_week_entries[i]["rating"] if i in current_week_entries else None for i in range(5)],
+            "Comment": [current_week_entries[i]["comment"] if i in current_week_entries else None for i in range(5)],
+        })
+
+        # Allow editing of ratings and comments
+        edited_df = st.data_editor(
+            df,
+            column_config={
+                "Recipe": st.column_config.SelectboxColumn(
+                    "Recipe",
+                    options=recipe_names,
+                ),
+                "Rate": st.column_config.NumberColumn(
+                    "Your rating",
+                    min_value=0,
+                    max_value=5,
+                    step=1,
+                    format="%d ⭐",
+                ),
+                "Comment": st.column_config.TextColumn(
+                    "Comment",
+                    max_chars=100,
+                ),
+            },
+            hide_index=True,
+        )
+        if st.button("Save feedback"):
+            changed = []
+            for i, day in enumerate(days):
                 if i in current_week_entries:
-                    supabase.table("meal_plans").delete().eq("id", current_week_entries[i]["id"]).execute()
-
-        st.success(f"Meal plan for week {week_start_str} saved!")
-        st.rerun()
-
-st.divider()
-
-# Display current plan in a table
-st.markdown(f"### Current meal plan for week {week_start_str}")
-
-df = pd.DataFrame({
-    "Day": days,
-    "Recipe": [current_week_entries[i]["recipes"]["name"] if i in current_week_entries else "" for i in range(5)],
-    "Rate": [current_week_entries[i]["rating"] if i in current_week_entries else None for i in range(5)],
-    "Comment": [current_week_entries[i]["comment"] if i in current_week_entries else None for i in range(5)],
-})
-
-# Allow editing of ratings and comments
-edited_df = st.data_editor(
-    df,
-    column_config={
-        "Recipe": st.column_config.SelectboxColumn(
-            "Recipe",
-            options=recipe_names,
-        ),
-        "Rate": st.column_config.NumberColumn(
-            "Your rating",
-            min_value=0,
-            max_value=5,
-            step=1,
-            format="%d ⭐",
-        ),
-        "Comment": st.column_config.TextColumn(
-            "Comment",
-            max_chars=100,
-        ),
-    },
-    hide_index=True,
-)
-
-if st.button("Save feedback"):
-    for i, day in enumerate(days):
-        if i in current_week_entries:
-            entry_id = current_week_entries[i]["id"]
-            updated_rating = edited_df.at[i, "Rate"]
-            updated_comment = edited_df.at[i, "Comment"]
-
-            # Check if rating or comment has changed
-            if (
-                updated_rating != current_week_entries[i].get("rating") or
-                updated_comment != current_week_entries[i].get("comment")
-            ):
-                supabase.table("meal_plans").update({
-                    "rating": int(updated_rating) or None,
-                    "comment": updated_comment or None
-                }).eq("id", entry_id).execute()
-
-    st.success("Feedback saved successfully!")
-    st.rerun()
-
-st.markdown("#### Recipe Details")
-
-# Unter der Tabelle: Ausklappbare Details pro Tag
-for i, entry in current_week_entries.items():
-    recipe_name = entry["recipes"]["name"]
-    with st.expander(f"**{days[i]} - {recipe_name}**"):
-        st.write("")
-        st.write(f"**Ingredients:** {', '.join(entry['recipes']['ingredients'])}")
-        st.info(f"**Instructions:** {entry['recipes']['instructions']}")
-    
-st.divider()
-
-st.markdown("#### Approve Meal Plan for the Week")
-
-sentiment_mapping = [":material/thumb_down:", ":material/thumb_up:"]
-selected = st.feedback("thumbs")
\ No newline at end of file
+                    entry = current_week_entries[i]
+                    updated_rating = feedback_value(edited_df.at[i, "Rate"])
+                    updated_comment = feedback_value(edited_df.at[i, "Comment"])
+
+                    # Check if rating or comment has changed
+                    if updated_rating != entry.get("rating") or updated_comment != entry.get("comment"):
+                        changed.append({
+                            "id": entry["id"],
+                            "week": entry["week"],
+                            "day": entry["day"],
+                            "recipe": entry["recipe"],
+                            "user": entry["user"],
+                            "rating": int(updated_rating) if updated_rating else None,
+                            "comment": updated_comment,
+                        })
+
+            if changed:
+                local.save("meal_plans", changed)
+
+            st.success("Feedback saved successfully!")
+            st.rerun()
+
+        st.markdown("#### Recipe Details")
+
+        # Unter der Tabelle: Ausklappbare Details pro Tag
+        for i, entry in current_week_entries.items():
+            recipe = recipe_of(entry)
+            with st.expander(f"**{days[i]} - {recipe['name']}**"):
+                st.write("")
+                st.write(f"**Ingredients:** {', '.join(recipe['ingredients'])}")
+                st.info(f"**Instructions:** {recipe['instructions']}")
+                similar = similarity_index(shared_client()).similar(entry["recipe"], k=SUGGESTION_COUNT, user_ids=household)
+                if similar:
+                    st.caption("Similar recipes: " + ", ".join(name for _, name, _ in similar))
+
+        if current_week_entries:
+            show_weekly_nutrition(current_week_entries)
+            # Scored once per month and change of the recipes, not on every run
+            scores = household_scores(recipes, (household, local.versions["recipes"]), current_region(), week_start.month)
+            score = week_score(scores, [entry["recipe"] for entry in current_week_entries.values()])
+            if score is not None:
+                st.caption(f"🌱 This week's vegetables: {format_score(score)}")
+
+        if st.secrets.get("SHOW_CONNECTION_STATS"):
+            lag = meal_plan_feed().lag_stats()
+            if lag["changes"]:
+                st.caption(
+                    f"Live updates: {lag['changes']} changes, shown {1000 * lag['p50']:.0f} ms (p50) / "
+                    f"{1000 * lag['p95']:.0f} ms (p95) after the commit"
+                )
+
+    watch_live_changes()
+    show_current_plan()
+
+    st.divider()
+
+    st.markdown("#### Approve Meal Plan for the Week")
+
+    sentiment_mapping = [":material/thumb_down:", ":material/thumb_up:"]
+    selected = st.feedback("thumbs")
+
+    show_page_stats()
@@ -1,215 +1,435 @@
 import streamlit as st
-import time
+from datetime import date
 from utils import *
-from recipe_scrapers import scrape_me
+from categories import *
+from search import recipe_index
+from recommend import similarity_index
+from replica import replica
+from public_recipes import public_recipes
+from ingredients import split_ingredients
+from nutrition import format_macros, recipe_nutrients
+from seasonal import current_region, format_score, recipe_scores, this_month
+from planner import average_ratings
+from importer import import_queue, content_hash, PENDING_STATUSES
+from transfer import FORMATS, deferred_export, export_meal_plans, export_recipes, file_format, import_meal_plans, import_recipes
 
 st.set_page_config(page_title="Recipe Library", layout="centered")
 st.title("📚 Recipe Library")
 
-supabase, controller = authenticate()
-show_login(controller)
+with track_page("Recipe Library"):
+    supabase, controller = authenticate()
+    show_login(controller)
 
-if "user" not in st.session_state:
-    st.warning("Please log in to access the recipe library.")
-    st.stop()
+    if "user" not in st.session_state:
+        st.warning("Please log in to access the recipe library.")
+        st.stop()
 
-# Form for URL input
-with st.form("recipe_form"):
-    url = st.text_input("Paste the recipe URL here:")
-    public = st.checkbox("Make recipe publicly available")
-    submit = st.form_submit_button("Add recipe from URL")
+    PAGE_SIZE = 20
+    RECIPE_BODY_COLUMNS = "id, name, ingredients, instructions"
 
-if submit:
+    local = replica(shared_client())
     try:
-        scraper = scrape_me(url)
-
-        # Extract fields
-        name = scraper.title()
-        ingredients = scraper.ingredients()
-        instructions = scraper.instructions()
-
-        new_recipe = {
-            "name": name,
-            "ingredients": ingredients,
-            "instructions": instructions,
-            "author": st.session_state.user.id,
-            "public": public
-        }
-
-        response = supabase.table("recipes").insert(new_recipe).execute()
-        st.success(f"Recipe '{name}' added!")
-        # Show result
-        st.markdown("**Ingredients:**")
-        st.write(ingredients)
-        st.markdown("**Instructions:**")
-        st.write(instructions)
-        time.sleep(10)
-        st.rerun()
-
-    except Exception as e:
-        st.error(f"Failed to scrape recipe: {e}")
-
-def fetch_my_recipes():
-    # def merge_recipes(user_recipes, public_recipes):
-    #     merged = {recipe["id"]: recipe for recipe in user_recipes}
-    #     for recipe in public_recipes:
-    #         if recipe["id"] not in merged:
-    #             merged[recipe["id"]] = recipe
-    #     return list(merged.values())
-    try:
-        user_recipes = supabase.table("recipes").select("*").eq("author", st.session_state.user.id).execute()
+        local.ensure_pulled(household_ids(supabase), supabase)
     except Exception as e:
-        st.error(f"Error fetching user recipes: {e}")
-        return []
-    return user_recipes.data
+        st.error(f"Error fetching recipes: {e}")
+        st.stop()
+    show_sync_status(local)
+    # Public recipes come from one copy shared by all sessions, which keep only cursors
+    shared = public_recipes(shared_client())
+    shared.refresh_if_stale()
+    SIMILAR_COUNT = 3
+    RECOMMENDATION_COUNT = 5
+
+    def fetch_recipe_page(library, after=None):
+        # Keyset pagination on id; one extra row tells us whether there is a next page
+        if library == "mine":
+            # The user's own recipes are read from the local replica
+            rows = local.recipes([st.session_state.user.id], after, PAGE_SIZE + 1)
+        else:
+            rows = shared.page(after, PAGE_SIZE + 1, exclude_author=st.session_state.user.id)
+        return rows[:PAGE_SIZE], rows[PAGE_SIZE - 1]["id"] if len(rows) > PAGE_SIZE else None
+
+    def index_recipe(recipe):
+        # The search and similarity indexes and the replica are kept current instead of rebuilt
+        recipe_index(shared_client()).add(recipe)
+        similarity_index(shared_client()).add(recipe)
+        local.apply_remote("recipes", [recipe])
+        shared.apply([recipe])
+
+    def unindex_recipe(recipe_id):
+        recipe_index(shared_client()).remove(recipe_id)
+        similarity_index(shared_client()).remove(recipe_id)
+        local.remove_remote("recipes", [recipe_id])
+        shared.remove([recipe_id])
+
+    def load_recipe(recipe_id):
+        recipe = local.get("recipes", recipe_id) or shared.get(recipe_id)
+        if recipe is not None:
+            return recipe
+        return supabase.table("recipes").select(RECIPE_BODY_COLUMNS).eq("id", recipe_id).execute().data[0]
+
+    def invalidate_recipes():
+        import_queue(shared_client()).forget_recipes(st.session_state.user.id)
+
+    def show_pager(library, next_cursor):
+        cursors = st.session_state.setdefault(f"{library}_cursors", [None])
+        col1, col2 = st.columns([1, 1])
+        if len(cursors) > 1 and col1.button("⬅️ Previous", key=f"{library}_prev"):
+            cursors.pop()
+            st.rerun()
+        if next_cursor is not None and col2.button("Next ➡️", key=f"{library}_next"):
+            cursors.append(next_cursor)
+            st.rerun()
 
-def fetch_public_recipes():
-    try:
-        public_recipes = supabase.table("recipes").select("*").eq("public", True).neq("author", st.session_state.user.id).execute()
-    except Exception as e:
-        st.error(f"Error fetching user recipes: {e}")
-        return []
-    return public_recipes.data
-
-
-recipes = fetch_my_recipes()
-public_recipes = fetch_public_recipes()
-
-# --- CATEGORY OPTIONS (with empty option for optionality) ---
-TYPES = [""] + ["salad", "soup", "wraps/burrito", "bowl (graupe)", "veggie+base+protein", "potato+schnitzel+veggie"]
-BASES = [""] + ["rice noodles", "rice", "pasta", "gnocchi", "tortellini", "rice paper"]
-PROTEINS = [""] + ["lentils", "tofu", "kichererbsen", "fake chicken", "veggie hack", "kidney beans"]
-SAUCES = [""] + ["peanut butter", "tahin", "honig/senf", "sahne", "yogurt"]
-VEGGIES = ["blumenkohl", "karotten", "pilze", "chinakohl", "spinat", "brokkoli", "grüner spargel", "sweet potato", "lauch", "kartoffel", "tomaten", "pak choi"]
-TOPPINGS = ["lauchzwiebel", "sesam", "cashews/peanut", "petersilie", "koriander"]
-
-# --- FORM FOR NEW RECIPE ---
-with st.form("create_recipe"):
-    st.subheader("📝 Create a New Recipe")
-
-    name = st.text_input("Recipe Name", placeholder="Required", key="name")
-    base = st.selectbox("Base (optional)", BASES, key="base")
-    protein = st.selectbox("Protein (optional)", PROTEINS, key="protein")
-    sauce = st.selectbox("Sauce (optional)", SAUCES, key="sauce")
-    veggies = st.multiselect("Vegetables (optional)", VEGGIES, key="veggies")
-    toppings = st.multiselect("Toppings (optional)", TOPPINGS, key="toppings")
-    notes = st.text_area("Additional Ingredients", key="notes")
-    instructions = st.text_area("Instructions", key="instructions")
-    public = st.checkbox("Make recipe publicly available")
-
-    submitted = st.form_submit_button("➕ Add Recipe")
-
-    if submitted:
-        if not st.session_state.name.strip():
-            st.error("Please enter a recipe name.")
+    def current_cursor(library):
+        return st.session_state.setdefault(f"{library}_cursors", [None])[-1]
+
+
+    # Form for URL input
+    with st.form("recipe_form"):
+        urls = st.text_area("Paste recipe URLs here (one per line):")
+        url_file = st.file_uploader("...or upload a text file with one URL per line", type=["txt", "csv"])
+        public = st.checkbox("Make recipes publicly available")
+        submit = st.form_submit_button("Add recipes from URLs")
+
+    if submit:
+        lines = urls.splitlines()
+        if url_file is not None:
+            lines += url_file.getvalue().decode("utf-8", errors="replace").splitlines()
+        url_list = list(dict.fromkeys(line.strip() for line in lines if line.strip().startswith("http")))
+        if not url_list:
+            st.error("Please enter at least one recipe URL.")
+        else:
+            job_ids = import_queue(shared_client()).submit(url_list, st.session_state.user.id, public, supabase)
+            st.session_state.import_jobs = list(dict.fromkeys(st.session_state.get("import_jobs", []) + job_ids))
+
+    @st.fragment(run_every=2)
+    def show_import_jobs():
+        jobs = import_queue(shared_client()).jobs(st.session_state.get("import_jobs", []))
+        if not jobs:
+            return
+
+        st.markdown("**Recipe imports**")
+        for job in jobs:
+            recipe_name = job["recipe"]["name"] if job["recipe"] else ""
+            if job["status"] == "done":
+                st.success(f"Added '{recipe_name}' ({job['url']})")
+            elif job["status"] == "duplicate":
+                st.info(f"'{recipe_name}' is already in your recipes ({job['url']})")
+            elif job["status"] == "failed":
+                st.error(f"Failed to scrape recipe from {job['url']}: {job['error']}")
+            else:
+                st.caption(f"⏳ {job['status'].capitalize()} {job['url']}")
+
+        stats = import_queue(shared_client()).scrape_stats()
+        st.caption(
+            f"Scrape cache: {stats['hit_rate']:.0%} hit rate, {stats['not_modified']} revalidated, "
+            f"{stats['downloads']} downloaded"
+        )
+
+        if all(job["status"] not in PENDING_STATUSES for job in jobs) and st.button("Dismiss"):
+            st.session_state.import_jobs = []
+            st.rerun()
+
+        # Refresh the recipe lists once for every newly imported recipe
+        indexed = st.session_state.setdefault("indexed_import_jobs", set())
+        imported = [job for job in jobs if job["status"] == "done" and job["id"] not in indexed]
+        for job in imported:
+            index_recipe(job["recipe"])
+            indexed.add(job["id"])
+        if imported:
+            invalidate_recipes()
+            st.rerun(scope="app")
+
+    show_import_jobs()
+
+    # --- BULK IMPORT / EXPORT ---
+    def run_bulk_import(kind, upload, public):
+        bar = st.progress(0.0, text="Reading file...")
+
+        def progress(fraction, stats, elapsed):
+            bar.progress(fraction, text=(
+                f"{stats['inserted']} added, {stats['duplicates']} already there, {stats['invalid']} invalid "
+                f"({stats['read'] / max(elapsed, 0.001):.0f} rows/s)"
+            ))
+
+        fmt = file_format(upload.name)
+        if kind == "Recipes":
+            search, similar = recipe_index(shared_client()), similarity_index(shared_client())
+
+            def added(rows):
+                # Called from the writer thread, so the indexes are looked up beforehand
+                for row in rows:
+                    search.add(row)
+                    similar.add(row)
+                local.apply_remote("recipes", rows)
+                shared.apply(rows)
+
+            stats = import_recipes(supabase, upload, fmt, st.session_state.user.id, public, on_insert=added, progress=progress)
+            invalidate_recipes()
         else:
-            # aggregate ingredients
-            ingredients = []
-            if st.session_state.protein:
-                ingredients.append(st.session_state.protein)
-            if st.session_state.base:
-                ingredients.append(st.session_state.base)
-            if st.session_state.sauce:
-                ingredients.append(st.session_state.sauce)
-            ingredients.extend(st.session_state.veggies)
-            ingredients.extend(st.session_state.toppings)
+            stats = import_meal_plans(
+                supabase, upload, fmt, st.session_state.user.id, household_ids(supabase),
+                on_insert=lambda rows: local.apply_remote("meal_plans", rows), progress=progress,
+            )
+        return stats
+
+    with st.expander("📦 Bulk import / export"):
+        transfer_kind = st.radio("Data", ["Recipes", "Meal plans"], horizontal=True, key="transfer_kind")
+        transfer_format = st.radio("Export format", FORMATS, horizontal=True, key="transfer_format")
+        st.download_button(
+            f"⬇️ Export my {transfer_kind.lower()}",
+            deferred_export(
+                supabase, export_recipes if transfer_kind == "Recipes" else export_meal_plans, transfer_format,
+                [st.session_state.user.id],
+            ),
+            file_name=f"{transfer_kind.lower().replace(' ', '_')}-{date.today()}.{transfer_format}",
+            mime="application/vnd.apache.parquet" if transfer_format == "parquet" else "application/jsonl",
+        )
+        if transfer_kind == "Meal plans":
+            st.caption("Plans refer to recipes by their content, so import the recipes first when moving to a new account.")
+        upload = st.file_uploader(f"Import {transfer_kind.lower()} from Parquet or JSONL", type=["parquet", "jsonl", "json"], key="transfer_file")
+        bulk_public = transfer_kind == "Recipes" and st.checkbox("Make imported recipes publicly available", key="transfer_public")
+        if upload is not None and st.button(f"⬆️ Import {transfer_kind.lower()}", key="transfer_import"):
+            try:
+                stats = run_bulk_import(transfer_kind, upload, bulk_public)
+                st.success(
+                    f"Added {stats['inserted']} of {stats['read']} {transfer_kind.lower()}: "
+                    f"{stats['duplicates']} already there, {stats['invalid']} invalid."
+                )
+                for error in stats["errors"]:
+                    st.caption(f"⚠️ {error}")
+            except Exception as e:
+                st.error(f"Error importing {transfer_kind.lower()}: {e}")
+
+    recipes, next_recipes = fetch_recipe_page("mine", current_cursor("mine"))
+    public_recipes, next_public_recipes = fetch_recipe_page("public", current_cursor("public"))
+
+    # --- FORM FOR NEW RECIPE ---
+    with st.form("create_recipe"):
+        st.subheader("📝 Create a New Recipe")
+
+        name = st.text_input("Recipe Name", placeholder="Required", key="name")
+        base = st.selectbox("Base (optional)", BASES, key="base")
+        protein = st.selectbox("Protein (optional)", PROTEINS, key="protein")
+        sauce = st.selectbox("Sauce (optional)", SAUCES, key="sauce")
+        veggies = st.multiselect("Vegetables (optional)", VEGGIES, key="veggies")
+        toppings = st.multiselect("Toppings (optional)", TOPPINGS, key="toppings")
+        notes = st.text_area("Additional Ingredients", key="notes")
+        instructions = st.text_area("Instructions", key="instructions")
+        public = st.checkbox("Make recipe publicly available")
+
+        submitted = st.form_submit_button("➕ Add Recipe")
+
+        if submitted:
+            if not st.session_state.name.strip():
+                st.error("Please enter a recipe name.")
+            else:
+                # aggregate ingredients
+                ingredients = []
+                if st.session_state.protein:
+                    ingredients.append(st.session_state.protein)
+                if st.session_state.base:
+                    ingredients.append(st.session_state.base)
+                if st.session_state.sauce:
+                    ingredients.append(st.session_state.sauce)
+                ingredients.extend(st.session_state.veggies)
+                ingredients.extend(st.session_state.toppings)
             
-            notes_array = [note.strip() for note in st.session_state.notes.split(",") if note.strip()] if st.session_state.notes else []
-            ingredients.extend(notes_array)
+                notes_array = split_ingredients(st.session_state.notes)
+                ingredients.extend(notes_array)
             
-            new_recipe = {
-                "name": st.session_state.name.strip(),
-                "ingredients": ingredients,
-                "instructions": st.session_state.instructions or None,
-                "author": st.session_state.user.id,
-                "public": public
-            }
-
-            response = supabase.table("recipes").insert(new_recipe).execute()
-            st.success(f"Recipe '{new_recipe['name']}' added!")
-            st.rerun()
+                new_recipe = {
+                    "name": st.session_state.name.strip(),
+                    "ingredients": ingredients,
+                    "instructions": st.session_state.instructions or None,
+                    "author": st.session_state.user.id,
+                    "public": public
+                }
 
-st.divider()
+                response = supabase.table("recipes").insert(new_recipe).execute()
+                index_recipe(response.data[0])
+                invalidate_recipes()
+                st.success(f"Recipe '{new_recipe['name']}' added!")
+                st.rerun()
 
-edit_index = st.session_state.get("edit_index", None)
+    st.divider()
 
-if edit_index is not None:
-    recipe = recipes[edit_index]
-    st.subheader(f"✏️ Edit Recipe: {recipe['name']}")
+    edit_id = st.session_state.get("edit_id", None)
 
-    with st.form("edit_recipe_form"):
+    if edit_id is not None:
+        recipe = load_recipe(edit_id)
+        st.subheader(f"✏️ Edit Recipe: {recipe['name']}")
+
+        with st.form("edit_recipe_form"):
         
-        name = st.text_input("Recipe Name", value=recipe["name"])
-        ingredients = st.text_input("Ingredients", value=", ".join(recipe.get("ingredients", [])))
-        instructions = st.text_area("Instructions", value=recipe.get("instructions", ""))
+            name = st.text_input("Recipe Name", value=recipe["name"])
+            ingredients = st.text_input("Ingredients", value=", ".join(recipe.get("ingredients") or []))
+            instructions = st.text_area("Instructions", value=recipe.get("instructions") or "")
 
-        col1, col2 = st.columns(2)
-        save = col1.form_submit_button("💾 Save Changes")
-        cancel = col2.form_submit_button("❌ Cancel")
+            col1, col2 = st.columns(2)
+            save = col1.form_submit_button("💾 Save Changes")
+            cancel = col2.form_submit_button("❌ Cancel")
 
-        if save:
-            updated = {
-                "name": name.strip(),
-                "ingredients" : [ing.strip() for ing in ingredients.split(",")],
-                "instructions": instructions or None,
-            }
+            if save:
+                updated = {
+                    "name": name.strip(),
+                    "ingredients" : split_ingredients(ingredients),
+                    "instructions": instructions or None,
+                }
 
-            try:
-                response = supabase.table("recipes").update(updated).eq("id", recipe["id"]).execute()
-            except Exception as e:
-                st.error(f"Error updating recipe: {e}")
-
-            st.session_state.edit_index = None
-            st.success("Recipe updated!")
+                try:
+                    response = supabase.table("recipes").update(updated).eq("id", recipe["id"]).execute()
+                    index_recipe(response.data[0])
+                except Exception as e:
+                    st.error(f"Error updating recipe: {e}")
+
+                invalidate_recipes()
+                st.session_state.edit_id = None
+                st.success("Recipe updated!")
+                st.rerun()
+
+            if cancel:
+                st.session_state.edit_id = None
+                st.info("Editing canceled.")
+                st.rerun()
+
+    def show_recipe_body(recipe):
+        body = load_recipe(recipe["id"])
+        st.write(f"**Ingredients:** {', '.join(body['ingredients'] or [])}")
+        st.info(f"**Instructions:** {body['instructions']}")
+        nutrition = recipe_nutrients(body)
+        if nutrition["matched"]:
+            st.caption(f"Nutrition (estimated): {format_macros(nutrition['macros'])}")
+        season = recipe_scores([body], current_region(), this_month()).get(body["id"])
+        if season:
+            st.caption(f"This month: {format_score(season)}")
+        similar = similarity_index(shared_client()).similar(recipe["id"], k=SIMILAR_COUNT, user_ids=household_ids(supabase))
+        if similar:
+            st.caption("Similar recipes: " + ", ".join(name for _, name, _ in similar))
+        return body
+
+    def already_saved(body):
+        # True if the user already has a recipe with the same name and content
+        same_name = supabase.table("recipes").select("name, ingredients, instructions").eq(
+            "author", st.session_state.user.id
+        ).eq("name", body["name"]).execute().data
+        body_hash = content_hash(body["name"], body["ingredients"], body["instructions"])
+        return any(content_hash(r["name"], r["ingredients"], r["instructions"]) == body_hash for r in same_name)
+
+    # --- SEARCH ---
+    st.subheader("🔎 Search Recipes")
+
+    search_query = st.text_input("Search by name, ingredient or instruction", key="search_query")
+    with st.expander("Filter by ingredients"):
+        must_contain = st.text_input("Must contain all of (comma-separated)", key="search_ingredients")
+        facet_columns = st.columns(len(FACETS))
+        facet_filters = []
+        for column, (facet, values) in zip(facet_columns, FACETS.items()):
+            facet_filters.extend(column.multiselect(facet, values, key=f"facet_{facet}"))
+
+    search_ingredients = [ing.strip() for ing in must_contain.split(",") if ing.strip()] + facet_filters
+
+    if search_query.strip() or search_ingredients:
+        # Start from the first page whenever the search changes
+        search_key = (search_query, tuple(search_ingredients))
+        if st.session_state.get("search_key") != search_key:
+            st.session_state.search_key = search_key
+            st.session_state.search_page = 0
+        search_page = st.session_state.search_page
+
+        hits, total = recipe_index(shared_client()).search(
+            search_query, search_ingredients, user_id=st.session_state.user.id, page=search_page, page_size=PAGE_SIZE
+        )
+        st.caption(f"{total} recipes found")
+        for i, (recipe_id, recipe_name, score) in enumerate(hits):
+            details = st.expander(f"{search_page*PAGE_SIZE+i+1}. **{recipe_name}**", key=f"search_recipe_{recipe_id}", on_change="rerun")
+            if details.open:
+                with details:
+                    show_recipe_body({"id": recipe_id})
+
+        col1, col2 = st.columns([1, 1])
+        if search_page > 0 and col1.button("⬅️ Previous", key="search_prev"):
+            st.session_state.search_page -= 1
             st.rerun()
-
-        if cancel:
-            st.session_state.edit_index = None
-            st.info("Editing canceled.")
+        if (search_page + 1) * PAGE_SIZE < total and col2.button("Next ➡️", key="search_next"):
+            st.session_state.search_page += 1
             st.rerun()
 
-# --- DISPLAY EXISTING RECIPES ---
-st.subheader("📖 My Recipes")
-
-if recipes:
-    for i, recipe in enumerate(recipes):
-        with st.expander(f"{i+1}. **{recipe['name']}**"):
-            st.write(f"**Ingredients:** {', '.join(recipe['ingredients'])}")
-            st.info(f"**Instructions:** {recipe['instructions']}")
-
-            col1, col2 = st.columns([1, 1])
-            with col1:
-                if st.button("✏️ Edit", key=f"edit_{i}"):
-                    st.session_state.edit_index = i
-                    st.rerun()
-            with col2:
-                if st.button("🗑️ Delete", key=f"delete_{i}"):
-                    response = supabase.table("recipes").delete().eq("id", recipe["id"]).execute()
-                    if not response:
-                        st.error(f"Error deleting recipe: {response.error.message}")
-                    st.success("Deleted.")
-                    st.rerun()
-else:
-    st.info("No recipes yet. Create one above or add one from below!")
-
-st.subheader("🌍 Public Recipes")
-
-if public_recipes:
-    for i, recipe in enumerate(public_recipes):
-        with st.expander(f"{i+1}. **{recipe['name']}**"):
-            st.write(f"**Ingredients:** {', '.join(recipe['ingredients'])}")
-            st.info(f"**Instructions:** {recipe['instructions']}")
-
-            if st.button("💾 Save to My Recipes", key=f"save_public_{i}"):
-                try:
-                    new_recipe = {
-                        "name": recipe["name"],
-                        "ingredients": recipe["ingredients"],
-                        "instructions": recipe["instructions"],
-                        "author": st.session_state.user.id
-                    }
-                    response = supabase.table("recipes").insert(new_recipe).execute()
-                    st.success(f"Recipe '{recipe['name']}' saved to your recipes!")
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Error saving recipe: {e}")
+        st.divider()
+
+    # --- RECOMMENDATIONS ---
+    recommendations = similarity_index(shared_client()).recommend(
+        average_ratings(rating_history(supabase)), k=RECOMMENDATION_COUNT, user_ids=household_ids(supabase)
+    )
+    if recommendations:
+        st.subheader("✨ Recommended for You")
+        st.caption("Based on the ratings in your meal plans")
+        for recipe_id, recipe_name, score in recommendations:
+            details = st.expander(f"**{recipe_name}**", key=f"recommended_recipe_{recipe_id}", on_change="rerun")
+            if details.open:
+                with details:
+                    show_recipe_body({"id": recipe_id})
+        st.divider()
+
+    # --- DISPLAY EXISTING RECIPES ---
+    st.subheader("📖 My Recipes")
+
+    if recipes:
+        offset = PAGE_SIZE * (len(st.session_state.mine_cursors) - 1)
+        for i, recipe in enumerate(recipes):
+            # Bodies are only fetched once an expander is opened
+            details = st.expander(f"{offset+i+1}. **{recipe['name']}**", key=f"recipe_{recipe['id']}", on_change="rerun")
+            if details.open:
+                with details:
+                    show_recipe_body(recipe)
+
+                    col1, col2 = st.columns([1, 1])
+                    with col1:
+                        if st.button("✏️ Edit", key=f"edit_{recipe['id']}"):
+                            st.session_state.edit_id = recipe["id"]
+                            st.rerun()
+                    with col2:
+                        if st.button("🗑️ Delete", key=f"delete_{recipe['id']}"):
+                            response = supabase.table("recipes").delete().eq("id", recipe["id"]).execute()
+                            if not response:
+                                st.error(f"Error deleting recipe: {response.error.message}")
+                            unindex_recipe(recipe["id"])
+                            invalidate_recipes()
+                            st.success("Deleted.")
+                            st.rerun()
+        show_pager("mine", next_recipes)
+    else:
+        st.info("No recipes yet. Create one above or add one from below!")
+
+    st.subheader("🌍 Public Recipes")
+
+    if public_recipes:
+        offset = PAGE_SIZE * (len(st.session_state.public_cursors) - 1)
+        for i, recipe in enumerate(public_recipes):
+            details = st.expander(f"{offset+i+1}. **{recipe['name']}**", key=f"public_recipe_{recipe['id']}", on_change="rerun")
+            if details.open:
+                with details:
+                    body = show_recipe_body(recipe)
+
+                    if st.button("💾 Save to My Recipes", key=f"save_public_{recipe['id']}"):
+                        try:
+                            if already_saved(body):
+                                st.info(f"Recipe '{recipe['name']}' is already in your recipes.")
+                            else:
+                                new_recipe = {
+                                    "name": body["name"],
+                                    "ingredients": body["ingredients"],
+                                    "instructions": body["instructions"],
+                                    "author": st.session_state.user.id
+                                }
+                                response = supabase.table("recipes").insert(new_recipe).execute()
+                                index_recipe(response.data[0])
+                                invalidate_recipes()
+                                st.success(f"Recipe '{recipe['name']}' saved to your recipes!")
+                                st.rerun()
+                        except Exception as e:
+                            st.error(f"Error saving recipe: {e}")
+        show_pager("public", next_public_recipes)
+
+    show_page_stats()
@@ -1,74 +1,112 @@
 import streamlit as st
-from groq import Groq
+import time
 from datetime import date, timedelta
 from utils import *
+from shopping import aggregate, format_shopping_list, shopping_list_cache, shopping_list_key
+from llm import llm_client, llm_models, stream_completion, format_call
 
 st.set_page_config(page_title="Shopping List", layout="centered")
 st.title("🛒 Shopping List Generator")
 
-groq_client = Groq(
-  api_key=st.secrets["GROQ_API_KEY"]
-)
-
-supabase, controller = authenticate()
-show_login(controller)
-
-if "user" not in st.session_state:
-    st.warning("Please log in to access the recipe library.")
-    st.stop()
-
-################################################# 
-
-if st.session_state.user is None:
-    st.warning("Please log in to access the shopping list generator.")
-    st.stop()
-
-# Calculate the date of the next Monday
-today = date.today()
-days_until_monday = (7 - today.weekday()) % 7
-next_monday = today + timedelta(days=days_until_monday)
-
-def fetch_meal_plan():
-    response = supabase.table("meal_plans").select("*, recipes(*)").eq("user", st.session_state.user.id).eq("week", next_monday).execute()
-    if not response:
-        st.error(f"Error fetching meal plans.")
-        return []
-    return response.data
-
-meal_plan = fetch_meal_plan()
-
-if not meal_plan:
-    st.warning("No recipes planned for the next 7 days.")
-    st.stop()
-
-# 2. Create prompt for Groq (leave out instructions!)
-def format_recipe(r):
-    return f"""{r["name"]} with {', '.join(r.get("ingredients", []))};"""
-
-prompt = "You are a helpful cooking assistant. Based on the following recipes, generate a combined shopping list grouped by category: vegetables, other items, and things that are probably at home already. Avoid duplicates. Do not add any translations or explanations in parentheses. Keep ingredient names exactly as in the input, even if they're not English. Ingredients like spices, oils, sauces (e.g. soy sauce, tahin, sriracha, peanut butter, vinegar, maple syrup, curry powder, etc.) should go under \"things that are probably at home already\", unless they are very uncommon. Group logically. Output only the list.\n\n Recipes: \n"
-
-for entry in meal_plan:
-    prompt += format_recipe(entry["recipes"]) + "\n"
-
-st.markdown("### 📝 Prompt for Groq"
-             f" (for {len(meal_plan)} recipes):")
-st.markdown(f"```python\n{prompt}```")
-
-st.divider()
-
-st.markdown(f"Ask Groq for shopping list or paste prompt into ChatGPT.")
-
-#prompt += "Please format the result clearly with bullet points under each category."
-
-# 3. Call Groq API
-if st.button("Generate Shopping List"):
-    with st.spinner("Asking Groq for help..."):
-        response = groq_client.chat.completions.create(
-            model="llama3-8b-8192",  # or llama3-70b if available
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-        )
-        result = response.choices[0].message.content
-
-        st.markdown("### 🧾 Shopping List")
-        st.markdown(result)
+groq_client = llm_client()
+
+with track_page("Shopping List"):
+    supabase, controller = authenticate()
+    show_login(controller)
+
+    if "user" not in st.session_state:
+        st.warning("Please log in to access the recipe library.")
+        st.stop()
+
+    ################################################# 
+
+    if st.session_state.user is None:
+        st.warning("Please log in to access the shopping list generator.")
+        st.stop()
+
+    # Calculate the date of the next Monday
+    today = date.today()
+    days_until_monday = (7 - today.weekday()) % 7
+    next_monday = today + timedelta(days=days_until_monday)
+
+    def fetch_meal_plan():
+        # Read from the local replica, so the list also opens on a weak connection
+        household = household_ids(supabase)
+        local = replica(shared_client())
+        try:
+            local.ensure_pulled(household, supabase)
+        except Exception as e:
+            st.error(f"Error fetching meal plans: {e}")
+            return []
+        show_sync_status(local)
+        recipes_by_id = {recipe["id"]: recipe for recipe in local.recipes(household)}
+        week = next_monday.strftime("%Y-%m-%d")
+        return [
+            {**entry, "recipes": recipes_by_id[entry["recipe"]]}
+            for entry in household_week(local, household, week).values()
+            if entry["recipe"] in recipes_by_id
+        ]
+
+    meal_plan = fetch_meal_plan()
+
+    if not meal_plan:
+        st.warning("No recipes planned for the next 7 days.")
+        st.stop()
+
+    # 2. Build the shopping list locally
+    started = time.perf_counter()
+    groups, unparsed = aggregate([entry["recipes"] for entry in meal_plan])
+    elapsed_ms = 1000 * (time.perf_counter() - started)
+
+    st.markdown("### 🧾 Shopping List")
+    st.markdown(format_shopping_list(groups))
+    st.caption(f"Built locally from {len(meal_plan)} recipes in {elapsed_ms:.1f} ms.")
+
+    # 3. Create prompt for Groq (leave out instructions!)
+    def format_recipe(r):
+        return f"""{r["name"]} with {', '.join(r.get("ingredients", []))};"""
+
+    prompt = "You are a helpful cooking assistant. Based on the following recipes, generate a combined shopping list grouped by category: vegetables, other items, and things that are probably at home already. Avoid duplicates. Do not add any translations or explanations in parentheses. Keep ingredient names exactly as in the input, even if they're not English. Ingredients like spices, oils, sauces (e.g. soy sauce, tahin, sriracha, peanut butter, vinegar, maple syrup, curry powder, etc.) should go under \"things that are probably at home already\", unless they are very uncommon. Group logically. Output only the list.\n\n Recipes: \n"
+
+    for entry in meal_plan:
+        prompt += format_recipe(entry["recipes"]) + "\n"
+
+    # 4. Only the ingredients the local parser did not understand go to Groq
+    if unparsed:
+        st.warning(f"{len(unparsed)} ingredients could not be recognized: {'; '.join(unparsed)}")
+
+        fallback_prompt = "You are a helpful cooking assistant. Turn the following recipe ingredient lines into shopping list items grouped by category: vegetables, other items, and things that are probably at home already. Do not add any translations or explanations in parentheses. Keep ingredient names exactly as in the input, even if they're not English. Output only the list.\n\n Ingredients: \n" + "\n".join(unparsed)
+
+        rendered = {"streamed": False}
+
+        def ask_groq():
+            # Rendered token by token while it streams; concurrent requests for the same
+            # recipes wait for this one and get the finished list
+            call = {}
+            content = st.write_stream(stream_completion(groq_client, fallback_prompt, llm_models(), call))
+            st.caption(format_call(call))
+            rendered["streamed"] = True
+            return {"content": content, "tokens": call["tokens"]}
+
+        # Reuse the answer for the same recipes, also across partners and reruns
+        cache_key = shopping_list_key([entry["recipes"] for entry in meal_plan])
+        result = shopping_list_cache().get(cache_key)
+
+        if result is None and st.button("Ask Groq to sort the remaining ingredients"):
+            try:
+                result = shopping_list_cache().get_or_create(cache_key, ask_groq)
+            except Exception as e:
+                st.error(f"Groq is not available right now: {e}")
+
+        if result is not None and not rendered["streamed"]:
+            st.markdown(result["content"])
+            if result["tokens"]:
+                st.caption(f"{result['tokens']} tokens used.")
+
+    st.divider()
+
+    with st.expander(f"📝 Prompt for Groq (for {len(meal_plan)} recipes)"):
+        st.markdown(f"Paste the prompt into ChatGPT to get a shopping list from an LLM instead.")
+        st.markdown(f"```python\n{prompt}```")
+
+    show_page_stats()
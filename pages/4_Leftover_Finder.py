@@ -0,0 +1,58 @@
+import streamlit as st
+import time
+from utils import *
+from ingredients import category, ingredient_name, split_ingredients
+from recommend import similarity_index
+
+st.set_page_config(page_title="Leftover Finder", layout="centered")
+st.title("🥬 Leftover Finder")
+
+with track_page("Leftover Finder"):
+    supabase, controller = authenticate()
+    show_login(controller)
+
+    if "user" not in st.session_state:
+        st.warning("Please log in to find recipes for your leftovers.")
+        st.stop()
+
+    RESULT_COUNT = 10
+
+    st.markdown("Tell us what is left in your fridge and we find the recipes that use most of it.")
+
+    with st.form("leftovers_form"):
+        leftovers = st.text_area("What do you have? (comma-separated)", placeholder="karotten, spinat, 200 g rice, tofu")
+        include_public = st.checkbox("Include public recipes", value=True)
+        submitted = st.form_submit_button("🔍 Find recipes")
+
+    names = list(dict.fromkeys(ingredient_name(text) for text in split_ingredients(leftovers)))
+    # Pantry items are assumed to be at home anyway and are not part of the index
+    wanted = [name for name in names if category(name) != "at home"]
+
+    if submitted and not wanted:
+        st.warning("Please enter at least one ingredient that is not a pantry staple.")
+
+    if wanted:
+        household = household_ids(supabase)
+        index = similarity_index(shared_client())
+        started = time.perf_counter()
+        results = index.cover(wanted, k=RESULT_COUNT, user_ids=household, only_from=None if include_public else household)
+        search_ms = 1000 * (time.perf_counter() - started)
+
+        unknown = [name for name in wanted if not index.knows(name)]
+        if unknown:
+            st.caption("Not found in any recipe: " + ", ".join(unknown))
+
+        if not results:
+            st.info("No recipes found that use these ingredients.")
+        for recipe_id, name, have, missing in results:
+            with st.container(border=True):
+                total = have + len(missing)
+                st.markdown(f"**{name}**")
+                st.progress(have / total, text=f"You have {have} of {total} ingredients")
+                if missing:
+                    st.caption("Missing: " + ", ".join(missing))
+                else:
+                    st.caption("You have everything (apart from pantry staples).")
+        st.caption(f"Searched {len(index)} recipes in {search_ms:.1f} ms.")
+
+    show_page_stats()
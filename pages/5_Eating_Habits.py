@@ -0,0 +1,76 @@
+import streamlit as st
+import pandas as pd
+from datetime import date, timedelta
+from utils import *
+from replica import replica
+
+st.set_page_config(page_title="Eating Habits", layout="centered")
+st.title("📈 Eating Habits")
+
+with track_page("Eating Habits"):
+    supabase, controller = authenticate()
+    show_login(controller)
+
+    if "user" not in st.session_state:
+        st.warning("Please log in to see your eating habits.")
+        st.stop()
+
+    TOP_COUNT = 10
+
+    household = household_ids(supabase)
+    local = replica(shared_client())
+    try:
+        local.ensure_pulled(household, supabase)
+    except Exception as e:
+        st.error(f"Error fetching meal plans: {e}")
+        st.stop()
+    show_sync_status(local)
+
+    col1, col2 = st.columns(2)
+    weeks_back = col1.slider("Weeks", min_value=4, max_value=52, value=12, step=4)
+    whose = col2.radio("Whose meals", ["Mine", "Household"], horizontal=True, disabled=len(household) == 1)
+    users = [st.session_state.user.id] if whose == "Mine" else list(household)
+
+    first_week = (date.today() - timedelta(days=date.today().weekday(), weeks=weeks_back - 1)).strftime("%Y-%m-%d")
+    # Read from the rollups, which are updated with every change of a plan or recipe
+    rollups = local.habits(users, first_week)
+    weeks = pd.DataFrame(rollups["weeks"], columns=["user", "week", "meals", "rated", "rating_sum"])
+    counts = pd.DataFrame(rollups["counts"], columns=["user", "week", "dimension", "value", "meals"])
+    planned = pd.DataFrame(rollups["recipes"], columns=["user", "recipe", "meals"])
+
+    if weeks.empty:
+        st.info("No meals planned in this time. Plan some meals to see your habits here.")
+        st.stop()
+
+    per_week = weeks.groupby("week")[["meals", "rated", "rating_sum"]].sum()
+    per_week["average rating"] = per_week["rating_sum"] / per_week["rated"].where(per_week["rated"] > 0)
+    recipe_totals = planned.groupby("recipe")["meals"].sum()
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Meals planned", int(per_week["meals"].sum()))
+    rated = per_week["rated"].sum()
+    col2.metric("Average rating", f"{per_week['rating_sum'].sum() / rated:.1f} ⭐" if rated else "–")
+    col3.metric(
+        "Repeated meals", f"{1 - len(recipe_totals) / recipe_totals.sum():.0%}",
+        help="Share of all planned meals (all time) that were a recipe planned before",
+    )
+
+    st.markdown("#### Meals and ratings per week")
+    st.line_chart(per_week[["meals", "average rating"]])
+
+    for dimension, title in (("vegetable", "Vegetables"), ("base", "Bases"), ("protein", "Proteins")):
+        totals = counts[counts["dimension"] == dimension].groupby("value")["meals"].sum().sort_values(ascending=False)
+        if totals.empty:
+            continue
+        st.markdown(f"#### {title}")
+        st.bar_chart(totals.rename("meals"), horizontal=True)
+
+    st.markdown("#### Most planned recipes")
+    names = {recipe["id"]: recipe["name"] for recipe in local.recipes(household)}
+    top = recipe_totals.nlargest(TOP_COUNT)
+    st.dataframe(
+        pd.DataFrame({"Recipe": [names.get(recipe_id, "(deleted)") for recipe_id in top.index], "Times planned": top.values}),
+        hide_index=True,
+    )
+
+    show_page_stats()
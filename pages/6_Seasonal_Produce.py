@@ -0,0 +1,74 @@
+import streamlit as st
+import calendar
+import pandas as pd
+from utils import *
+from replica import replica
+from seasonal import current_region, household_scores, produce_table, suggestions, this_month
+
+st.set_page_config(page_title="Seasonal Produce", layout="centered")
+st.title("🌱 Seasonal Produce")
+
+with track_page("Seasonal Produce"):
+    supabase, controller = authenticate()
+    show_login(controller)
+
+    if "user" not in st.session_state:
+        st.warning("Please log in to see seasonal suggestions.")
+        st.stop()
+
+    SUGGESTION_COUNT = 10
+    RECIPE_COUNT = 10
+
+    household = household_ids(supabase)
+    local = replica(shared_client())
+    try:
+        local.ensure_pulled(household, supabase)
+    except Exception as e:
+        st.error(f"Error fetching recipes: {e}")
+        st.stop()
+    show_sync_status(local)
+
+    regions = produce_table().regions
+    col1, col2 = st.columns(2)
+    month = col1.selectbox("Month", range(1, 13), index=this_month() - 1, format_func=lambda m: calendar.month_name[m])
+    region = col2.selectbox("Region", regions, index=regions.index(current_region()) if current_region() in regions else 0, format_func=str.upper)
+
+    found = suggestions(region, month, k=SUGGESTION_COUNT)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("#### 🌱 In season")
+        for name in found["seasonal"]:
+            st.markdown(f"- {name}")
+        if not found["seasonal"]:
+            st.caption("Hardly anything is harvested locally this month.")
+    with col2:
+        st.markdown("#### 💸 Cheaper than usual")
+        for name, price in found["budget"]:
+            st.markdown(f"- {name} ({price - 1:+.0%})")
+        if not found["budget"]:
+            st.caption("Nothing is much cheaper than usual this month.")
+
+    st.markdown(f"#### Your recipes for {calendar.month_name[month]}")
+    recipes = local.recipes(household)
+    scores = household_scores(recipes, (household, local.versions["recipes"]), region, month)
+    if not scores:
+        st.info("None of your recipes use produce from the season calendar yet.")
+    else:
+        names = {recipe["id"]: recipe["name"] for recipe in recipes}
+        best = sorted(scores.items(), key=lambda item: (-item[1][0], item[1][1]))[:RECIPE_COUNT]
+        st.dataframe(
+            pd.DataFrame(
+                [{"Recipe": names[recipe_id], "In season": season, "Price vs. usual": price - 1} for recipe_id, (season, price) in best]
+            ),
+            column_config={
+                "In season": st.column_config.ProgressColumn(format="percent", min_value=0, max_value=1),
+                "Price vs. usual": st.column_config.NumberColumn(format="percent"),
+            },
+            hide_index=True,
+        )
+        st.caption(
+            f"Scored {len(scores)} of {len(recipes)} recipes by the fruit and vegetables in them. "
+            "Prices are typical monthly averages per kg, compared with the item's yearly average."
+        )
+
+    show_page_stats()
@@ -0,0 +1,79 @@
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+from utils import *
+from profiling import TRACE_LOG_SIZE, breakdown, enabled, otel_json, traces
+
+st.set_page_config(page_title="Profiling", layout="wide")
+
+with track_page("Profiling"):
+    supabase, controller = authenticate()
+    show_login(controller)
+
+    # Only for the addresses listed in ADMIN_EMAILS; everybody else sees an empty page
+    if "user" not in st.session_state or st.session_state.user.email not in st.secrets.get("ADMIN_EMAILS", []):
+        st.stop()
+
+    SLOWEST_COUNT = 10
+
+    st.title("⏱️ Profiling")
+
+    if not enabled():
+        st.info("Profiling is off. Set `PROFILING = true` in the secrets to record where the time of each run goes.")
+        st.stop()
+
+    recorded = traces()
+    st.caption(f"{len(recorded)} runs recorded since the server started (the last {TRACE_LOG_SIZE} are kept).")
+    st.download_button(
+        "⬇️ Download traces (OpenTelemetry JSON)",
+        otel_json(recorded),
+        file_name=f"traces-{datetime.now():%Y%m%d-%H%M%S}.json",
+        mime="application/json",
+    )
+
+    for page, stats in sorted(breakdown().items()):
+        st.markdown(f"#### {page} · {stats['runs']} runs")
+        steps = pd.DataFrame([
+            {
+                "Step": name,
+                "Share of runs": step["runs"] / stats["runs"],
+                "Calls per run": step["calls"] / step["runs"] if name not in ("self", "total") else None,
+                "p50 (ms)": 1000 * step["p50"],
+                "p95 (ms)": 1000 * step["p95"],
+                "KB per run": step["bytes"] / step["runs"] / 1024 if step["bytes"] else None,
+            }
+            for name, step in stats["steps"].items()
+        ]).sort_values("p95 (ms)", ascending=False)
+        st.dataframe(
+            steps,
+            column_config={
+                "Share of runs": st.column_config.ProgressColumn(format="percent", min_value=0, max_value=1),
+                "Calls per run": st.column_config.NumberColumn(format="%.1f"),
+                "p50 (ms)": st.column_config.NumberColumn(format="%.0f"),
+                "p95 (ms)": st.column_config.NumberColumn(format="%.0f"),
+                "KB per run": st.column_config.NumberColumn(format="%.1f"),
+            },
+            hide_index=True,
+        )
+    st.caption("“self” is the time of a run outside the timed steps: script code and widget rendering.")
+
+    st.markdown("#### Slowest runs")
+    finished = [trace for trace in recorded if trace["spans"] and trace["spans"][0]["end"] is not None]
+    for trace in sorted(finished, key=lambda trace: trace["spans"][0]["start"] - trace["spans"][0]["end"])[:SLOWEST_COUNT]:
+        root = trace["spans"][0]
+        with st.expander(f"{trace['page']} · {trace['name']} · {(root['end'] - root['start']) / 1e6:.0f} ms · {datetime.fromtimestamp(root['start'] / 1e9):%H:%M:%S}"):
+            st.dataframe(
+                pd.DataFrame([
+                    {
+                        "Step": item["name"],
+                        "Starts at (ms)": (item["start"] - root["start"]) / 1e6,
+                        "Duration (ms)": (item["end"] - item["start"]) / 1e6,
+                        "Bytes": item["attributes"].get("bytes"),
+                        "Error": item["error"],
+                    }
+                    for item in trace["spans"][1:] if item["end"] is not None
+                ]),
+                hide_index=True,
+            )
+
+    show_page_stats()
@@ -0,0 +1,125 @@
+import heapq
+from collections import defaultdict, namedtuple
+from operator import itemgetter
+
+from categories import BASES, PROTEINS
+from ingredients import category, ingredient_name, normalize_name
+
+DAYS_PER_WEEK = 5
+BEAM_WIDTH = 8  # partial plans kept after each day
+CANDIDATE_LIMIT = 500  # best-scored recipes considered per solve
+NEUTRAL_RATING = 3  # assumed for recipes nobody rated yet
+DISLIKE_RATING = 2  # recipes rated this low on average are never planned
+SHARED_INGREDIENT_WEIGHT = 0.5  # per ingredient a recipe shares with the rest of the week
+RECENT_PENALTY = 2.0  # for recipes planned in the last weeks or earlier in the same run
+
+Features = namedtuple("Features", "id base protein mask")
+
+_BASES = {normalize_name(base) for base in BASES[1:]}
+_PROTEINS = {normalize_name(protein) for protein in PROTEINS[1:]}
+
+
+def base_and_protein(names):
+    # The first base and protein among normalized ingredient names
+    return (
+        next((name for name in names if name in _BASES), None),
+        next((name for name in names if name in _PROTEINS), None),
+    )
+
+
+class PlannerIndex:
+    # Feature vectors of a recipe library: base, protein and the ingredients to buy
+    # as a bitmask, so shared ingredients are counted with one AND per pair.
+
+    def __init__(self, recipes):
+        self.vocabulary = {}
+        self.features = {}
+        for recipe in recipes:
+            names = [ingredient_name(text) for text in recipe.get("ingredients") or []]
+            mask = 0
+            for name in names:
+                # Pantry items are not on the shopping list, so sharing them saves nothing
+                if name and category(name) != "at home":
+                    mask |= 1 << self.vocabulary.setdefault(name, len(self.vocabulary))
+            self.features[recipe["id"]] = Features(recipe["id"], *base_and_protein(names), mask)
+
+
+def average_ratings(rows) -> dict:
+    totals = defaultdict(list)
+    for row in rows:
+        if row.get("rating") is not None:
+            totals[row["recipe"]].append(row["rating"])
+    return {recipe_id: sum(ratings) / len(ratings) for recipe_id, ratings in totals.items()}
+
+
+def disliked_recipes(rows) -> set:
+    # Recipes one member of the household rates DISLIKE_RATING or lower on average,
+    # however much the others like them. A plan's rating counts for its user.
+    totals = defaultdict(list)
+    for row in rows:
+        if row.get("rating") is not None:
+            totals[row["user"], row["recipe"]].append(row["rating"])
+    return {recipe_id for (_, recipe_id), ratings in totals.items() if sum(ratings) / len(ratings) <= DISLIKE_RATING}
+
+
+def _clashes(features, neighbour) -> bool:
+    # No repeated base or protein on consecutive days
+    return neighbour is not None and (
+        (features.base is not None and features.base == neighbour.base)
+        or (features.protein is not None and features.protein == neighbour.protein)
+    )
+
+
+def plan_week(index: PlannerIndex, ratings: dict, fixed: dict, avoid=frozenset(), disliked=frozenset()) -> dict:
+    # Fills the days missing from `fixed` ({day: recipe id}) with a beam search over
+    # the days of the week and returns {day: recipe id} for the filled days only.
+    # Days without any recipe that fits the constraints stay empty.
+    scores = {}
+    for recipe_id in index.features:
+        rating = ratings.get(recipe_id, NEUTRAL_RATING)
+        if rating > DISLIKE_RATING and recipe_id not in disliked:
+            scores[recipe_id] = rating - (RECENT_PENALTY if recipe_id in avoid else 0)
+    candidates = [index.features[recipe_id] for recipe_id in heapq.nlargest(CANDIDATE_LIMIT, scores, key=scores.get)]
+
+    fixed_features = {day: index.features.get(recipe_id) for day, recipe_id in fixed.items()}
+    start_mask = 0
+    for features in fixed_features.values():
+        start_mask |= features.mask if features else 0
+
+    beam = [(0.0, {}, start_mask)]  # (score, {day: features}, ingredients of the plan so far)
+    for day in range(DAYS_PER_WEEK):
+        if day in fixed:
+            beam = [(score, {**plan, day: fixed_features[day]}, mask) for score, plan, mask in beam]
+            continue
+        following = fixed_features.get(day + 1)
+        expansions = []
+        for n, (score, plan, mask) in enumerate(beam):
+            previous = plan.get(day - 1)
+            used = {features.id for features in plan.values() if features} | set(fixed.values())
+            for features in candidates:
+                if features.id in used or _clashes(features, previous) or _clashes(features, following):
+                    continue
+                gain = scores[features.id] + SHARED_INGREDIENT_WEIGHT * (features.mask & mask).bit_count()
+                expansions.append((score + gain, n, features))
+        if not expansions:
+            beam = [(score, {**plan, day: None}, mask) for score, plan, mask in beam]
+            continue
+        beam = [
+            (score, {**beam[n][1], day: features}, beam[n][2] | features.mask)
+            for score, n, features in heapq.nlargest(BEAM_WIDTH, expansions, key=itemgetter(0))
+        ]
+
+    best = max(beam, key=itemgetter(0))[1]
+    return {day: features.id for day, features in best.items() if features is not None and day not in fixed}
+
+
+def plan_weeks(index: PlannerIndex, ratings: dict, weeks: list, recent=frozenset(), disliked=frozenset()) -> list:
+    # `weeks` holds the fixed days of each week in order; recipes planned for one
+    # week are avoided in the following ones
+    avoid = set(recent)
+    planned = []
+    for fixed in weeks:
+        week_plan = plan_week(index, ratings, fixed, frozenset(avoid), disliked)
+        avoid.update(week_plan.values(), fixed.values())
+        planned.append(week_plan)
+    return planned
@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+import streamlit as st
+
+TRACE_LOG_SIZE = 1000  # finished traces kept per process
+SERVICE_NAME = "meal-planning-assistant"
+
+# Opt-in with PROFILING = true in the secrets. A trace is one script run of a page
+# (or one piece of background work); spans are the timed steps inside it. The trace
+# and the open span of a thread live here, like the run in utils._request_context.
+_context = threading.local()
+
+
+def enabled() -> bool:
+    return bool(st.secrets.get("PROFILING"))
+
+
+@st.cache_resource
+def _traces():
+    return {"lock": threading.Lock(), "traces": deque(maxlen=TRACE_LOG_SIZE)}
+
+
+def traces() -> list:
+    log = _traces()
+    with log["lock"]:
+        return list(log["traces"])
+
+
+def _open(trace, name, parent, attributes) -> dict:
+    item = {
+        "span_id": os.urandom(8).hex(),
+        "parent_id": parent["span_id"] if parent else None,
+        "name": name,
+        "start": time.time_ns(),
+        "end": None,
+        "attributes": dict(attributes),
+        "error": None,
+    }
+    with trace["lock"]:
+        trace["spans"].append(item)
+    return item
+
+
+def _new_trace(name, page):
+    return {"trace_id": os.urandom(16).hex(), "name": name, "page": page, "lock": threading.Lock(), "spans": []}
+
+
+def _finish(trace):
+    log = _traces()
+    with log["lock"]:
+        log["traces"].append(trace)
+
+
+def current():
+    # The trace and span of this thread, to hand over to worker threads with attach()
+    return getattr(_context, "trace", None), getattr(_context, "span", None)
+
+
+def attach(state):
+    _context.trace, _context.span = state
+
+
+def start_trace(page: str):
+    # Starts the trace of a page run; the root span lasts until end_trace(), which
+    # utils.track_page() calls however the run ends
+    if not enabled():
+        attach((None, None))
+        return
+    trace = _new_trace(page, page)
+    attach((trace, _open(trace, page, None, {"page": page})))
+
+
+def end_trace(error=None):
+    trace, _ = current()
+    if trace is None:
+        return
+    trace["spans"][0]["end"] = time.time_ns()
+    trace["spans"][0]["error"] = error
+    attach((None, None))
+    _finish(trace)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    # Times the block as a child of the current span. Outside a page run the block
+    # gets a trace of its own. Yields the span's attributes, so sizes known only at
+    # the end can still be added.
+    trace, parent = current()
+    own_trace = trace is None
+    if own_trace:
+        if not enabled():
+            yield attributes
+            return
+        trace = _new_trace(name, "background")
+    item = _open(trace, name, parent, attributes)
+    attach((trace, item))
+    try:
+        yield item["attributes"]
+    except Exception as e:
+        item["error"] = repr(e)
+        raise
+    finally:
+        item["end"] = time.time_ns()
+        attach((None, None) if own_trace else (trace, parent))
+        if own_trace:
+            _finish(trace)
+
+
+def traced(name: str):
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record(name: str, start: int, end: int, error=None, **attributes):
+    # Adds a span that was timed elsewhere (HTTP hooks, generators) to the current run
+    trace, parent = current()
+    if trace is None:
+        return
+    item = _open(trace, name, parent, attributes)
+    item["start"], item["end"], item["error"] = start, end, error
+
+
+def _percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def breakdown() -> dict:
+    # {page: {"runs", "steps": {span name: {"runs", "calls", "bytes", "p50", "p95"}}}} in
+    # seconds per run. "self" is the time of the run not spent in any timed step,
+    # mostly script code and widget rendering.
+    per_page = defaultdict(lambda: defaultdict(lambda: {"seconds": [], "calls": 0, "bytes": 0}))
+    runs = defaultdict(int)
+    for trace in traces():
+        spans = [item for item in trace["spans"] if item["end"] is not None]
+        if not spans:
+            continue
+        root = trace["spans"][0]
+        runs[trace["page"]] += 1
+        steps = per_page[trace["page"]]
+        totals = defaultdict(int)
+        for item in spans:
+            if item is root:
+                continue
+            totals[item["name"]] += item["end"] - item["start"]
+            steps[item["name"]]["calls"] += 1
+            steps[item["name"]]["bytes"] += item["attributes"].get("bytes") or 0
+        children = sum(item["end"] - item["start"] for item in spans if item["parent_id"] == root["span_id"])
+        totals["self"] = max(0, root["end"] - root["start"] - children)
+        totals["total"] = root["end"] - root["start"]
+        for name, nanoseconds in totals.items():
+            steps[name]["seconds"].append(nanoseconds / 1e9)
+    return {
+        page: {
+            "runs": runs[page],
+            "steps": {
+                name: {
+                    "runs": len(step["seconds"]),
+                    "calls": step["calls"],
+                    "bytes": step["bytes"],
+                    "p50": _percentile(step["seconds"], 0.5),
+                    "p95": _percentile(step["seconds"], 0.95),
+                }
+                for name, step in steps.items()
+            },
+        }
+        for page, steps in per_page.items()
+    }
+
+
+def _attribute(key, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def otel_json(selected=None) -> str:
+    # The traces in the OTLP/JSON format of the OpenTelemetry collector
+    spans = []
+    for trace in traces() if selected is None else selected:
+        for item in trace["spans"]:
+            if item["end"] is None:
+                continue
+            spans.append({
+                "traceId": trace["trace_id"],
+                "spanId": item["span_id"],
+                **({"parentSpanId": item["parent_id"]} if item["parent_id"] else {}),
+                "name": item["name"],
+                "kind": 3 if item["name"].startswith(("supabase", "llm", "scrape")) else 1,  # client / internal
+                "startTimeUnixNano": str(item["start"]),
+                "endTimeUnixNano": str(item["end"]),
+                "attributes": [_attribute("page", trace["page"])]
+                + [_attribute(key, value) for key, value in item["attributes"].items() if value is not None],
+                "status": {"code": 2, "message": item["error"]} if item["error"] else {"code": 1},
+            })
+    return json.dumps({
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "profiling"}, "spans": spans}],
+        }]
+    })
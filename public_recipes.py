@@ -0,0 +1,186 @@
+import bisect
+import sys
+import threading
+import time
+import zlib
+
+import streamlit as st
+
+from profiling import span
+
+FETCH_BATCH_SIZE = 1000
+REFRESH_INTERVAL = 60  # seconds between looks for public recipes changed since the last one
+ID_CHECK_INTERVAL = 600  # seconds between looks for deleted public recipes
+COMPRESS_FROM = 200  # characters of instructions from which they are kept compressed
+COLUMNS = "id, name, ingredients, instructions, author, public, updated_at"
+
+
+def _intern(text):
+    return sys.intern(text) if text else text
+
+
+class _Recipe:
+    # One public recipe. Names, authors and ingredient lines repeat a lot across
+    # recipes, so they are interned; long instructions are only read when a recipe
+    # is opened, so they stay compressed until then.
+    __slots__ = ("name", "ingredients", "instructions", "author")
+
+    def __init__(self, row):
+        instructions = row.get("instructions")
+        self.name = _intern(row["name"])
+        self.ingredients = tuple(_intern(text) for text in row.get("ingredients") or [])
+        self.instructions = zlib.compress(instructions.encode()) if instructions and len(instructions) >= COMPRESS_FROM else instructions
+        self.author = _intern(row.get("author"))
+
+    def row(self, recipe_id) -> dict:
+        instructions = self.instructions
+        if isinstance(instructions, bytes):
+            instructions = zlib.decompress(instructions).decode()
+        return {
+            "id": recipe_id,
+            "name": self.name,
+            "ingredients": list(self.ingredients),
+            "instructions": instructions,
+            "author": self.author,
+            "public": True,
+        }
+
+
+class PublicRecipes:
+    # One read-only copy of the public recipes for all sessions, which page through
+    # it and keep only ids. Kept current by the write paths of this process and by
+    # asking Supabase for rows changed since the newest (updated_at, id) fetched,
+    # like the replica's pull.
+
+    def __init__(self, supabase):
+        self._supabase = supabase
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._recipes = {}  # id -> _Recipe
+        self._ids = []  # sorted, for keyset pages
+        self._cursor = None  # (updated_at, id) of the newest row fetched, where refresh() goes on
+        self._refreshed = self._ids_checked = time.time()
+        with span("public recipes load"):
+            self._load()
+
+    def __len__(self):
+        return len(self._recipes)
+
+    def _load(self):
+        last_id = None
+        while True:
+            query = self._supabase.table("recipes").select(COLUMNS).eq("public", True)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            rows = query.order("id").limit(FETCH_BATCH_SIZE).execute().data
+            self.apply(rows)
+            self._advance(rows)
+            if len(rows) < FETCH_BATCH_SIZE:
+                return
+            last_id = rows[-1]["id"]
+
+    # --- changes ---
+
+    def apply(self, rows):
+        # Rows of any recipes: public ones are added or replaced, the others dropped
+        with self._lock:
+            for row in rows:
+                if not row.get("public"):
+                    self._drop(row["id"])
+                    continue
+                if row["id"] not in self._recipes:
+                    bisect.insort(self._ids, row["id"])
+                self._recipes[row["id"]] = _Recipe(row)
+
+    def remove(self, ids):
+        with self._lock:
+            for recipe_id in ids:
+                self._drop(recipe_id)
+
+    def _drop(self, recipe_id):
+        if self._recipes.pop(recipe_id, None) is not None:
+            del self._ids[bisect.bisect_left(self._ids, recipe_id)]
+
+    def _advance(self, rows):
+        # Only rows fetched from Supabase move the cursor; rows handed to apply() by
+        # this process's writes may be newer than changes not fetched yet
+        for row in rows:
+            if row.get("updated_at") and (self._cursor is None or (row["updated_at"], row["id"]) > self._cursor):
+                self._cursor = (row["updated_at"], row["id"])
+
+    def _changed_since(self, cursor) -> list:
+        # One page of rows after the cursor in (updated_at, id) order: the rest of the
+        # rows tied on its updated_at first, then the newer ones
+        def query():
+            return self._supabase.table("recipes").select(COLUMNS)
+
+        if cursor is None:
+            return query().order("updated_at").order("id").limit(FETCH_BATCH_SIZE).execute().data
+        updated_at, last_id = cursor
+        rows = query().eq("updated_at", updated_at).gt("id", last_id).order("id").limit(FETCH_BATCH_SIZE).execute().data
+        if len(rows) < FETCH_BATCH_SIZE:
+            rows += query().gt("updated_at", updated_at).order("updated_at").order("id").limit(
+                FETCH_BATCH_SIZE - len(rows)
+            ).execute().data
+        return rows
+
+    def refresh(self):
+        # Changed rows are fetched whether or not they are still public, so recipes
+        # made private drop out. Deletions only show up when the ids are compared.
+        while True:
+            cursor = self._cursor
+            rows = self._changed_since(cursor)
+            self.apply(rows)
+            self._advance(rows)
+            if len(rows) < FETCH_BATCH_SIZE or self._cursor == cursor:
+                break
+        self._refreshed = time.time()
+        if self._ids_checked < time.time() - ID_CHECK_INTERVAL:
+            server_ids = set()
+            last_id = None
+            while True:
+                query = self._supabase.table("recipes").select("id").eq("public", True)
+                if last_id is not None:
+                    query = query.gt("id", last_id)
+                rows = query.order("id").limit(FETCH_BATCH_SIZE).execute().data
+                server_ids.update(row["id"] for row in rows)
+                if len(rows) < FETCH_BATCH_SIZE:
+                    break
+                last_id = rows[-1]["id"]
+            self.remove(set(self._recipes) - server_ids)
+            self._ids_checked = time.time()
+
+    def refresh_if_stale(self):
+        # Called on reads; one session refreshes while the others keep reading
+        if self._refreshed < time.time() - REFRESH_INTERVAL and self._refreshing.acquire(blocking=False):
+            try:
+                with span("public recipes refresh"):
+                    self.refresh()
+            finally:
+                self._refreshing.release()
+
+    # --- reads ---
+
+    def page(self, after=None, limit=20, exclude_author=None) -> list:
+        # Keyset page of {"id", "name"} in id order
+        with self._lock:
+            start = 0 if after is None else bisect.bisect_right(self._ids, after)
+            rows = []
+            for position in range(start, len(self._ids)):
+                recipe_id = self._ids[position]
+                recipe = self._recipes[recipe_id]
+                if recipe.author == exclude_author:
+                    continue
+                rows.append({"id": recipe_id, "name": recipe.name})
+                if len(rows) == limit:
+                    break
+            return rows
+
+    def get(self, recipe_id):
+        recipe = self._recipes.get(recipe_id)
+        return recipe.row(recipe_id) if recipe is not None else None
+
+
+@st.cache_resource(show_spinner="Loading public recipes...")
+def public_recipes(_supabase):
+    return PublicRecipes(_supabase)
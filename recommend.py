@@ -0,0 +1,214 @@
+import itertools
+import math
+import threading
+from collections import defaultdict
+
+import numpy as np
+import streamlit as st
+
+from ingredients import category, ingredient_name
+
+NEUTRAL_RATING = 3  # ratings above pull recommendations towards a recipe, below push them away
+INDEX_BATCH_SIZE = 1000
+INDEX_TTL = 3600  # seconds before the process-wide index is rebuilt from the database
+NORM_REFRESH = 0.2  # recompute all vector norms once the library grew or shrank by this share
+
+
+class SimilarityIndex:
+    # TF-IDF vectors of the ingredient lists, stored as an inverted index with one
+    # numpy array of rows per ingredient, so a query only touches the recipes that
+    # share an ingredient with it. Recipes are added/removed one at a time by the
+    # write paths, like the search index.
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rows = {}  # recipe id -> row
+        self._ids = []  # row -> recipe id, None once removed
+        self._names = []
+        self._terms = []  # row -> term ids
+        self._vocabulary = {}  # ingredient name -> term id
+        self._term_names = []  # term id -> ingredient name
+        self._postings = []  # term id -> set of rows
+        self._posting_arrays = {}  # term id -> np.array of rows, rebuilt when the term changes
+        self._authors = {}  # author -> code
+        self._author = np.zeros(0, dtype=np.int32)
+        self._public = np.zeros(0, dtype=bool)
+        self._sizes = np.zeros(0, dtype=np.int32)  # row -> number of terms
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._normed_size = 0  # library size the norms were computed for
+
+    def __len__(self):
+        return len(self._rows)
+
+    def knows(self, name: str) -> bool:
+        term = self._vocabulary.get(name)
+        return term is not None and bool(self._postings[term])
+
+    def _idf(self, term: int) -> float:
+        return math.log((1 + len(self._rows)) / (1 + len(self._postings[term]))) + 1
+
+    def _term(self, name: str) -> int:
+        term = self._vocabulary.get(name)
+        if term is None:
+            term = self._vocabulary[name] = len(self._term_names)
+            self._term_names.append(name)
+            self._postings.append(set())
+        return term
+
+    def _grow(self):
+        capacity = max(1024, 2 * len(self._public))
+        for name, fill in (("_author", 0), ("_public", False), ("_sizes", 0), ("_norms", np.inf)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, recipe: dict):
+        with self._lock:
+            self.remove(recipe["id"])
+            names = {ingredient_name(text) for text in recipe.get("ingredients") or []}
+            # Pantry items are in almost every recipe and say little about it
+            terms = sorted(self._term(name) for name in names if name and category(name) != "at home")
+
+            row = len(self._ids)
+            if row >= len(self._public):
+                self._grow()
+            self._rows[recipe["id"]] = row
+            self._ids.append(recipe["id"])
+            self._names.append(recipe["name"])
+            self._terms.append(terms)
+            self._author[row] = self._authors.setdefault(recipe.get("author"), len(self._authors))
+            self._public[row] = bool(recipe.get("public"))
+            self._sizes[row] = len(terms)
+            for term in terms:
+                self._postings[term].add(row)
+                self._posting_arrays.pop(term, None)
+            self._norms[row] = math.sqrt(sum(self._idf(term) ** 2 for term in terms)) or np.inf
+            self._refresh_norms()
+
+    def remove(self, recipe_id):
+        with self._lock:
+            row = self._rows.pop(recipe_id, None)
+            if row is None:
+                return
+            self._ids[row] = None
+            for term in self._terms[row]:
+                self._postings[term].discard(row)
+                self._posting_arrays.pop(term, None)
+            self._terms[row] = []
+            self._sizes[row] = 0
+            self._norms[row] = np.inf
+            self._refresh_norms()
+
+    def _refresh_norms(self):
+        # The IDF of every term moves a little with each change; norms are only
+        # recomputed once that adds up
+        if abs(len(self._rows) - self._normed_size) <= NORM_REFRESH * self._normed_size:
+            return
+        idf = np.array([self._idf(term) for term in range(len(self._postings))], dtype=np.float32)
+        lengths = np.fromiter(map(len, self._terms), dtype=np.int64, count=len(self._terms))
+        terms = np.fromiter(itertools.chain.from_iterable(self._terms), dtype=np.int64, count=int(lengths.sum()))
+        squares = np.bincount(np.repeat(np.arange(len(lengths)), lengths), weights=idf[terms] ** 2, minlength=len(lengths))
+        self._norms[:len(lengths)] = np.where(squares > 0, np.sqrt(squares), np.inf)
+        self._normed_size = len(self._rows)
+
+    def _posting(self, term: int):
+        rows = self._posting_arrays.get(term)
+        if rows is None:
+            rows = self._posting_arrays[term] = np.fromiter(self._postings[term], dtype=np.int64)
+        return rows
+
+    def _scores(self, weights: dict):
+        # Cosine similarity of every row with a query vector given as {term id: weight}
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        for term, weight in weights.items():
+            scores[self._posting(term)] += weight * self._idf(term)
+        return scores / self._norms[:len(self._ids)]
+
+    def _codes(self, user_ids):
+        return [self._authors[user_id] for user_id in user_ids if user_id in self._authors]
+
+    def _top(self, scores, k, user_ids, exclude=()):
+        rows = len(self._ids)
+        visible = self._public[:rows] | np.isin(self._author[:rows], self._codes(user_ids))
+        scores = np.where(visible & (scores > 0), scores, 0)
+        for recipe_id in exclude:
+            if recipe_id in self._rows:
+                scores[self._rows[recipe_id]] = 0
+        top = np.argpartition(-scores, k)[:k] if rows > k else np.arange(rows)
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[row], self._names[row], float(scores[row])) for row in top if scores[row] > 0]
+
+    def similar(self, recipe_id, k=5, user_ids=()) -> list:
+        # (id, name, score) of the k recipes closest to the given one that the user may see
+        with self._lock:
+            row = self._rows.get(recipe_id)
+            if row is None or not self._terms[row]:
+                return []
+            weights = {term: self._idf(term) / self._norms[row] for term in self._terms[row]}
+            return self._top(self._scores(weights), k, user_ids, exclude=[recipe_id])
+
+    def recommend(self, ratings: dict, k=5, user_ids=(), exclude=(), only_from=None) -> list:
+        # Blends the vectors of rated recipes ({recipe id: rating}) into one taste
+        # profile and returns the closest recipes that are not excluded. With
+        # `only_from`, suggestions are limited to recipes by these authors.
+        with self._lock:
+            weights = defaultdict(float)
+            for recipe_id, rating in ratings.items():
+                row = self._rows.get(recipe_id)
+                if row is None:
+                    continue
+                for term in self._terms[row]:
+                    weights[term] += (rating - NEUTRAL_RATING) * self._idf(term) / self._norms[row]
+            if not any(weight > 0 for weight in weights.values()):
+                return []
+            scores = self._scores(weights)
+            if only_from is not None:
+                scores = np.where(np.isin(self._author[:len(self._ids)], self._codes(only_from)), scores, 0)
+            return self._top(scores, k, user_ids, exclude=set(exclude) | set(ratings))
+
+    def cover(self, names, k=10, user_ids=(), only_from=None) -> list:
+        # Recipes that use the most of the given ingredients, e.g. leftovers: ranked by
+        # the share of their ingredients on hand, then by how few are missing. Counting
+        # the hits per recipe is one bincount over the posting arrays of the names.
+        # Returns (id, name, number on hand, missing ingredient names).
+        with self._lock:
+            terms = {self._vocabulary[name] for name in names if name in self._vocabulary}
+            if not terms:
+                return []
+            rows = len(self._ids)
+            have = np.bincount(np.concatenate([self._posting(term) for term in terms]), minlength=rows)
+            candidates = np.flatnonzero(have)
+            visible = self._public[candidates] | np.isin(self._author[candidates], self._codes(user_ids))
+            if only_from is not None:
+                visible &= np.isin(self._author[candidates], self._codes(only_from))
+            candidates = candidates[visible]
+            hits = have[candidates]
+            sizes = self._sizes[candidates]
+            # lexsort orders by the last key first
+            order = np.lexsort((-hits, sizes - hits, -hits / sizes))[:k]
+            return [
+                (
+                    self._ids[row],
+                    self._names[row],
+                    int(have[row]),
+                    [self._term_names[term] for term in self._terms[row] if term not in terms],
+                )
+                for row in candidates[order]
+            ]
+
+
+@st.cache_resource(ttl=INDEX_TTL, show_spinner="Building recipe similarity index...")
+def similarity_index(_supabase):
+    index = SimilarityIndex()
+    last_id = None
+    while True:
+        query = _supabase.table("recipes").select("id, name, ingredients, author, public")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(INDEX_BATCH_SIZE).execute().data
+        for row in rows:
+            index.add(row)
+        if len(rows) < INDEX_BATCH_SIZE:
+            return index
+        last_id = rows[-1]["id"]
@@ -0,0 +1,464 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import streamlit as st
+
+import habits
+from cache import CACHE_DIR
+from profiling import span
+
+SYNC_INTERVAL = 30  # seconds between background syncs of the active households
+ACTIVE_FOR = 15 * 60  # seconds a household keeps being synced after it was last read
+SYNC_BATCH_SIZE = 500
+PULL_BATCH_SIZE = 1000  # rows per read; PostgREST returns at most db-max-rows (1000 by default)
+
+# Replicated tables: the column that says whose row it is, the columns kept
+# locally, the ones stored as JSON and the unique key new rows are upserted on
+TABLES = {
+    "recipes": {
+        "owner": "author",
+        "columns": ["id", "name", "ingredients", "instructions", "author", "public", "updated_at"],
+        "json": {"ingredients"},
+    },
+    "meal_plans": {
+        "owner": "user",
+        "columns": ["id", "week", "day", "recipe", "user", "rating", "comment", "updated_at"],
+        "json": set(),
+        # One plan per household, week and day (sql/003_household_meal_plans.sql): a
+        # day the partner planned on another device meanwhile gets the newer recipe
+        "on_conflict": "household,week,day",
+    },
+}
+SYNC_ORDER = ["recipes", "meal_plans"]  # new recipes get their ids before plans point to them
+
+
+def _timestamp(value) -> float:
+    # Supabase returns timestamptz as ISO strings; rows without one count as oldest
+    if not value:
+        return 0.0
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class Replica:
+    # Local SQLite copy of the households' recipes and meal plans. Pages read from
+    # it and write to it; writes are queued in an outbox that a background thread
+    # pushes to Supabase in batches. Conflicts are resolved per field: a queued
+    # change wins if it is newer than the row's updated_at on the server.
+    # A household is pulled, and its owners' changes pushed, with the client of the
+    # session that last used it, so row level security sees that user's token.
+
+    def __init__(self, supabase, name="replica"):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self._supabase = supabase
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._active = {}  # household -> last read
+        self._clients = {}  # owner -> client of the session that last used their household
+        self.versions = dict.fromkeys(TABLES, 0)  # bumped on every change, for caches built from the rows
+        self.status = {"last_sync": None, "error": None}
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            for table, spec in TABLES.items():
+                columns = ", ".join(f'"{column}"' for column in spec["columns"] if column != "id")
+                db.execute(f'CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, {columns})')
+                db.execute(f'CREATE INDEX IF NOT EXISTS {table}_owner ON {table} ("{spec["owner"]}")')
+            # One entry per row; later edits of a queued row are merged into it
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " table_name TEXT NOT NULL, row_id INTEGER NOT NULL, kind TEXT NOT NULL, fields TEXT NOT NULL,"
+                " owner TEXT, PRIMARY KEY (table_name, row_id))"
+            )
+            if "owner" not in {column["name"] for column in db.execute("PRAGMA table_info(outbox)")}:
+                # Entries queued before are pushed with the shared client
+                db.execute("ALTER TABLE outbox ADD COLUMN owner TEXT")
+            # (pulled_until, pulled_id) is the last row pulled in (updated_at, id) order
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS pulls ("
+                " table_name TEXT NOT NULL, owner TEXT NOT NULL, pulled_until TEXT, pulled_id INTEGER,"
+                " PRIMARY KEY (table_name, owner))"
+            )
+            if "pulled_id" not in {column["name"] for column in db.execute("PRAGMA table_info(pulls)")}:
+                # Replicas from before the id cursor pull the rows tied on their watermark again
+                db.execute("ALTER TABLE pulls ADD COLUMN pulled_id INTEGER")
+            habits.create(db)
+        threading.Thread(target=self._run, name="replica-sync", daemon=True).start()
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _decode(self, table, row) -> dict:
+        row = dict(row)
+        for column in TABLES[table]["json"]:
+            row[column] = json.loads(row[column]) if row[column] is not None else None
+        if table == "recipes":
+            row["public"] = bool(row["public"])
+        return row
+
+    def _write_row(self, db, table, row):
+        spec = TABLES[table]
+        values = [
+            json.dumps(row.get(column), ensure_ascii=False) if column in spec["json"] else row.get(column)
+            for column in spec["columns"]
+        ]
+        columns = ", ".join(f'"{column}"' for column in spec["columns"])
+        old = self._get(db, table, row["id"])
+        self.versions[table] += 1
+        db.execute(
+            f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({', '.join('?' * len(values))})", values
+        )
+        habits.on_write(db, table, old, {column: row.get(column) for column in spec["columns"]})
+
+    def _delete_row(self, db, table, row_id):
+        old = self._get(db, table, row_id)
+        if old is None:
+            return
+        self.versions[table] += 1
+        db.execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
+        habits.on_write(db, table, old, None)
+
+    def _get(self, db, table, row_id):
+        row = db.execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,)).fetchone()
+        return self._decode(table, row) if row else None
+
+    def _outbox(self, db, table, row_id):
+        entry = db.execute(
+            "SELECT kind, fields FROM outbox WHERE table_name = ? AND row_id = ?", (table, row_id)
+        ).fetchone()
+        return (entry["kind"], json.loads(entry["fields"])) if entry else (None, {})
+
+    def _queue(self, db, table, row_id, kind, fields, owner=None):
+        # The owner decides whose client pushes the entry; it comes from the local row
+        # or the queued fields unless the row is already gone
+        if owner is None:
+            column = TABLES[table]["owner"]
+            row = self._get(db, table, row_id)
+            owner = row[column] if row else fields.get(column, [None])[0]
+        db.execute(
+            "INSERT OR REPLACE INTO outbox (table_name, row_id, kind, fields, owner) VALUES (?, ?, ?, ?, ?)",
+            (table, row_id, kind, json.dumps(fields, ensure_ascii=False), owner),
+        )
+
+    # --- reads ---
+
+    def rows(self, table, owners, where="", params=(), limit=-1) -> list:
+        owner = TABLES[table]["owner"]
+        marks = ", ".join("?" * len(owners))
+        with self._connect() as db:
+            rows = db.execute(
+                f'SELECT * FROM {table} WHERE "{owner}" IN ({marks}) {where} ORDER BY id LIMIT ?',
+                (*owners, *params, limit),
+            ).fetchall()
+        return [self._decode(table, row) for row in rows]
+
+    def recipes(self, authors, after=None, limit=-1) -> list:
+        if after is None:
+            return self.rows("recipes", authors, limit=limit)
+        return self.rows("recipes", authors, "AND id > ?", (after,), limit=limit)
+
+    def meal_plans(self, users, first_week=None, last_week=None) -> list:
+        if first_week is None:
+            return self.rows("meal_plans", users)
+        return self.rows("meal_plans", users, "AND week >= ? AND week <= ?", (first_week, last_week))
+
+    def get(self, table, row_id):
+        with self._connect() as db:
+            return self._get(db, table, row_id)
+
+    def habits(self, users, first_week) -> dict:
+        with self._connect() as db:
+            return habits.read(db, users, first_week)
+
+    def pending(self) -> int:
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    # --- local writes, queued for the server ---
+
+    def save(self, table, rows) -> list:
+        # Rows without an id are new and get a negative id until the server assigns one
+        now = time.time()
+        ids = []
+        with self._lock, self._connect() as db:
+            for row in rows:
+                row = {column: value for column, value in row.items() if column != "updated_at"}
+                if row.get("id") is None:
+                    row["id"] = min(db.execute(f"SELECT MIN(id) FROM {table}").fetchone()[0] or 0, 0) - 1
+                    self._write_row(db, table, row)
+                    self._queue(db, table, row["id"], "insert", {c: [v, now] for c, v in row.items() if c != "id"})
+                    ids.append(row["id"])
+                    continue
+                current = self._get(db, table, row["id"])
+                changed = {column: value for column, value in row.items() if column != "id" and (current or {}).get(column) != value}
+                ids.append(row["id"])
+                if not changed:
+                    continue
+                if current is not None:
+                    self._write_row(db, table, {**current, **changed})
+                # Otherwise the row was removed locally meanwhile, e.g. by a pull. The change
+                # is only queued; the push merges it into the server's row if there still is one.
+                kind, fields = self._outbox(db, table, row["id"])
+                fields.update({column: [value, now] for column, value in changed.items()})
+                self._queue(db, table, row["id"], kind or "update", fields)
+        self._wake.set()
+        return ids
+
+    def delete(self, table, ids):
+        with self._lock, self._connect() as db:
+            for row_id in ids:
+                old = self._get(db, table, row_id)
+                self._delete_row(db, table, row_id)
+                kind, _ = self._outbox(db, table, row_id)
+                if kind == "insert":
+                    # Never reached the server
+                    db.execute("DELETE FROM outbox WHERE table_name = ? AND row_id = ?", (table, row_id))
+                else:
+                    self._queue(db, table, row_id, "delete", {}, owner=old and old[TABLES[table]["owner"]])
+        self._wake.set()
+
+    # --- changes from the server ---
+
+    def apply_remote(self, table, rows) -> dict:
+        # Merges server rows with the queued local changes and returns the local rows
+        # they replaced, by id
+        replaced = {}
+        with self._lock, self._connect() as db:
+            for row in rows:
+                row = {column: row.get(column) for column in TABLES[table]["columns"]}
+                kind, fields = self._outbox(db, table, row["id"])
+                if kind == "delete":
+                    continue
+                replaced[row["id"]] = self._get(db, table, row["id"])
+                server_time = _timestamp(row["updated_at"])
+                newer = {column: change for column, change in fields.items() if change[1] > server_time}
+                for column, (value, _) in newer.items():
+                    row[column] = value
+                if kind is not None and len(newer) < len(fields):
+                    # The server's values are newer for the other fields
+                    if newer:
+                        self._queue(db, table, row["id"], kind, newer)
+                    else:
+                        db.execute("DELETE FROM outbox WHERE table_name = ? AND row_id = ?", (table, row["id"]))
+                self._write_row(db, table, row)
+        return replaced
+
+    def remove_remote(self, table, ids) -> dict:
+        replaced = {}
+        with self._lock, self._connect() as db:
+            for row_id in ids:
+                replaced[row_id] = self._get(db, table, row_id)
+                self._delete_row(db, table, row_id)
+                db.execute("DELETE FROM outbox WHERE table_name = ? AND row_id = ?", (table, row_id))
+        return replaced
+
+    # --- sync ---
+
+    def ensure_pulled(self, owners, supabase=None):
+        # Blocks only the first time a household is read; after that the
+        # background thread keeps it current with the given session's client
+        if supabase is not None:
+            self._clients.update(dict.fromkeys(owners, supabase))
+        self._active[tuple(owners)] = time.time()
+        with self._connect() as db:
+            marks = ", ".join("?" * len(owners))
+            pulled = db.execute(
+                f"SELECT COUNT(*) FROM pulls WHERE owner IN ({marks})", tuple(owners)
+            ).fetchone()[0]
+        if pulled < len(owners) * len(TABLES):
+            self.pull(owners)
+
+    def request_sync(self):
+        self._wake.set()
+
+    def _client(self, owner):
+        return self._clients.get(owner, self._supabase)
+
+    def push(self):
+        with self._connect() as db:
+            entries = db.execute(
+                "SELECT table_name, row_id, kind, fields, owner FROM outbox LIMIT ?", (SYNC_BATCH_SIZE,)
+            ).fetchall()
+        by_client = {}
+        for entry in entries:
+            client = self._client(entry["owner"])
+            by_client.setdefault(id(client), (client, []))[1].append(entry)
+        errors = []
+        for client, client_entries in by_client.values():
+            try:
+                self._push_entries(client, client_entries)
+            except Exception as e:
+                # The other sessions' changes still go out; these stay queued
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def _push_entries(self, client, entries):
+        for table in SYNC_ORDER:
+            queued = [(entry["row_id"], entry["kind"], json.loads(entry["fields"])) for entry in entries if entry["table_name"] == table]
+            inserts = [(row_id, fields) for row_id, kind, fields in queued if kind == "insert"]
+            updates = {row_id: fields for row_id, kind, fields in queued if kind == "update"}
+            deletes = [row_id for row_id, kind, _ in queued if kind == "delete"]
+            if inserts:
+                self._push_inserts(client, table, inserts)
+            if updates:
+                self._push_updates(client, table, updates)
+            if deletes:
+                client.table(table).delete().in_("id", deletes).execute()
+                with self._lock, self._connect() as db:
+                    db.executemany(
+                        "DELETE FROM outbox WHERE table_name = ? AND row_id = ? AND kind = 'delete'",
+                        [(table, row_id) for row_id in deletes],
+                    )
+
+    def _settle(self, db, table, row_id, server_row, pushed):
+        # Stores the server's row after a push. Edits made while the push was on its
+        # way stay queued and keep their values, whatever the server's timestamp says.
+        kind, fields = self._outbox(db, table, row_id)
+        later = {column: change for column, change in fields.items() if pushed.get(column) != change}
+        db.execute("DELETE FROM outbox WHERE table_name = ? AND row_id = ?", (table, row_id))
+        if row_id != server_row["id"]:
+            self._delete_row(db, table, row_id)
+        if kind is None and row_id != server_row["id"]:
+            # Deleted locally while it was being created
+            self._queue(db, table, server_row["id"], "delete", {}, owner=server_row.get(TABLES[table]["owner"]))
+            return
+        row = {column: server_row.get(column) for column in TABLES[table]["columns"]}
+        row.update({column: value for column, (value, _) in later.items()})
+        self._write_row(db, table, row)
+        if later:
+            self._queue(db, table, server_row["id"], "update", later)
+
+    def _push_inserts(self, client, table, inserts):
+        payload = [{column: value for column, (value, _) in fields.items()} for _, fields in inserts]
+        on_conflict = TABLES[table].get("on_conflict")
+        query = client.table(table)
+        created = (query.upsert(payload, on_conflict=on_conflict) if on_conflict else query.insert(payload)).execute().data
+        with self._lock, self._connect() as db:
+            for (temp_id, pushed), row in zip(inserts, created):
+                if table == "recipes":
+                    # Plans may point to the recipe by its temporary id
+                    for plan in db.execute("SELECT id FROM meal_plans WHERE recipe = ?", (temp_id,)).fetchall():
+                        self._write_row(db, "meal_plans", {**self._get(db, "meal_plans", plan["id"]), "recipe": row["id"]})
+                    for plan in db.execute("SELECT row_id, kind, fields FROM outbox WHERE table_name = 'meal_plans'").fetchall():
+                        plan_fields = json.loads(plan["fields"])
+                        if plan_fields.get("recipe", [None])[0] == temp_id:
+                            plan_fields["recipe"][0] = row["id"]
+                            self._queue(db, "meal_plans", plan["row_id"], plan["kind"], plan_fields)
+                self._settle(db, table, temp_id, row, pushed)
+
+    def _push_updates(self, client, table, updates):
+        # One request: the server keeps each field edited there after it changed here
+        # (sql/004_apply_changes.sql) and returns the rows as they are now
+        changes = [{"id": row_id, "fields": fields} for row_id, fields in updates.items()]
+        saved = client.rpc("apply_changes", {"target": table, "changes": changes}).execute().data
+        with self._lock, self._connect() as db:
+            for row in saved:
+                if self._outbox(db, table, row["id"])[0] != "delete":
+                    self._settle(db, table, row["id"], row, updates[row["id"]])
+        # Rows deleted on the server meanwhile stay deleted
+        self.remove_remote(table, set(updates) - {row["id"] for row in saved})
+
+    def _changed_since(self, client, table, owners, cursor) -> list:
+        # One page of the owners' rows after the cursor in (updated_at, id) order: the
+        # rest of the rows tied on its updated_at first, then the newer ones
+        spec = TABLES[table]
+
+        def query():
+            return client.table(table).select(", ".join(spec["columns"])).in_(spec["owner"], list(owners))
+
+        if cursor is None:
+            return query().order("updated_at").order("id").limit(PULL_BATCH_SIZE).execute().data
+        updated_at, last_id = cursor
+        rows = query().eq("updated_at", updated_at).gt("id", last_id).order("id").limit(PULL_BATCH_SIZE).execute().data
+        if len(rows) < PULL_BATCH_SIZE:
+            rows += query().gt("updated_at", updated_at).order("updated_at").order("id").limit(
+                PULL_BATCH_SIZE - len(rows)
+            ).execute().data
+        return rows
+
+    def _server_ids(self, client, table, owners) -> set:
+        # Keyset pagination on id, so households past the server's row cap are complete
+        owner = TABLES[table]["owner"]
+        server_ids = set()
+        last_id = None
+        while True:
+            query = client.table(table).select("id").in_(owner, list(owners))
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            rows = query.order("id").limit(PULL_BATCH_SIZE).execute().data
+            server_ids.update(row["id"] for row in rows)
+            if len(rows) < PULL_BATCH_SIZE:
+                return server_ids
+            last_id = rows[-1]["id"]
+
+    def pull(self, owners):
+        client = self._client(owners[0])
+        marks = ", ".join("?" * len(owners))
+        for table in SYNC_ORDER:
+            spec = TABLES[table]
+            with self._connect() as db:
+                pulls = db.execute(
+                    f"SELECT owner, pulled_until, pulled_id FROM pulls WHERE table_name = ? AND owner IN ({marks})",
+                    (table, *owners),
+                ).fetchall()
+            watermarks = {row["owner"]: (row["pulled_until"], row["pulled_id"] or 0) for row in pulls if row["pulled_until"]}
+            # The household is pulled from where its least current member stopped
+            cursor = min(watermarks.values()) if len(watermarks) == len(owners) else None
+
+            while True:
+                previous = cursor
+                rows = self._changed_since(client, table, owners, cursor)
+                self.apply_remote(table, rows)
+                for row in rows:
+                    if row["updated_at"] and (cursor is None or (row["updated_at"], row["id"]) > cursor):
+                        cursor = (row["updated_at"], row["id"])
+                # Stored per page, so a sync cut short resumes after the last page applied
+                with self._lock, self._connect() as db:
+                    db.executemany(
+                        "INSERT OR REPLACE INTO pulls (table_name, owner, pulled_until, pulled_id) VALUES (?, ?, ?, ?)",
+                        [(table, owner, *(cursor or (None, None))) for owner in owners],
+                    )
+                if len(rows) < PULL_BATCH_SIZE or cursor == previous:
+                    break
+
+            # Rows deleted on the server do not show up above, so compare the ids
+            server_ids = self._server_ids(client, table, owners)
+            with self._connect() as db:
+                local_ids = {row[0] for row in db.execute(
+                    f'SELECT id FROM {table} WHERE "{spec["owner"]}" IN ({marks}) AND id > 0', tuple(owners)
+                ).fetchall()}
+            self.remove_remote(table, local_ids - server_ids)
+
+    def _run(self):
+        while True:
+            self._wake.wait(SYNC_INTERVAL)
+            self._wake.clear()
+            try:
+                with span("replica sync"):
+                    self.push()
+                    for owners, last_read in list(self._active.items()):
+                        if last_read < time.time() - ACTIVE_FOR:
+                            self._active.pop(owners, None)
+                        else:
+                            self.pull(owners)
+                self.status = {"last_sync": time.time(), "error": None}
+            except Exception as e:
+                # Offline or Supabase unavailable: everything stays queued for the next round
+                self.status = {**self.status, "error": str(e)}
+
+
+@st.cache_resource
+def replica(_supabase):
+    return Replica(_supabase)
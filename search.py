@@ -0,0 +1,167 @@
+import bisect
+import difflib
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+import streamlit as st
+
+FIELD_WEIGHTS = {"name": 3.0, "ingredients": 2.0, "instructions": 1.0}
+PREFIX_WEIGHT = 0.7
+FUZZY_WEIGHT = 0.4
+FUZZY_CUTOFF = 0.75
+INDEX_BATCH_SIZE = 1000
+INDEX_TTL = 3600  # seconds before the process-wide index is rebuilt from the database
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text) -> list:
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RecipeIndex:
+    # Inverted index over recipe names, ingredients and instructions. Recipes are
+    # added/removed one at a time, so the index is kept current by the write paths
+    # instead of being rebuilt.
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}  # id -> {"name", "author", "public", "ingredients" (lowercase lines), "terms"}
+        self._postings = {}  # term -> {id: field-weighted term frequency}
+        self._ingredient_postings = defaultdict(set)  # ingredient token -> ids
+        self._vocabulary = []  # sorted, for prefix lookups
+        self._trigram_terms = defaultdict(set)  # trigram -> terms, for fuzzy lookups
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, recipe: dict):
+        with self._lock:
+            self.remove(recipe["id"])
+            ingredients = [line.lower() for line in recipe.get("ingredients") or []]
+            ingredient_tokens = [token for line in ingredients for token in tokenize(line)]
+            fields = {
+                "name": Counter(tokenize(recipe["name"])),
+                "ingredients": Counter(ingredient_tokens),
+                "instructions": Counter(tokenize(recipe.get("instructions"))),
+            }
+            weights = defaultdict(float)
+            for field, counts in fields.items():
+                for term, tf in counts.items():
+                    weights[term] += FIELD_WEIGHTS[field] * (1 + math.log(tf))
+
+            for term, weight in weights.items():
+                if term not in self._postings:
+                    self._postings[term] = {}
+                    bisect.insort(self._vocabulary, term)
+                    for trigram in _trigrams(term):
+                        self._trigram_terms[trigram].add(term)
+                self._postings[term][recipe["id"]] = weight
+            for token in fields["ingredients"]:
+                self._ingredient_postings[token].add(recipe["id"])
+
+            self._docs[recipe["id"]] = {
+                "name": recipe["name"],
+                "author": recipe.get("author"),
+                "public": recipe.get("public", False),
+                "ingredients": ingredients,
+                "terms": list(weights),
+            }
+
+    def remove(self, recipe_id):
+        with self._lock:
+            doc = self._docs.pop(recipe_id, None)
+            if doc is None:
+                return
+            for term in doc["terms"]:
+                postings = self._postings[term]
+                del postings[recipe_id]
+                self._ingredient_postings.get(term, set()).discard(recipe_id)
+                if not postings:
+                    del self._postings[term]
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, term)]
+                    for trigram in _trigrams(term):
+                        self._trigram_terms[trigram].discard(term)
+
+    def _expand(self, term):
+        # Exact match, then prefix matches, then fuzzy matches over terms sharing trigrams
+        expansions = {}
+        start = bisect.bisect_left(self._vocabulary, term)
+        for candidate in self._vocabulary[start:]:
+            if not candidate.startswith(term):
+                break
+            expansions[candidate] = 1.0 if candidate == term else PREFIX_WEIGHT
+        if not expansions:
+            shared = Counter(t for trigram in _trigrams(term) for t in self._trigram_terms.get(trigram, ()))
+            candidates = [t for t, _ in shared.most_common(50)]
+            for candidate in difflib.get_close_matches(term, candidates, n=5, cutoff=FUZZY_CUTOFF):
+                expansions[candidate] = FUZZY_WEIGHT
+        return expansions
+
+    def _with_ingredient(self, ingredient):
+        # Recipes with an ingredient line containing the whole phrase
+        tokens = tokenize(ingredient)
+        if not tokens:
+            return set()
+        candidates = set.intersection(*(self._ingredient_postings.get(t, set()) for t in tokens))
+        if len(tokens) == 1:
+            return candidates
+        phrase = ingredient.lower()
+        return {rid for rid in candidates if any(phrase in line for line in self._docs[rid]["ingredients"])}
+
+    def search(self, query="", ingredients=(), user_id=None, page=0, page_size=20):
+        # Returns one page of (id, name, score) ranked by score, and the total number of hits
+        with self._lock:
+            scores = None
+            for term in tokenize(query):
+                term_scores = {}
+                for candidate, weight in self._expand(term).items():
+                    postings = self._postings[candidate]
+                    factor = weight * math.log(1 + len(self._docs) / len(postings))
+                    if not term_scores:
+                        term_scores = {rid: factor * tf for rid, tf in postings.items()}
+                    else:
+                        for rid, tf in postings.items():
+                            term_scores[rid] = term_scores.get(rid, 0.0) + factor * tf
+                # Every query term has to match
+                scores = term_scores if scores is None else {
+                    rid: score + term_scores[rid] for rid, score in scores.items() if rid in term_scores
+                }
+
+            for ingredient in ingredients:
+                matches = self._with_ingredient(ingredient)
+                scores = dict.fromkeys(matches, 0.0) if scores is None else {
+                    rid: score for rid, score in scores.items() if rid in matches
+                }
+
+            if not scores:
+                return [], 0
+            docs = self._docs
+            visible = [rid for rid in scores if docs[rid]["public"] or docs[rid]["author"] == user_id]
+            top = heapq.nlargest((page + 1) * page_size, visible, key=scores.__getitem__)
+            top.sort(key=lambda rid: (-scores[rid], docs[rid]["name"].lower()))
+            return [(rid, docs[rid]["name"], scores[rid]) for rid in top[page * page_size:]], len(visible)
+
+
+@st.cache_resource(ttl=INDEX_TTL, show_spinner="Building recipe search index...")
+def recipe_index(_supabase):
+    index = RecipeIndex()
+    last_id = None
+    while True:
+        query = _supabase.table("recipes").select("id, name, ingredients, instructions, author, public")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(INDEX_BATCH_SIZE).execute().data
+        for row in rows:
+            index.add(row)
+        if len(rows) < INDEX_BATCH_SIZE:
+            return index
+        last_id = rows[-1]["id"]
@@ -0,0 +1,139 @@
+import csv
+import os
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+import streamlit as st
+
+from ingredients import ingredient_name, normalize_name
+
+PRODUCE_PATH = os.path.join(os.path.dirname(__file__), "data", "produce.csv")
+DEFAULT_REGION = "de"
+SEASON_SCORES = np.array([0.0, 0.5, 1.0], dtype=np.float32)  # imported, stored or greenhouse, fresh local harvest
+CHEAP_BELOW = 0.95  # price relative to the yearly average that counts as a good buy
+
+
+class ProduceTable:
+    # The bundled season calendar and monthly prices per kg, one row per produce
+    # item and region, turned into lookup arrays of shape (regions, items, months).
+    # Prices are also kept relative to each item's yearly average, so "cheap right
+    # now" compares an item with itself rather than carrots with asparagus.
+
+    def __init__(self, path=PRODUCE_PATH):
+        with open(path, encoding="utf-8") as f:
+            records = list(csv.DictReader(f))
+        self.regions = sorted({record["region"] for record in records})
+        self.names = list(dict.fromkeys(record["name"] for record in records))
+        self.rows = {}  # normalized name or alias -> item
+        for record in records:
+            item = self.names.index(record["name"])
+            for name in [record["name"], *filter(None, record["aliases"].split("|"))]:
+                self.rows.setdefault(normalize_name(name), item)
+        shape = (len(self.regions), len(self.names), 12)
+        self.season = np.zeros(shape, dtype=np.float32)
+        self.price = np.full(shape, np.nan, dtype=np.float32)
+        for record in records:
+            at = self.regions.index(record["region"]), self.names.index(record["name"])
+            self.season[at] = SEASON_SCORES[[int(code) for code in record["season"]]]
+            self.price[at] = [float(price) for price in record["price_kg"].split("|")]
+        self.relative_price = self.price / np.nanmean(self.price, axis=2, keepdims=True)
+
+    def region(self, region) -> int:
+        return self.regions.index(region if region in self.regions else DEFAULT_REGION)
+
+
+@st.cache_resource
+def produce_table():
+    return ProduceTable()
+
+
+def current_region() -> str:
+    return st.secrets.get("REGION", DEFAULT_REGION)
+
+
+@lru_cache(maxsize=65536)
+def _produce_items(ingredients: tuple):
+    # Items of the table among a recipe's ingredient lines, each counted once
+    rows = produce_table().rows
+    items = {rows[name] for name in map(ingredient_name, ingredients) if name in rows}
+    return np.array(sorted(items), dtype=np.int32)
+
+
+@lru_cache(maxsize=64)
+def month_scores(region: str, month: int):
+    # (season score, relative price) of every item in one region and month
+    table = produce_table()
+    at = table.region(region)
+    season, price = table.season[at, :, month - 1], table.relative_price[at, :, month - 1]
+    season.setflags(write=False)
+    price.setflags(write=False)
+    return season, price
+
+
+def suggestions(region: str, month: int, k=8) -> dict:
+    # Produce in season now, best first, and items priced below their yearly
+    # average, cheapest relative to usual first
+    table = produce_table()
+    season, price = month_scores(region, month)
+    order = np.lexsort((price, -season))
+    cheap = np.flatnonzero(price < CHEAP_BELOW)
+    return {
+        "seasonal": [table.names[item] for item in order[:k] if season[item] == SEASON_SCORES[-1]],
+        "budget": [(table.names[item], float(price[item])) for item in cheap[np.argsort(price[cheap])][:k]],
+    }
+
+
+def produce_incidence(recipes) -> tuple:
+    # The month-independent part of the scores: ids of the recipes with produce in
+    # the table, their items concatenated, and where each recipe's items start
+    items = [_produce_items(tuple(recipe.get("ingredients") or [])) for recipe in recipes]
+    counts = np.array([len(recipe_items) for recipe_items in items], dtype=np.int32)
+    scored = np.flatnonzero(counts)
+    flat = np.concatenate([items[i] for i in scored]) if len(scored) else np.zeros(0, dtype=np.int32)
+    starts = np.concatenate(([0], np.cumsum(counts[scored])[:-1])).astype(np.int64)
+    return [recipes[i]["id"] for i in scored], flat, starts, counts[scored]
+
+
+def score_incidence(incidence, region: str, month: int) -> dict:
+    # {recipe id: (season score, relative price)} in one pass: the items' values
+    # are summed per recipe with reduceat
+    ids, flat, starts, counts = incidence
+    if not ids:
+        return {}
+    season, price = month_scores(region, month)
+    season_means = np.add.reduceat(season[flat], starts) / counts
+    price_means = np.add.reduceat(price[flat], starts) / counts
+    return dict(zip(ids, zip(season_means.tolist(), price_means.tolist())))
+
+
+def recipe_scores(recipes, region: str, month: int) -> dict:
+    return score_incidence(produce_incidence(recipes), region, month)
+
+
+def week_score(scores: dict, recipe_ids):
+    # Average over the planned recipes that have a score, or None
+    known = [scores[recipe_id] for recipe_id in recipe_ids if recipe_id in scores]
+    if not known:
+        return None
+    return tuple(float(value) for value in np.mean(known, axis=0))
+
+
+def this_month() -> int:
+    return date.today().month
+
+
+def format_score(score) -> str:
+    season, price = score
+    return f"{season:.0%} in season · {price - 1:+.0%} vs. usual price"
+
+
+def household_scores(recipes, version, region: str, month: int) -> dict:
+    # recipe_scores() of the household's recipes, kept in the session per region
+    # and month until the recipes change (`version`)
+    cached = st.session_state.get("recipe_scores")
+    if cached is None or cached[0] != version:
+        cached = st.session_state.recipe_scores = (version, produce_incidence(recipes), {})
+    if (region, month) not in cached[2]:
+        cached[2][(region, month)] = score_incidence(cached[1], region, month)
+    return cached[2][(region, month)]
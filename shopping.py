@@ -0,0 +1,132 @@
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from concurrent.futures import CancelledError, Future, TimeoutError
+
+import streamlit as st
+
+from cache import SqliteCache
+from ingredients import BASE_UNITS, UNITS, category, parse_ingredient
+
+PROMPT_VERSION = 1  # bump when the Groq prompt changes, so old lists are not reused
+SHOPPING_LIST_TTL = 7 * 24 * 3600
+SHOPPING_LIST_CACHE_SIZE = 2000
+IN_FLIGHT_WAIT = 60  # seconds to wait for the same list being generated before asking for it again
+
+CATEGORY_TITLES = {
+    "vegetables": "Vegetables",
+    "other": "Other items",
+    "at home": "Things that are probably at home already",
+}
+
+
+def _format_amount(amount: float, unit: str) -> str:
+    if unit == "g" and amount >= 1000:
+        amount, unit = amount / 1000, "kg"
+    elif unit == "ml" and amount >= 1000:
+        amount, unit = amount / 1000, "l"
+    amount = round(amount, 2)
+    amount = int(amount) if amount == int(amount) else amount
+    return f"{amount}" if unit == "piece" else f"{amount} {unit}"
+
+
+def aggregate(recipes):
+    # Merges the ingredients of all recipes by normalized name. Returns
+    # ({category: [(name, amounts)]}, unparsed ingredient strings).
+    amounts = defaultdict(lambda: defaultdict(float))  # name -> unit -> summed amount
+    unparsed = []
+    for recipe in recipes:
+        for text in recipe.get("ingredients") or []:
+            item = parse_ingredient(text)
+            if item is None:
+                unparsed.append(text)
+                continue
+            totals = amounts[item["name"]]
+            if item["quantity"] is None:
+                continue
+            dimension, factor = UNITS[item["unit"]]
+            unit = BASE_UNITS.get(dimension, item["unit"])
+            totals[unit] += item["quantity"] * factor
+
+    groups = {key: [] for key in CATEGORY_TITLES}
+    for name in sorted(amounts):
+        formatted = [_format_amount(amount, unit) for unit, amount in amounts[name].items()]
+        groups[category(name)].append((name, formatted))
+    return groups, list(dict.fromkeys(unparsed))
+
+
+def format_shopping_list(groups) -> str:
+    lines = []
+    for key, title in CATEGORY_TITLES.items():
+        if not groups.get(key):
+            continue
+        lines.append(f"**{title}**")
+        for name, amounts in groups[key]:
+            lines.append(f"- {name} ({' + '.join(amounts)})" if amounts else f"- {name}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def shopping_list_key(recipes) -> str:
+    # Same recipes with the same ingredients give the same key, whoever asks;
+    # editing any recipe of the plan changes it
+    content = sorted((str(r["id"]), r.get("ingredients") or []) for r in recipes)
+    return hashlib.sha256(json.dumps([PROMPT_VERSION, content], ensure_ascii=False).encode()).hexdigest()
+
+
+class ShoppingListCache:
+    # Persistent cache of generated shopping lists. Concurrent requests for the
+    # same key wait for the first one instead of calling the LLM again.
+
+    def __init__(self):
+        self._store = SqliteCache("shopping_lists", max_entries=SHOPPING_LIST_CACHE_SIZE)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def get(self, key):
+        cached = self._store.get(key)
+        return cached[0] if cached else None
+
+    def get_or_create(self, key, generate):
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            try:
+                return future.result(timeout=IN_FLIGHT_WAIT)
+            except CancelledError:
+                # The first request was stopped or rerun; the next one takes over
+                return self.get_or_create(key, generate)
+            except TimeoutError:
+                return self._generate(key, generate)
+
+        try:
+            result = self._generate(key, generate)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            # st.stop() and st.rerun() raise BaseExceptions, which must not leave
+            # the others waiting
+            future.cancel()
+            with self._lock:
+                del self._in_flight[key]
+
+    def _generate(self, key, generate):
+        result = generate()
+        self._store.set(key, result, ttl=SHOPPING_LIST_TTL)
+        return result
+
+
+@st.cache_resource
+def shopping_list_cache():
+    return ShoppingListCache()
@@ -0,0 +1,24 @@
+-- Row change times for the local replica (replica.py): incremental pulls ask for
+-- rows changed since the last pull, and queued offline edits only overwrite
+-- fields the server has not changed since.
+
+alter table recipes add column if not exists updated_at timestamptz not null default now();
+alter table meal_plans add column if not exists updated_at timestamptz not null default now();
+
+create or replace function set_updated_at() returns trigger as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists recipes_updated_at on recipes;
+create trigger recipes_updated_at before update on recipes
+    for each row execute function set_updated_at();
+
+drop trigger if exists meal_plans_updated_at on meal_plans;
+create trigger meal_plans_updated_at before update on meal_plans
+    for each row execute function set_updated_at();
+
+create index if not exists recipes_author_updated_at on recipes (author, updated_at);
+create index if not exists meal_plans_user_updated_at on meal_plans ("user", updated_at);
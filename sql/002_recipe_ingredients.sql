@@ -0,0 +1,20 @@
+-- One normalized row per ingredient line (see recipe_ingredients.py), so "which
+-- recipes use X" and per-ingredient totals are index lookups instead of scans over
+-- recipes.ingredients. Rows are written by the app next to the recipe; existing
+-- recipes are filled in with `python backfill_ingredients.py`.
+
+create table if not exists recipe_ingredients (
+    recipe bigint not null references recipes (id) on delete cascade,
+    position smallint not null,
+    raw text not null,
+    name text not null,
+    quantity double precision,
+    unit text,
+    amount double precision,  -- quantity in base_unit: g and ml, or the counted unit
+    base_unit text,
+    category text not null,
+    primary key (recipe, position)
+);
+
+create index if not exists recipe_ingredients_name on recipe_ingredients (name, recipe);
+create index if not exists recipe_ingredients_category on recipe_ingredients (category, name);
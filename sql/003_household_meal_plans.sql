@@ -0,0 +1,59 @@
+-- One meal plan per household, week and day. Partners share their plans, so a
+-- day both of them planned showed one recipe on the Meal Planner while the
+-- Shopping List bought for both. meal_plans.household is the household key,
+-- the sorted member ids joined by ':' like the realtime channel names of
+-- live_updates.py, kept current by triggers on meal_plans and partners.
+-- Where both partners planned a day, the plan changed last is kept, the same
+-- rule utils.household_week() applies to the local replica.
+
+alter table meal_plans add column if not exists household text;
+
+create or replace function household_of(member text) returns text as $$
+    select coalesce(
+        (select least("partnerA"::text, "partnerB"::text) || ':' || greatest("partnerA"::text, "partnerB"::text)
+         from partners where "partnerA"::text = member or "partnerB"::text = member limit 1),
+        member
+    );
+$$ language sql stable;
+
+create or replace function set_meal_plan_household() returns trigger as $$
+begin
+    new.household = household_of(new."user"::text);
+    return new;
+end;
+$$ language plpgsql;
+
+-- Linking merges the partners' plans into one household, unlinking splits them
+create or replace function rekey_meal_plans() returns trigger as $$
+declare
+    members text[] := case when tg_op = 'DELETE'
+        then array[old."partnerA"::text, old."partnerB"::text]
+        else array[new."partnerA"::text, new."partnerB"::text] end;
+begin
+    if tg_op = 'INSERT' then
+        delete from meal_plans older using meal_plans newer
+        where older."user"::text = any(members) and newer."user"::text = any(members)
+          and newer.week = older.week and newer.day = older.day
+          and (newer.updated_at, newer.id) > (older.updated_at, older.id);
+    end if;
+    update meal_plans set household = household_of("user"::text) where "user"::text = any(members);
+    return null;
+end;
+$$ language plpgsql;
+
+update meal_plans set household = household_of("user"::text) where household is null;
+
+delete from meal_plans older using meal_plans newer
+where newer.household = older.household and newer.week = older.week and newer.day = older.day
+  and (newer.updated_at, newer.id) > (older.updated_at, older.id);
+
+alter table meal_plans alter column household set not null;
+create unique index if not exists meal_plans_household_week_day on meal_plans (household, week, day);
+
+drop trigger if exists meal_plans_household on meal_plans;
+create trigger meal_plans_household before insert or update of "user" on meal_plans
+    for each row execute function set_meal_plan_household();
+
+drop trigger if exists partners_meal_plans on partners;
+create trigger partners_meal_plans after insert or delete on partners
+    for each row execute function rekey_meal_plans();
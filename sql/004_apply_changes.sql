@@ -0,0 +1,37 @@
+-- Queued edits of the local replica (replica.py) in one request per push. Each
+-- change is {"id": ..., "fields": {"column": [value, changed_at], ...}} with
+-- changed_at in epoch seconds; a field is only written if it was changed after
+-- the row's updated_at, so newer edits made elsewhere are kept. Returns the
+-- rows as they are now; ids that no longer exist are left out. Runs with the
+-- caller's rights, so row level security applies.
+
+create or replace function apply_changes(target text, changes jsonb) returns setof jsonb as $$
+declare
+    change jsonb;
+    assignments text;
+    saved jsonb;
+begin
+    if target not in ('recipes', 'meal_plans') then
+        raise exception 'apply_changes: % is not replicated', target;
+    end if;
+    for change in select * from jsonb_array_elements(changes) loop
+        -- jsonb_populate_record converts each value to the column's type
+        select string_agg(format(
+            '%1$I = case when to_timestamp(($2 -> %2$L ->> 1)::double precision) > t.updated_at'
+            ' then (jsonb_populate_record(null::%3$I, jsonb_build_object(%2$L, $2 -> %2$L -> 0))).%1$I'
+            ' else t.%1$I end',
+            field, field, target
+        ), ', ')
+        into assignments
+        from jsonb_object_keys(change -> 'fields') as field;
+        if assignments is null then
+            continue;
+        end if;
+        execute format('update %I t set %s where t.id = $1 returning to_jsonb(t)', target, assignments)
+            into saved using (change ->> 'id')::bigint, change -> 'fields';
+        if saved is not null then
+            return next saved;
+        end if;
+    end loop;
+end;
+$$ language plpgsql;
@@ -0,0 +1,6 @@
+-- The app never read recipe_ingredients (sql/002_recipe_ingredients.sql): the
+-- Leftover Finder and the recipe search answer "which recipes use X" from their
+-- in-memory indexes over the recipes. Writing the rows cost a delete and an
+-- insert on every recipe save, so the table is gone again.
+
+drop table if exists recipe_ingredients;
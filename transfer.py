@@ -0,0 +1,344 @@
+# Bulk import and export of a recipe library and meal-plan history as JSONL or
+# Parquet. Exports stream keyset-paginated batches into the output, so only one
+# batch is in memory at a time. Imports validate each row, skip content the user
+# already has and insert in large batches on a few writer threads while the next
+# batches are validated.
+#
+#   python transfer.py export recipes USER_ID recipes.parquet
+#   python transfer.py import recipes USER_ID recipes.parquet [--public]
+#   python transfer.py export meal_plans USER_ID plans.jsonl
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from importer import content_hash
+from ingredients import split_ingredients
+from planner import DAYS_PER_WEEK
+
+FORMATS = ("parquet", "jsonl")
+BATCH_SIZE = 1000  # rows per page read and per insert request
+IMPORT_WRITERS = 4  # batches written at the same time
+MAX_NAME_LENGTH = 200
+MAX_INGREDIENTS = 100
+ERROR_SAMPLES = 10  # invalid rows reported back in detail
+
+RECIPE_SCHEMA = pa.schema([
+    ("name", pa.string()),
+    ("ingredients", pa.list_(pa.string())),
+    ("instructions", pa.string()),
+    ("public", pa.bool_()),
+])
+# Plans point to recipes by content hash, so they can be imported into another
+# account once its recipes are
+MEAL_PLAN_SCHEMA = pa.schema([
+    ("week", pa.string()),
+    ("day", pa.int8()),
+    ("recipe_hash", pa.string()),
+    ("recipe_name", pa.string()),
+    ("rating", pa.int8()),
+    ("comment", pa.string()),
+])
+
+
+def recipe_hash(recipe: dict) -> str:
+    return content_hash(recipe["name"], recipe["ingredients"], recipe["instructions"])
+
+
+def _pages(supabase, table, columns, owner_column, owners, batch_size=BATCH_SIZE):
+    # Keyset pagination on id over the rows of the given owners
+    last_id = None
+    while True:
+        query = supabase.table(table).select(f"id, {columns}").in_(owner_column, list(owners))
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(batch_size).execute().data
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+@contextmanager
+def _writer(out, fmt, schema):
+    # Yields a function that appends a batch of rows to the binary file `out`
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(out, schema, compression="zstd")
+        try:
+            yield lambda rows: writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        finally:
+            writer.close()
+    else:
+        yield lambda rows: out.writelines(json.dumps(row, ensure_ascii=False).encode() + b"\n" for row in rows)
+
+
+def export_recipes(supabase, out, fmt, authors) -> int:
+    # Returns the number of recipes written
+    count = 0
+    with _writer(out, fmt, RECIPE_SCHEMA) as write:
+        for rows in _pages(supabase, "recipes", "name, ingredients, instructions, public", "author", authors):
+            write([{field: row[field] for field in RECIPE_SCHEMA.names} for row in rows])
+            count += len(rows)
+    return count
+
+
+def export_meal_plans(supabase, out, fmt, users) -> int:
+    hashes = {}  # recipe id -> (content hash, name), looked up once per batch
+    count = 0
+    with _writer(out, fmt, MEAL_PLAN_SCHEMA) as write:
+        for rows in _pages(supabase, "meal_plans", "week, day, recipe, rating, comment", "user", users):
+            missing = list({row["recipe"] for row in rows} - hashes.keys())
+            for start in range(0, len(missing), BATCH_SIZE):
+                recipes = supabase.table("recipes").select("id, name, ingredients, instructions").in_(
+                    "id", missing[start:start + BATCH_SIZE]
+                ).execute().data
+                hashes.update({recipe["id"]: (recipe_hash(recipe), recipe["name"]) for recipe in recipes})
+            write([
+                {
+                    "week": row["week"],
+                    "day": row["day"],
+                    "recipe_hash": hashes.get(row["recipe"], (None, None))[0],
+                    "recipe_name": hashes.get(row["recipe"], (None, None))[1],
+                    "rating": row["rating"],
+                    "comment": row["comment"],
+                }
+                for row in rows
+            ])
+            count += len(rows)
+    return count
+
+
+def deferred_export(supabase, export, fmt, owners):
+    # A callable for st.download_button(data=...). Streamlit calls it on a worker
+    # thread outside the script run, where st.session_state is not available, so
+    # the client and the owners are bound here. Streamlit only accepts bytes-like
+    # results and reads the whole download into memory anyway, so the export is
+    # returned as bytes.
+    owners = list(owners)
+
+    def build():
+        out = io.BytesIO()
+        export(supabase, out, fmt, owners)
+        return out.getvalue()
+    return build
+
+
+def read_batches(file, fmt, batch_size=BATCH_SIZE):
+    # Yields (rows, share of the file read so far). Lines of a JSONL file that are
+    # not valid JSON come through as {"_error": ...}.
+    if fmt == "parquet":
+        parquet = pq.ParquetFile(file)
+        total, done = parquet.metadata.num_rows, 0
+        for batch in parquet.iter_batches(batch_size=batch_size):
+            done += batch.num_rows
+            yield batch.to_pylist(), done / max(total, 1)
+        return
+    size = file.seek(0, os.SEEK_END) or 1
+    file.seek(0)
+    rows = []
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            rows.append(row if isinstance(row, dict) else {"_error": f"line {number}: not an object"})
+        except ValueError as e:
+            rows.append({"_error": f"line {number}: {e}"})
+        if len(rows) == batch_size:
+            yield rows, file.tell() / size
+            rows = []
+    if rows:
+        yield rows, 1.0
+
+
+def clean_recipe(row: dict) -> dict:
+    # The recipe fields of an imported row; raises ValueError if it is not a recipe
+    if "_error" in row:
+        raise ValueError(row["_error"])
+    name = row.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("missing name")
+    if len(name) > MAX_NAME_LENGTH:
+        raise ValueError(f"name longer than {MAX_NAME_LENGTH} characters")
+    ingredients = row.get("ingredients") or []
+    if isinstance(ingredients, str):
+        ingredients = split_ingredients(ingredients)
+    if not isinstance(ingredients, list) or not all(isinstance(item, str) for item in ingredients):
+        raise ValueError("ingredients must be a list of text")
+    ingredients = [item.strip() for item in ingredients if item.strip()]
+    if len(ingredients) > MAX_INGREDIENTS:
+        raise ValueError(f"more than {MAX_INGREDIENTS} ingredients")
+    instructions = row.get("instructions")
+    if instructions is not None and not isinstance(instructions, str):
+        raise ValueError("instructions must be text")
+    return {"name": name.strip(), "ingredients": ingredients, "instructions": instructions or None}
+
+
+def clean_meal_plan(row: dict) -> dict:
+    if "_error" in row:
+        raise ValueError(row["_error"])
+    try:
+        week = date.fromisoformat(str(row.get("week")))
+    except ValueError:
+        raise ValueError(f"invalid week {row.get('week')!r}")
+    if week.weekday() != 0:
+        raise ValueError(f"week {week} does not start on a Monday")
+    day, rating = row.get("day"), row.get("rating")
+    if not isinstance(day, int) or not 0 <= day < DAYS_PER_WEEK:
+        raise ValueError(f"invalid day {day!r}")
+    if rating is not None and (not isinstance(rating, int) or not 1 <= rating <= 5):
+        raise ValueError(f"invalid rating {rating!r}")
+    if not isinstance(row.get("recipe_hash"), str):
+        raise ValueError("missing recipe_hash")
+    comment = row.get("comment")
+    return {
+        "week": week.isoformat(),
+        "day": day,
+        "recipe_hash": row["recipe_hash"],
+        "rating": rating,
+        "comment": comment if isinstance(comment, str) and comment.strip() else None,
+    }
+
+
+def _import(batches, clean, key, known, insert, progress):
+    # Shared loop of the imports: validates and dedupes a batch by `key` on this
+    # thread, then hands it to one of a few writer threads. Batches never overlap,
+    # so they can be written in any order.
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=IMPORT_WRITERS, thread_name_prefix="bulk-import") as writer:
+        pending = deque()
+        for rows, fraction in batches:
+            fresh = []
+            for row in rows:
+                stats["read"] += 1
+                try:
+                    row = clean(row)
+                except ValueError as e:
+                    stats["invalid"] += 1
+                    if len(stats["errors"]) < ERROR_SAMPLES:
+                        stats["errors"].append(f"row {stats['read']}: {e}")
+                    continue
+                row_key = key(row)
+                if row_key in known:
+                    stats["duplicates"] += 1
+                    continue
+                known.add(row_key)
+                fresh.append(row)
+            if fresh:
+                pending.append(writer.submit(insert, fresh))
+            while len(pending) >= IMPORT_WRITERS:
+                stats["inserted"] += pending.popleft().result()
+            if progress:
+                progress(fraction, stats, time.perf_counter() - started)
+        while pending:
+            stats["inserted"] += pending.popleft().result()
+    if progress:
+        progress(1.0, stats, time.perf_counter() - started)
+    return stats
+
+
+def import_recipes(supabase, file, fmt, author, public=False, on_insert=None, progress=None) -> dict:
+    # Adds the recipes of the file to the author's library, skipping recipes with
+    # the same content as one they already have. `on_insert` gets each batch of
+    # inserted rows, `progress` the share done, the counts so far and the seconds
+    # elapsed. Returns the counts.
+    known = {
+        recipe_hash(row)
+        for rows in _pages(supabase, "recipes", "name, ingredients, instructions", "author", [author])
+        for row in rows
+    }
+
+    def insert(recipes):
+        inserted = supabase.table("recipes").insert(
+            [{**recipe, "author": author, "public": public} for recipe in recipes]
+        ).execute().data
+        if on_insert:
+            on_insert(inserted)
+        return len(inserted)
+
+    return _import(read_batches(file, fmt), clean_recipe, recipe_hash, known, insert, progress)
+
+
+def import_meal_plans(supabase, file, fmt, user, household, on_insert=None, progress=None) -> dict:
+    # Adds the plans of the file to the user's history. Recipes are matched by
+    # content among the household's recipes; days the household already planned
+    # are kept as they are.
+    recipe_ids = {
+        recipe_hash(row): row["id"]
+        for rows in _pages(supabase, "recipes", "name, ingredients, instructions", "author", household)
+        for row in rows
+    }
+    known = {
+        (row["week"], row["day"])
+        for rows in _pages(supabase, "meal_plans", "week, day", "user", household)
+        for row in rows
+    }
+
+    def clean(row):
+        plan = clean_meal_plan(row)
+        recipe_id = recipe_ids.get(plan.pop("recipe_hash"))
+        if recipe_id is None:
+            raise ValueError(f"recipe {row.get('recipe_name') or row['recipe_hash'][:8]!r} is not in the library")
+        return {**plan, "recipe": recipe_id, "user": user}
+
+    def insert(plans):
+        inserted = supabase.table("meal_plans").insert(plans).execute().data
+        if on_insert:
+            on_insert(inserted)
+        return len(inserted)
+
+    return _import(read_batches(file, fmt), clean, lambda plan: (plan["week"], plan["day"]), known, insert, progress)
+
+
+def file_format(file_name: str) -> str:
+    return "parquet" if file_name.lower().endswith((".parquet", ".pq")) else "jsonl"
+
+
+if __name__ == "__main__":
+    import streamlit as st
+    from supabase import create_client
+
+    parser = argparse.ArgumentParser(description="Bulk import or export recipes and meal plans.")
+    parser.add_argument("direction", choices=["import", "export"])
+    parser.add_argument("table", choices=["recipes", "meal_plans"])
+    parser.add_argument("user", help="user id whose library or history is moved")
+    parser.add_argument("path", help=".parquet or .jsonl file")
+    parser.add_argument("--public", action="store_true", help="make imported recipes public")
+    args = parser.parse_args()
+
+    url = os.environ.get("SUPABASE_URL") or st.secrets["SUPABASE_URL"]
+    key = os.environ.get("SUPABASE_KEY") or st.secrets["SUPABASE_KEY"]
+    supabase = create_client(url, key)
+    fmt = file_format(args.path)
+    started = time.perf_counter()
+
+    if args.direction == "export":
+        with open(args.path, "wb") as out:
+            export = export_recipes if args.table == "recipes" else export_meal_plans
+            count = export(supabase, out, fmt, [args.user])
+        print(f"{count} rows written in {time.perf_counter() - started:.1f}s")
+        sys.exit()
+
+    def report(fraction, stats, elapsed):
+        print(f"{fraction:4.0%} {stats['inserted']} inserted, {stats['duplicates']} duplicates, "
+              f"{stats['invalid']} invalid, {stats['read'] / max(elapsed, 1e-9):.0f} rows/s", flush=True)
+
+    with open(args.path, "rb") as file:
+        if args.table == "recipes":
+            stats = import_recipes(supabase, file, fmt, args.user, args.public, progress=report)
+        else:
+            stats = import_meal_plans(supabase, file, fmt, args.user, [args.user], progress=report)
+    for error in stats["errors"]:
+        print(error)
@@ -1,51 +1,380 @@
 import streamlit as st
 from supabase import create_client
+from postgrest import SyncPostgrestClient
+from httpx import Headers
 from streamlit_cookies_controller import CookieController
+from authlib.jose import jwt
+import base64
+import hashlib
+import json
 import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from types import SimpleNamespace
+from replica import replica
+from profiling import current, attach, start_trace, end_trace, record, traced
+
+@st.cache_resource
+def _connection_stats():
+    return {"lock": threading.Lock(), "clients_created": 0, "client_reuses": 0, "reruns": 0, "auth_seconds": 0.0}
+
+def _count(**increments):
+    stats = _connection_stats()
+    with stats["lock"]:
+        for name, value in increments.items():
+            stats[name] += value
+
+def connection_stats():
+    stats = _connection_stats()
+    with stats["lock"]:
+        return {k: v for k, v in stats.items() if k != "lock"}
+
+# Round trips are counted per script run: the HTTP hooks below add to the run the
+# current thread works for, which track_page() and run_parallel() set up.
+_request_context = threading.local()
+
+@st.cache_resource
+def _page_stats():
+    return {"lock": threading.Lock(), "pages": {}}
+
+def _on_request(request):
+    _request_context.started = time.perf_counter()
+    _request_context.started_ns = time.time_ns()
+
+def _on_response(response):
+    if current()[0] is not None:
+        # With profiling on, every query becomes a span named after its table
+        record(
+            f"supabase {response.request.url.path.split('/rest/v1/')[-1]}",
+            _request_context.started_ns,
+            time.time_ns(),
+            method=response.request.method,
+            status=response.status_code,
+            bytes=len(response.read()),
+        )
+    run = getattr(_request_context, "run", None)
+    if run is None:
+        return
+    elapsed = time.perf_counter() - _request_context.started
+    with run["lock"]:
+        run["requests"] += 1
+        run["request_seconds"] += elapsed
+
+@contextmanager
+def track_page(page: str):
+    # Wraps the body of a page. The run's trace and round trips are recorded however
+    # it ends, also through st.stop(), st.rerun() or an error, and nothing of it is
+    # left on the thread for the fragment runs that follow.
+    start_trace(page)
+    run = _request_context.run = {
+        "page": page, "lock": threading.Lock(), "requests": 0, "request_seconds": 0.0, "started": time.perf_counter()
+    }
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = repr(e)
+        raise
+    finally:
+        _request_context.run = None
+        end_trace(error)
+        _record_run(run)
+
+def _record_run(run):
+    stats = _page_stats()
+    with stats["lock"]:
+        totals = stats["pages"].setdefault(run["page"], {"runs": 0, "requests": 0, "request_seconds": 0.0, "seconds": 0.0})
+        totals["runs"] += 1
+        totals["requests"] += run["requests"]
+        totals["request_seconds"] += run["request_seconds"]
+        totals["seconds"] += time.perf_counter() - run["started"]
+
+def page_stats() -> dict:
+    stats = _page_stats()
+    with stats["lock"]:
+        return {page: dict(totals) for page, totals in stats["pages"].items()}
+
+def run_parallel(*calls):
+    # Runs independent queries at the same time and returns their results in order.
+    # The calls run outside the script thread, so they must not touch st.session_state.
+    run = getattr(_request_context, "run", None)
+    trace = current()
+
+    def in_run(call):
+        _request_context.run = run
+        attach(trace)
+        try:
+            return call()
+        finally:
+            _request_context.run = None
+            attach((None, None))
+
+    futures = [background_pool().submit(in_run, call) for call in calls]
+    return [future.result() for future in futures]
+
+@st.cache_resource
+def _shared_client():
+    # One client (and one pooled HTTP session) per process, shared by all sessions.
+    # It never signs in, so it only ever carries the anon key and no user's token;
+    # sessions query through a SessionClient on top of it.
+    _count(clients_created=1)
+    client = create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+    client.postgrest.session.event_hooks["request"].append(_on_request)
+    client.postgrest.session.event_hooks["response"].append(_on_response)
+    return client
 
 def init_connection():
-    url = st.secrets["SUPABASE_URL"]
-    key = st.secrets["SUPABASE_KEY"]
-    return create_client(url, key)
+    client = _shared_client()
+    _count(client_reuses=1)
+    return client
+
+def shared_client():
+    # For the caches shared by all sessions, which must not hold one user's token
+    return _shared_client()
+
+class SessionClient:
+    # The shared client as one logged-in session uses it: database requests carry the
+    # user's access token, so Supabase's row level security applies to them, and go
+    # through the shared client's pooled HTTP session. The shared client itself is
+    # never changed; auth, storage and realtime are its own.
+
+    def __init__(self, shared, access_token: str):
+        self.shared = shared
+        headers = Headers(shared.postgrest.headers)
+        headers["Authorization"] = f"Bearer {access_token}"
+        self.postgrest = SyncPostgrestClient(
+            str(shared.postgrest.base_url),
+            schema=shared.options.schema,
+            headers=headers,
+            http_client=shared.postgrest.session,
+        )
+
+    def table(self, name: str):
+        return self.postgrest.from_(name)
+
+    from_ = table
+
+    def rpc(self, fn: str, params=None, **kwargs):
+        return self.postgrest.rpc(fn, params or {}, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.shared, name)
+
+def _session_client(shared, access_token: str):
+    # Built again only when the session's access token changed
+    cached = st.session_state.get("supabase_client")
+    if cached is None or cached[0] != access_token:
+        cached = st.session_state.supabase_client = (access_token, SessionClient(shared, access_token))
+    return cached[1]
 
+def init_auth_client():
+    # sign_in/refresh store the session on the client and switch its headers to the
+    # user's token, so those calls must never run on the shared client.
+    _count(clients_created=1)
+    return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_TTL = 300  # seconds a token verified via get_user() is trusted without asking again
+TOKEN_REFRESH_MARGIN = 300  # refresh this many seconds before the access token expires
+
+@st.cache_resource
+def _token_cache():
+    return {"lock": threading.Lock(), "entries": OrderedDict()}
+
+@st.cache_resource
+def background_pool():
+    # Shared by all sessions for short background jobs (token refresh, prefetching)
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="background")
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _token_claims(token: str) -> dict:
+    # Unverified read of the payload, only used for expiry bookkeeping
+    try:
+        payload = token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return {}
+
+def _cache_user(token: str, user, ttl: float | None = None):
+    expires_at = _token_claims(token).get("exp", time.time() + TOKEN_CACHE_TTL)
+    if ttl is not None:
+        expires_at = min(expires_at, time.time() + ttl)
+    cache = _token_cache()
+    with cache["lock"]:
+        cache["entries"][_token_key(token)] = (expires_at, user)
+        cache["entries"].move_to_end(_token_key(token))
+        while len(cache["entries"]) > TOKEN_CACHE_SIZE:
+            cache["entries"].popitem(last=False)
+
+def _forget_token(token: str):
+    cache = _token_cache()
+    with cache["lock"]:
+        cache["entries"].pop(_token_key(token), None)
+
+def verify_token(supabase, access_token: str):
+    cache = _token_cache()
+    with cache["lock"]:
+        entry = cache["entries"].get(_token_key(access_token))
+        if entry and entry[0] > time.time():
+            cache["entries"].move_to_end(_token_key(access_token))
+            return entry[1]
+
+    secret = st.secrets.get("SUPABASE_JWT_SECRET")
+    if secret:
+        # Verify the signature locally instead of a round trip to the auth server
+        claims = jwt.decode(access_token, secret.encode())
+        claims.validate()
+        user = SimpleNamespace(id=claims["sub"], email=claims.get("email"))
+        _cache_user(access_token, user)
+    else:
+        user = supabase.auth.get_user(access_token).user
+        if user is None:
+            raise ValueError("Access token is not valid.")
+        _cache_user(access_token, user, ttl=TOKEN_CACHE_TTL)
+    return user
+
+def save_session(controller, session):
+    controller.set("access_token", session.access_token)
+    controller.set("refresh_token", session.refresh_token)
+    _cache_user(session.access_token, session.user)
+
+def _apply_background_refresh(controller):
+    future = st.session_state.get("token_refresh")
+    if future is None or not future.done():
+        return
+    del st.session_state["token_refresh"]
+    try:
+        save_session(controller, future.result())
+    except Exception:
+        # Leave the current tokens alone; authenticate() refreshes them once they are rejected
+        pass
+
+def _schedule_background_refresh(access_token: str, refresh_token: str):
+    expires_at = _token_claims(access_token).get("exp")
+    if expires_at is None or expires_at - time.time() > TOKEN_REFRESH_MARGIN or "token_refresh" in st.session_state:
+        return
+    auth_client = init_auth_client()
+    st.session_state.token_refresh = background_pool().submit(
+        lambda: auth_client.auth.refresh_session(refresh_token).session
+    )
+
+@traced("authenticate")
 def authenticate():
+    started = time.perf_counter()
     supabase = init_connection()
     controller = CookieController(key='cookies')
+    _apply_background_refresh(controller)
     access_token = controller.get("access_token")
     refresh_token = controller.get("refresh_token")
-    if refresh_token and access_token and "user" not in st.session_state:
-        try:
-            user = supabase.auth.get_user(access_token)
-            st.session_state.user = user.user
-        except Exception as e:
+    if refresh_token and access_token and not st.session_state.get("logged_out"):
+        if "user" not in st.session_state:
             try:
-                new_session = supabase.auth.refresh_session(refresh_token).session
-                controller.set("access_token", new_session.access_token)
-                controller.set("refresh_token", new_session.refresh_token)
-                time.sleep(1)
+                st.session_state.user = verify_token(supabase, access_token)
             except Exception as e:
-                controller.set("refresh_token", "", expires=datetime.now() + timedelta(days=-1))
-                time.sleep(1)
+                try:
+                    new_session = init_auth_client().auth.refresh_session(refresh_token).session
+                    save_session(controller, new_session)
+                    st.session_state.user = new_session.user
+                    access_token, refresh_token = new_session.access_token, new_session.refresh_token
+                except Exception as e:
+                    controller.set("refresh_token", "", expires=datetime.now() + timedelta(days=-1))
+        if "user" in st.session_state:
+            _schedule_background_refresh(access_token, refresh_token)
+            supabase = _session_client(supabase, access_token)
 
+    _count(reruns=1, auth_seconds=time.perf_counter() - started)
     return supabase, controller
 
+def logout(controller):
+    if controller.get("access_token"):
+        _forget_token(controller.get("access_token"))
+    st.session_state.clear()
+    # The cookie deletions below reach the browser with this run, so instead of
+    # sleeping and rerunning we just stop restoring the session from cookies.
+    st.session_state.logged_out = True
+    expires_at = datetime.now() + timedelta(days=-7)
+    controller.set("access_token", "", expires=expires_at)
+    controller.set("refresh_token", "", expires=expires_at)
+
+def show_connection_stats():
+    if not st.secrets.get("SHOW_CONNECTION_STATS"):
+        return
+    stats = connection_stats()
+    avg_ms = 1000 * stats["auth_seconds"] / stats["reruns"] if stats["reruns"] else 0
+    st.sidebar.caption(
+        f"Supabase clients: {stats['clients_created']} created, {stats['client_reuses']} reuses · "
+        f"{stats['reruns']} reruns, {avg_ms:.1f} ms avg connect/auth"
+    )
+
+def show_page_stats():
+    # Call at the end of a page body; shows the run's round trips so far next to the
+    # averages of the page's earlier runs
+    if not st.secrets.get("SHOW_CONNECTION_STATS"):
+        return
+    run = getattr(_request_context, "run", None)
+    if run is None:
+        return
+    wall = time.perf_counter() - run["started"]
+    totals = page_stats().get(run["page"], {"runs": 0, "requests": 0, "seconds": 0.0})
+    runs = totals["runs"] + 1
+    st.sidebar.caption(
+        f"This run: {run['requests']} round trips, {1000 * run['request_seconds']:.0f} ms in queries, "
+        f"{1000 * wall:.0f} ms so far · avg {(totals['requests'] + run['requests']) / runs:.1f} round trips, "
+        f"{1000 * (totals['seconds'] + wall) / runs:.0f} ms over {runs} runs"
+    )
+
 def show_login(controller):
+    show_connection_stats()
     if "user" in st.session_state:
         st.sidebar.write(f"👋 Logged in as: {st.session_state.user.email}")
         if st.sidebar.button("Logout"):
-            st.session_state.clear()
-            expires_at = datetime.now() + timedelta(days=-7)
-            controller.set("access_token", "", expires=expires_at)
-            controller.set("refresh_token", "", expires=expires_at)
-            time.sleep(1)
-            st.rerun()
+            logout(controller)
+
+
+def household_ids(supabase) -> tuple:
+    # The logged-in user plus their partner, if linked; plans are shared between them
+    if "household" not in st.session_state:
+        user_id = st.session_state.user.id
+        partner_id = get_partner_id(supabase, user_id)
+        st.session_state.household = tuple(sorted({user_id, partner_id} - {None}))
+    return st.session_state.household
+
+def rating_history(supabase) -> list:
+    # The household's planned meals with their ratings, from the local replica
+    return replica(shared_client()).meal_plans(household_ids(supabase))
+
+def household_week(local, household, week: str) -> dict:
+    # The household's plan of a week as {day: entry}. The server keeps one plan per
+    # household, week and day (sql/003_household_meal_plans.sql); until it has merged
+    # a day both partners planned, the newer entry is the plan. Entries not pushed
+    # yet have no updated_at from the server and count as newest.
+    plan = {}
+    for entry in local.meal_plans(household, week, week):
+        shown = plan.get(entry["day"])
+        if shown is None or _plan_recency(entry) > _plan_recency(shown):
+            plan[entry["day"]] = entry
+    return plan
+
+def _plan_recency(entry) -> tuple:
+    return entry.get("updated_at") is None, entry.get("updated_at") or "", entry["id"]
 
+def show_sync_status(local):
+    pending = local.pending()
+    if pending and local.status["error"]:
+        st.sidebar.warning(f"Offline: {pending} changes will be saved once Supabase is reachable again.")
+    elif pending:
+        st.sidebar.caption(f"Saving {pending} changes...")
 
-def get_partner_id(supabase, user_id: str) -> str:
+def get_partner_id(supabase, user_id: str) -> str | None:
     # Get both directions
     partner = supabase.table("partners").select("partnerA, partnerB").or_(
         f"partnerA.eq.{user_id},partnerB.eq.{user_id}"
-    ).execute().data
-    
-    return partner[0]["partnerB"] if partner[0]["partnerA"] == user_id else partner[0]["partnerA"] if partner else None
\ No newline at end of file
+    ).limit(1).execute().data
+    if not partner:
+        return None
+    return partner[0]["partnerB"] if partner[0]["partnerA"] == user_id else partner[0]["partnerA"]